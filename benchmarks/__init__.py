@@ -0,0 +1,10 @@
+"""
+Benchmarks, run from the repository root with `python -m benchmarks.<name>`:
+
+ * `metadata_api`: the metadata data access layer against a local Postgres
+ * `populate`: the aggregate populate pipeline, replaying recorded responses
+ * `compare`: compares two result files
+
+Each benchmark writes its results as JSON (see `benchmarks.results`) so that
+runs on different commits can be compared.
+"""
@@ -0,0 +1,56 @@
+"""
+Compares two benchmark result files, e.g. from the base and head of a branch:
+
+    python -m benchmarks.compare before.json after.json --threshold 0.2
+
+Prints the change of the median time of each case present in both files, and
+exits with status 1 if any case got slower by more than `--threshold` (a
+fraction: 0.2 is 20%).
+"""
+import argparse
+import json
+import sys
+
+
+def compare(before: dict, after: dict, threshold: float) -> list[str]:
+    """
+    Prints the comparison and returns the cases that regressed.
+    """
+    regressions = []
+    for name, old in before["results"].items():
+        new = after["results"].get(name)
+        if new is None:
+            continue
+        change = (new["median"] - old["median"]) / old["median"] if old["median"] else 0
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(
+            f"{name:<55} {old['median'] * 1000:10.2f} ms -> "
+            f"{new['median'] * 1000:10.2f} ms  {change:+7.1%}{flag}"
+        )
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+    if before["parameters"] != after["parameters"]:
+        print(
+            f"Warning: the runs have different parameters: {before['parameters']} "
+            f"and {after['parameters']}"
+        )
+    return 1 if compare(before, after, args.threshold) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
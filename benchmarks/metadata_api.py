@@ -0,0 +1,320 @@
+"""
+Benchmark of the metadata data access layer against a local Postgres.
+
+Seeds `--records` records shaped like the ones MDS stores (discovery metadata
+and indexed file objects), then measures:
+
+ * `batch_create_metadata`, per batch, with and without `overwrite`
+ * `get_metadata` by GUID and `get_metadata_by_alias` / `resolve_metadata` by alias
+ * `search_metadata` with filters, before and after indexing the filtered paths
+ * `search_metadata` pages at increasing offsets
+ * `update_aliases`, replacing and merging
+
+The database is the one configured for MDS (`DB_*` settings), and must be
+migrated (`alembic upgrade head`). Use a database of its own: searches and
+indexes cover the whole table. The benchmark records have GUIDs starting with
+`bench_` and are deleted before and after the run.
+
+Usage (from the repository root):
+
+    python -m benchmarks.metadata_api --records 100000 --output before.json
+    python -m benchmarks.compare before.json after.json
+
+The data is generated from `--seed`, so runs with the same parameters are
+comparable.
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from sqlalchemy import delete, text
+
+from mds.db import DataAccessLayer, get_db_engine_and_sessionmaker, initiate_db
+from mds.models import Metadata
+
+from .results import measure, print_results, summarize, write_results
+
+GUID_PREFIX = "bench_"
+AUTHZ = {"version": 0, "_resource_paths": ["/programs/bench"]}
+SEARCHES = {
+    "one_value": {"_guid_type": ["discovery_metadata"]},
+    "nested_value": {"gen3_discovery.data_availability": ["available"]},
+    "several_values": {"gen3_discovery.year": ["2015", "2016", "2017"]},
+    "has_key": {"gen3_discovery.tags": ["*"]},
+}
+TAGS = ["Genomic", "Imaging", "Clinical", "Survey", "Proteomic", "Longitudinal"]
+
+
+def guid(i: int) -> str:
+    return f"{GUID_PREFIX}dg.BNCH/{i:08d}"
+
+
+def alias(i: int, n: int = 0) -> str:
+    return f"{GUID_PREFIX}alias_{i:08d}_{n}"
+
+
+def generate_record(rng: random.Random, i: int) -> dict:
+    """
+    A discovery metadata record (like those created by populate) for one record
+    in five, an indexed file object (like those created by /objects) otherwise.
+    """
+    if i % 5 == 0:
+        data = {
+            "_guid_type": "discovery_metadata",
+            "gen3_discovery": {
+                "study_id": f"phs{i:06d}",
+                "project_title": " ".join(
+                    rng.choice(["Study", "of", "cohort", "heart", "lung", "blood"])
+                    for _ in range(rng.randint(3, 12))
+                ),
+                "study_description": "x" * rng.randint(200, 4000),
+                "data_availability": rng.choice(["available", "pending"]),
+                "year": str(rng.randint(2000, 2024)),
+                "subjects_count": rng.randint(10, 100000),
+                "tags": [
+                    {"name": rng.choice(TAGS), "category": "Data Type"}
+                    for _ in range(rng.randint(1, 4))
+                ],
+                "investigators": [
+                    {"name": f"Investigator {n}", "institution": "University"}
+                    for n in range(rng.randint(1, 5))
+                ],
+            },
+        }
+    else:
+        data = {
+            "_guid_type": "indexed_file_object",
+            "_upload_status": rng.choice(["uploaded", "uploaded", "not_uploaded"]),
+            "_file_name": f"file_{i}.{rng.choice(['bam', 'vcf', 'csv'])}",
+            "_bucket": "s3://bench-bucket",
+            "_filename": f"file_{i}",
+            "size": rng.randint(1, 10**10),
+            "md5sum": f"{rng.getrandbits(128):032x}",
+        }
+    return {"guid": guid(i), "data": data}
+
+
+class MetadataBenchmark:
+    def __init__(self, records: int, batch_size: int, repeat: int, seed: int):
+        self.records = records
+        self.batch_size = batch_size
+        self.repeat = repeat
+        self.rng = random.Random(seed)
+        self.results = {}
+        # indexes created for the indexed searches, dropped afterwards
+        self.created_indexes = []
+        _, self.sessionmaker = get_db_engine_and_sessionmaker()
+
+    async def in_transaction(self, operation):
+        """
+        Runs `operation(dal)` in its own transaction, like a request does.
+        """
+        async with self.sessionmaker() as session:
+            async with session.begin():
+                return await operation(DataAccessLayer(session))
+
+    async def execute(self, statement: str) -> None:
+        async with self.sessionmaker() as session:
+            async with session.begin():
+                await session.execute(text(statement))
+
+    async def delete_records(self) -> None:
+        async with self.sessionmaker() as session:
+            async with session.begin():
+                await session.execute(
+                    delete(Metadata).where(Metadata.guid.startswith(GUID_PREFIX))
+                )
+
+    def random_index(self) -> int:
+        return self.rng.randrange(self.records)
+
+    async def bench_batch_create(self) -> None:
+        samples = []
+        for start in range(0, self.records, self.batch_size):
+            batch = [
+                generate_record(self.rng, i)
+                for i in range(start, min(start + self.batch_size, self.records))
+            ]
+            samples.append(await self._create_batch(batch, overwrite=False))
+        self.results["batch_create_metadata"] = summarize(samples, self.batch_size)
+
+        samples = []
+        for _ in range(self.repeat):
+            start = self.rng.randrange(max(self.records - self.batch_size, 1))
+            batch = [
+                generate_record(self.rng, i)
+                for i in range(start, min(start + self.batch_size, self.records))
+            ]
+            samples.append(await self._create_batch(batch, overwrite=True))
+        self.results["batch_create_metadata[overwrite]"] = summarize(
+            samples, self.batch_size
+        )
+        await self.execute(f"ANALYZE {Metadata.__tablename__}")
+
+    async def _create_batch(self, batch: list[dict], overwrite: bool) -> float:
+        start = time.perf_counter()
+        await self.in_transaction(
+            lambda dal: dal.batch_create_metadata(
+                batch, overwrite=overwrite, default_authz=AUTHZ
+            )
+        )
+        return time.perf_counter() - start
+
+    async def bench_get(self) -> None:
+        # one alias for the first tenth of the records
+        aliased = max(self.records // 10, 1)
+        for start in range(0, aliased, self.batch_size):
+
+            async def create_aliases(dal, start=start):
+                for i in range(start, min(start + self.batch_size, aliased)):
+                    await dal.create_aliases(guid(i), [alias(i)])
+
+            await self.in_transaction(create_aliases)
+
+        cases = {
+            "get_metadata[guid]": lambda dal: dal.get_metadata(
+                guid(self.random_index())
+            ),
+            "get_metadata_by_alias": lambda dal: dal.get_metadata_by_alias(
+                alias(self.rng.randrange(aliased))
+            ),
+            "resolve_metadata[guid]": lambda dal: dal.resolve_metadata(
+                guid(self.random_index())
+            ),
+            "resolve_metadata[alias]": lambda dal: dal.resolve_metadata(
+                alias(self.rng.randrange(aliased))
+            ),
+            "get_metadata_for_keys[100]": lambda dal: dal.get_metadata_for_keys(
+                [guid(self.random_index()) for _ in range(50)]
+                + [alias(self.rng.randrange(aliased)) for _ in range(50)]
+            ),
+        }
+        for name, operation in cases.items():
+            self.results[name] = await measure(
+                lambda: self.in_transaction(operation), self.repeat
+            )
+
+    async def bench_search(self) -> None:
+        for indexed in (False, True):
+            suffix = ", indexed" if indexed else ""
+            for name, filters in SEARCHES.items():
+                for return_data in (False, True):
+                    case = f"search_metadata[{name}, data={return_data}{suffix}]"
+                    self.results[case] = await measure(
+                        lambda: self.in_transaction(
+                            lambda dal: dal.search_metadata(
+                                filters, limit=100, return_data=return_data
+                            )
+                        ),
+                        self.repeat,
+                    )
+            if not indexed:
+                await self._create_indexes()
+        await self._drop_indexes()
+
+    async def _create_indexes(self) -> None:
+        async def create(dal):
+            existing = set(await dal.list_metadata_indexes())
+            created = []
+            for filters in SEARCHES.values():
+                for path in filters:
+                    if path not in existing and path not in created:
+                        created.append(await dal.create_metadata_index(path))
+            return created
+
+        self.created_indexes = await self.in_transaction(create)
+        await self.execute(f"ANALYZE {Metadata.__tablename__}")
+
+    async def _drop_indexes(self) -> None:
+        async def drop(dal):
+            for path in self.created_indexes:
+                await dal.drop_metadata_index(path)
+
+        await self.in_transaction(drop)
+
+    async def bench_pagination(self) -> None:
+        limit = 100
+        offsets = sorted(
+            {0, self.records // 10, self.records // 2, max(self.records - limit, 0)}
+        )
+        for offset in offsets:
+            self.results[f"search_metadata[offset={offset}]"] = await measure(
+                lambda: self.in_transaction(
+                    lambda dal: dal.search_metadata({}, limit=limit, offset=offset)
+                ),
+                self.repeat,
+            )
+
+    async def bench_update_aliases(self) -> None:
+        for merge in (False, True):
+            counter = iter(range(10**9))
+
+            async def update(dal):
+                i = self.random_index()
+                n = next(counter)
+                return await dal.update_aliases(
+                    guid(i),
+                    [alias(i, n), alias(i, n + 1), alias(i, n + 2)],
+                    merge=merge,
+                )
+
+            self.results[f"update_aliases[merge={merge}]"] = await measure(
+                lambda: self.in_transaction(update), self.repeat
+            )
+
+    async def run(self) -> dict:
+        await self.delete_records()
+        try:
+            await self.bench_batch_create()
+            await self.bench_get()
+            await self.bench_search()
+            await self.bench_pagination()
+            await self.bench_update_aliases()
+        finally:
+            await self.delete_records()
+        return self.results
+
+
+async def main(args) -> dict:
+    initiate_db()
+    engine, _ = get_db_engine_and_sessionmaker()
+    try:
+        benchmark = MetadataBenchmark(
+            records=args.records,
+            batch_size=args.batch_size,
+            repeat=args.repeat,
+            seed=args.seed,
+        )
+        results = await benchmark.run()
+    finally:
+        await engine.dispose()
+
+    print_results(results)
+    return write_results(
+        args.output,
+        "metadata_api",
+        parameters={
+            "records": args.records,
+            "batch_size": args.batch_size,
+            "repeat": args.repeat,
+            "seed": args.seed,
+        },
+        results=results,
+    )
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--records", type=int, default=10000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument(
+        "--repeat", type=int, default=20, help="runs of each measured operation"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="metadata_api_benchmark.json")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
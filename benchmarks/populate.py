@@ -0,0 +1,487 @@
+"""
+Benchmark of the aggregate populate pipeline, replaying recorded responses of
+the commons instead of calling them.
+
+First record the responses of the commons of an aggregate config (this calls
+them, once):
+
+    python -m benchmarks.populate record --config aggregate_config.json \\
+        --fixtures fixtures/
+
+which writes one `<commons name>.json` file per commons in `fixtures/`, with
+every request it made and the response it got. Then replay them, as often as
+needed:
+
+    python -m benchmarks.populate run --config aggregate_config.json \\
+        --fixtures fixtures/ --repeat 3 --output populate.json
+
+`benchmarks/fixtures/` has small recordings for the commons of
+`benchmarks/populate_config.json` (a Gen3, a PDC and a Harvard Dataverse
+commons, serving the sample data of the adapter tests), to replay without
+recording first.
+
+Each commons goes through the same steps as in `mds.populate.main`, timed
+separately:
+
+ * fetch: `pull_mds` for Gen3 commons, the adapter's `getRemoteDataAsJson`
+ * normalize: the adapter's `normalizeToGen3MDSFields`
+ * prepare: `populate_metadata` without the datastore calls
+ * index: writing the documents to the datastore
+
+followed by the info, config and summary documents ("finalize"). Documents go
+to an in-memory datastore that only serializes them, or to the temp indexes of
+the OpenSearch at `--opensearch` (the live indexes are left alone). The report
+also has the number of documents and their size, documents per second and the
+peak RSS of the process. `--profile` dumps a cProfile (`.prof`, for `pstats` or
+snakeviz) or, for an `.html` path, a pyinstrument profile of the runs.
+"""
+import argparse
+import asyncio
+import cProfile
+import json
+import pstats
+import sys
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+from unittest.mock import patch
+from urllib.parse import urlparse
+
+import httpx
+
+from mds import config
+from mds.agg_mds import adapters, datastore
+from mds.agg_mds.commons import Commons
+from mds.agg_mds.mds import pull_mds
+from mds.populate import (
+    AggregateSummary,
+    parse_config_from_file,
+    populate_config,
+    populate_info,
+    populate_metadata,
+    populate_summaries,
+)
+
+from .results import (
+    Stopwatch,
+    peak_rss_bytes,
+    print_results,
+    summarize,
+    write_results,
+)
+
+# fixture with the requests made while populating the info index (DRS cache)
+INFO_FIXTURE = "_info"
+# headers that no longer apply once the body has been decoded
+DROPPED_HEADERS = {"content-encoding", "content-length", "transfer-encoding"}
+
+
+def _request_key(method: str, url: str, body: str) -> tuple:
+    return method.upper(), url, body or ""
+
+
+def _request_body(request: httpx.Request) -> str:
+    return request.read().decode("utf-8", errors="replace")
+
+
+class Recorder:
+    """
+    Records the requests made with httpx's synchronous transport (which the
+    adapters and `pull_mds` use), and their responses.
+    """
+
+    def __init__(self):
+        self.exchanges = []
+        self._send = httpx.HTTPTransport.handle_request
+
+    def handle_request(self, transport, request: httpx.Request) -> httpx.Response:
+        response = self._send(transport, request)
+        content = response.read()
+        headers = {
+            name: value
+            for name, value in response.headers.items()
+            if name.lower() not in DROPPED_HEADERS
+        }
+        self.exchanges.append(
+            {
+                "method": request.method,
+                "url": str(request.url),
+                "body": _request_body(request),
+                "status": response.status_code,
+                "headers": headers,
+                "content": content.decode("utf-8", errors="replace"),
+            }
+        )
+        return httpx.Response(
+            response.status_code, headers=headers, content=content, request=request
+        )
+
+    @contextmanager
+    def recording(self):
+        recorder = self
+
+        def handle_request(transport, request):
+            return recorder.handle_request(transport, request)
+
+        with patch.object(httpx.HTTPTransport, "handle_request", handle_request):
+            yield self
+
+
+class Replayer:
+    """
+    Answers the requests made with httpx's synchronous transport with the
+    recorded responses. A request recorded several times gets the recorded
+    responses in turn. Requests that were not recorded get a 404.
+    """
+
+    def __init__(self, exchanges: list):
+        self.responses = defaultdict(list)
+        for exchange in exchanges:
+            key = _request_key(exchange["method"], exchange["url"], exchange["body"])
+            self.responses[key].append(exchange)
+        self.calls = defaultdict(int)
+        self.unmatched = []
+
+    @classmethod
+    def from_fixtures(cls, fixtures: Path) -> "Replayer":
+        exchanges = []
+        for path in sorted(fixtures.glob("*.json")):
+            exchanges.extend(json.loads(path.read_text())["exchanges"])
+        return cls(exchanges)
+
+    def handle_request(self, transport, request: httpx.Request) -> httpx.Response:
+        key = _request_key(request.method, str(request.url), _request_body(request))
+        recorded = self.responses.get(key)
+        if not recorded:
+            self.unmatched.append(f"{request.method} {request.url}")
+            return httpx.Response(404, request=request)
+        exchange = recorded[self.calls[key] % len(recorded)]
+        self.calls[key] += 1
+        return httpx.Response(
+            exchange["status"],
+            headers=exchange["headers"],
+            content=exchange["content"].encode("utf-8"),
+            request=request,
+        )
+
+    @contextmanager
+    def replaying(self):
+        replayer = self
+
+        def handle_request(transport, request):
+            return replayer.handle_request(transport, request)
+
+        with patch.object(httpx.HTTPTransport, "handle_request", handle_request):
+            yield self
+
+
+class InMemoryDatastore:
+    """
+    Stand-in for the OpenSearch datastore, keeping the serialized documents.
+    """
+
+    def __init__(self):
+        self.indexes = defaultdict(dict)
+
+    def _index(self, index: str, doc_id: str, doc) -> None:
+        self.indexes[index][doc_id] = json.dumps(doc)
+
+    async def update_metadata(
+        self, name, data, guid_arr, tags, info, use_temp_index=False
+    ):
+        self._index("info", name, info)
+        for entry in data:
+            key, doc = next(iter(entry.items()))
+            self._index("metadata", key, doc)
+
+    async def update_global_info(self, key, doc, use_temp_index=False):
+        self._index("info", key, doc)
+
+    async def update_config_info(self, doc, use_temp_index=False):
+        self._index("config", "config", doc)
+
+    async def update_tags_summary(self, tags, use_temp_index=False):
+        self._index("info", "tags", {"tags": tags})
+
+    async def update_commons_summary(self, commons, use_temp_index=False):
+        self._index("info", "commons", {"commons": commons})
+
+    @contextmanager
+    def installed(self):
+        with ExitStack() as stack:
+            for name in (
+                "update_metadata",
+                "update_global_info",
+                "update_config_info",
+                "update_tags_summary",
+                "update_commons_summary",
+            ):
+                stack.enter_context(patch.object(datastore, name, getattr(self, name)))
+            yield self
+
+
+def _document_sizes(results: dict) -> int:
+    return sum(len(json.dumps(entry)) for entry in results.values())
+
+
+class PopulateBenchmark:
+    def __init__(self, commons_config: Commons):
+        self.commons_config = commons_config
+        self.summary = AggregateSummary()
+
+    def fetch(self, name: str, stopwatch: Stopwatch) -> dict:
+        """
+        Fetches and normalizes the metadata of the commons `name`, the way
+        `mds.populate.main` does.
+        """
+        if name in self.commons_config.gen3_commons:
+            common = self.commons_config.gen3_commons[name]
+            with stopwatch.phase("fetch"):
+                return pull_mds(common.mds_url, common.guid_type)
+
+        common = self.commons_config.adapter_commons[name]
+        adapter = adapters.adapters[common.adapter]()
+        with stopwatch.phase("fetch"):
+            data = adapter.getRemoteDataAsJson(
+                mds_url=common.mds_url, filters=common.filters, config=common.config
+            )
+        with stopwatch.phase("normalize"):
+            return adapter.normalizeToGen3MDSFields(
+                data,
+                config=common.config,
+                mappings=common.field_mappings,
+                perItemValues=common.per_item_values,
+                keepOriginalFields=common.keep_original_fields,
+                globalFieldFilters=common.global_field_filters,
+                schema=self.commons_config.configuration.schema,
+            )
+
+    def commons(self) -> dict:
+        return {
+            **self.commons_config.gen3_commons,
+            **self.commons_config.adapter_commons,
+        }
+
+    async def populate(self, name: str, common, results: dict, stopwatch: Stopwatch):
+        update_metadata = datastore.update_metadata
+
+        async def timed_update_metadata(*args):
+            with stopwatch.phase("index"):
+                await update_metadata(*args)
+
+        with patch.object(datastore, "update_metadata", timed_update_metadata):
+            with stopwatch.phase("populate"):
+                await populate_metadata(
+                    name,
+                    common,
+                    results,
+                    use_temp_index=True,
+                    summary=self.summary,
+                )
+        # populate includes the datastore calls
+        stopwatch.phases["prepare"] = stopwatch.phases.pop("populate") - (
+            stopwatch.phases.get("index", 0.0)
+        )
+
+    async def run_once(self) -> dict:
+        """
+        Runs the pipeline over every commons. Returns the timings and counts of
+        each commons, and of the finalize step under "_finalize".
+        """
+        self.summary = AggregateSummary()
+        report = {}
+        for name, common in self.commons().items():
+            stopwatch = Stopwatch()
+            results = self.fetch(name, stopwatch)
+            documents = len(results)
+            size = _document_sizes(results)
+            if results:
+                await self.populate(name, common, results, stopwatch)
+            report[name] = {
+                "documents": documents,
+                "bytes": size,
+                "phases": stopwatch.phases,
+            }
+
+        stopwatch = Stopwatch()
+        with stopwatch.phase("finalize"):
+            await populate_info(self.commons_config, use_temp_index=True)
+            await populate_config(self.commons_config, use_temp_index=True)
+            await populate_summaries(self.summary, use_temp_index=True)
+        report["_finalize"] = {"phases": stopwatch.phases}
+        return report
+
+
+def summarize_runs(runs: list) -> dict:
+    """
+    Summary of each phase of each commons across the runs, with documents per
+    second for the index phase and the whole run.
+    """
+    results = {}
+    totals = []
+    for name in runs[0]:
+        documents = runs[0][name].get("documents")
+        for phase in runs[0][name]["phases"]:
+            samples = [run[name]["phases"].get(phase, 0.0) for run in runs]
+            items = documents if phase == "index" else None
+            results[f"{phase}[{name}]"] = summarize(samples, items)
+    for run in runs:
+        totals.append(sum(sum(commons["phases"].values()) for commons in run.values()))
+    documents = sum(commons.get("documents", 0) for commons in runs[0].values())
+    results["total"] = summarize(totals, documents)
+    return results
+
+
+async def _run_pipeline(benchmark, repeat: int, opensearch: str):
+    runs = []
+    if opensearch:
+        url = urlparse(opensearch)
+        await datastore.init(hostname=url.hostname, port=url.port)
+        mapping = {
+            "mappings": {
+                "properties": {
+                    config.AGG_MDS_DEFAULT_STUDY_DATA_FIELD: {
+                        "type": "nested",
+                        "properties": {
+                            k: v.to_schema(True)
+                            for k, v in benchmark.commons_config.configuration.schema.items()
+                        },
+                    }
+                }
+            }
+        }
+        try:
+            for _ in range(repeat):
+                await datastore.drop_all_temp_indexes()
+                await datastore.create_temp_indexes(commons_mapping=mapping)
+                runs.append(await benchmark.run_once())
+        finally:
+            await datastore.drop_all_temp_indexes()
+            await datastore.close()
+    else:
+        with InMemoryDatastore().installed():
+            for _ in range(repeat):
+                runs.append(await benchmark.run_once())
+    return runs
+
+
+@contextmanager
+def profiling(path: str):
+    if not path:
+        yield
+        return
+    if path.endswith(".html"):
+        from pyinstrument import Profiler
+
+        profiler = Profiler()
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            Path(path).write_text(profiler.output_html())
+        return
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(25)
+
+
+def record(args) -> None:
+    commons_config = parse_config_from_file(Path(args.config))
+    benchmark = PopulateBenchmark(commons_config)
+    fixtures = Path(args.fixtures)
+    fixtures.mkdir(parents=True, exist_ok=True)
+
+    def save(name: str, recorder: Recorder) -> None:
+        path = fixtures / f"{name}.json"
+        path.write_text(json.dumps({"exchanges": recorder.exchanges}))
+        print(f"Recorded {len(recorder.exchanges)} requests of {name} in {path}")
+
+    for name in benchmark.commons():
+        with Recorder().recording() as recorder:
+            benchmark.fetch(name, Stopwatch())
+        save(name, recorder)
+
+    settings = commons_config.configuration.settings
+    if settings.cache_drs and settings.drs_indexd_server:
+        with Recorder().recording() as recorder:
+            adapters.get_metadata("drs_indexd", settings.drs_indexd_server, None)
+        save(INFO_FIXTURE, recorder)
+
+
+def run(args) -> dict:
+    commons_config = parse_config_from_file(Path(args.config))
+    benchmark = PopulateBenchmark(commons_config)
+    replayer = Replayer.from_fixtures(Path(args.fixtures))
+
+    with replayer.replaying(), profiling(args.profile):
+        runs = asyncio.run(_run_pipeline(benchmark, args.repeat, args.opensearch))
+
+    results = summarize_runs(runs)
+    print_results(results)
+    if replayer.unmatched:
+        print(f"Warning: {len(replayer.unmatched)} requests were not recorded:")
+        for request in sorted(set(replayer.unmatched)):
+            print(f"  {request}")
+
+    last_run = runs[-1]
+    return write_results(
+        args.output,
+        "populate",
+        parameters={
+            "config": args.config,
+            "fixtures": args.fixtures,
+            "repeat": args.repeat,
+            "datastore": args.opensearch or "memory",
+        },
+        results=results,
+        commons={
+            name: {"documents": report["documents"], "bytes": report["bytes"]}
+            for name, report in last_run.items()
+            if "documents" in report
+        },
+        peak_rss_bytes=peak_rss_bytes(),
+        unmatched_requests=len(replayer.unmatched),
+    )
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    for command in ("record", "run"):
+        subparser = subparsers.add_parser(command)
+        subparser.add_argument("--config", required=True, help="aggregate config")
+        subparser.add_argument(
+            "--fixtures", required=True, help="directory of the recorded responses"
+        )
+    run_parser = subparsers.choices["run"]
+    run_parser.add_argument("--repeat", type=int, default=1)
+    run_parser.add_argument(
+        "--opensearch",
+        default=None,
+        help="OpenSearch URL, e.g. http://localhost:9200 (in-memory datastore "
+        "if not set)",
+    )
+    run_parser.add_argument(
+        "--profile", default=None, help="cProfile (.prof) or pyinstrument (.html) path"
+    )
+    run_parser.add_argument("--output", default="populate_benchmark.json")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command == "record":
+        record(args)
+    else:
+        run(args)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
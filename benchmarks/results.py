@@ -0,0 +1,136 @@
+"""
+Timing helpers and the JSON result format shared by the benchmarks.
+
+A result file looks like:
+
+    {
+        "benchmark": "metadata_api",
+        "environment": {"commit": "...", "python": "...", "timestamp": "..."},
+        "parameters": {...},
+        "results": {
+            "<case>": {"runs": 20, "min": ..., "median": ..., "p95": ...,
+                       "mean": ..., "max": ..., "items_per_second": ...},
+            ...
+        }
+    }
+
+Times are in seconds. `items_per_second` is only set for cases that process
+several items (records, documents) per run.
+"""
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+
+def summarize(samples: list[float], items: int = None) -> dict:
+    """
+    Statistics of the run times in `samples`. If each run processed `items`
+    items, also the number of items processed per second at the median.
+    """
+    ordered = sorted(samples)
+    median = statistics.median(ordered)
+    summary = {
+        "runs": len(ordered),
+        "min": ordered[0],
+        "median": median,
+        "p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        "mean": statistics.fmean(ordered),
+        "max": ordered[-1],
+    }
+    if items is not None:
+        summary["items"] = items
+        summary["items_per_second"] = items / median if median else None
+    return summary
+
+
+async def measure(run, repeat: int, items: int = None) -> dict:
+    """
+    Await `run()` `repeat` times and summarize the run times.
+    """
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await run()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples, items)
+
+
+class Stopwatch:
+    """
+    Accumulates the time spent in named phases:
+
+        with stopwatch.phase("fetch"):
+            ...
+    """
+
+    def __init__(self):
+        self.phases = {}
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + (
+                time.perf_counter() - start
+            )
+
+
+def peak_rss_bytes() -> int:
+    """
+    Peak resident set size of this process so far.
+    """
+    import resource
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+def write_results(
+    path: str, benchmark: str, parameters: dict, results: dict, **extra
+) -> dict:
+    report = {
+        "benchmark": benchmark,
+        "environment": environment(),
+        "parameters": parameters,
+        "results": results,
+        **extra,
+    }
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+        f.write("\n")
+    return report
+
+
+def print_results(results: dict) -> None:
+    for name, summary in results.items():
+        line = f"{name:<55} median {summary['median'] * 1000:10.2f} ms"
+        line += f"   p95 {summary['p95'] * 1000:10.2f} ms"
+        if summary.get("items_per_second"):
+            line += f"   {summary['items_per_second']:10.0f} items/s"
+        print(line)
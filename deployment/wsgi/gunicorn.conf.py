@@ -1,8 +1,74 @@
+"""
+Gunicorn settings. These can be overridden with environment variables:
+
+ * WEB_CONCURRENCY: number of worker processes (default: one per available CPU)
+ * GUNICORN_PRELOAD_APP: import the app once in the master process before
+   forking the workers (faster worker start, less memory; default false)
+ * GUNICORN_MAX_REQUESTS: restart a worker after this many requests, to bound
+   memory growth (0 disables it), with a random GUNICORN_MAX_REQUESTS_JITTER
+   added so that the workers don't all restart at once
+ * GUNICORN_TIMEOUT: seconds a worker can be silent before it is killed
+ * GUNICORN_GRACEFUL_TIMEOUT: seconds a worker has to finish its requests when
+   it is restarted or the server stops
+ * GUNICORN_KEEPALIVE: seconds to keep an idle connection from nginx open
+
+Each worker has its own database connection pool, sized so that all the pools
+together fit in DB_POOL_TOTAL_MAX_SIZE (see `mds.db.db_pool_sizes`).
+"""
 import logging
+import math
+import os
+
+
+def _cgroup_cpu_limit():
+    """
+    Container CPU limit: cgroup v2 `cpu.max`, or cgroup v1 `cpu.cfs_quota_us` and
+    `cpu.cfs_period_us`. None if there is no limit or it cannot be read.
+    """
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota == "max":
+            return None
+        return int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+            quota = int(f.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+            period = int(f.read())
+        # a quota of -1 means no limit
+        if quota > 0 and period > 0:
+            return quota / period
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def _available_cpus() -> int:
+    """
+    CPUs this process may run on, also taking into account a container CPU limit.
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    limit = _cgroup_cpu_limit()
+    if limit:
+        cpus = min(cpus, math.ceil(limit))
+    return max(cpus, 1)
+
+
+# set before importing mds, whose config reads it to size the per-worker
+# database pools
+os.environ.setdefault("WEB_CONCURRENCY", str(_available_cpus()))
+
 import gunicorn.glogging
 import cdislogging
 
 import mds.config
+import mds.db
 
 
 class CDISLogger(gunicorn.glogging.Logger):
@@ -34,11 +100,39 @@ class CDISLogger(gunicorn.glogging.Logger):
             )
 
 
+def child_exit(server, worker):
+    """
+    Remove the live-process metrics of exited workers when Prometheus metrics are
+    collected from several workers (see `mds.metrics`).
+    """
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
+
+
+def when_ready(server):
+    pool_min, pool_max = mds.db.db_pool_sizes()
+    server.log.info(
+        f"{workers} workers, each with a database pool of {pool_min} to {pool_max} "
+        f"connections (at most {workers * pool_max} in total)"
+    )
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    return os.environ.get(name, str(default)).lower() in ("1", "true", "yes")
+
+
 logger_class = CDISLogger
 wsgi_app = "deployment.wsgi.wsgi:app"
 bind = "0.0.0.0:8000"
-workers = 1
+workers = int(os.environ["WEB_CONCURRENCY"])
+preload_app = _env_bool("GUNICORN_PRELOAD_APP", False)
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 10000))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", 1000))
 user = "gen3"
 group = "gen3"
-timeout = 300
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 300))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", 5))
 worker_class = "uvicorn.workers.UvicornWorker"
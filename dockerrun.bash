@@ -1,4 +1,10 @@
 #!/bin/bash
 
 nginx
+
+# shared by the gunicorn workers to serve Prometheus metrics for all of them;
+# emptied on start so that metrics from a previous run are not served
+export PROMETHEUS_MULTIPROC_DIR=${PROMETHEUS_MULTIPROC_DIR:-/var/tmp/prometheus_metrics}
+rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
 poetry run gunicorn -c "/mds/deployment/wsgi/gunicorn.conf.py" mds.asgi:app
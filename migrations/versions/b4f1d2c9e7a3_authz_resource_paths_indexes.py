@@ -0,0 +1,55 @@
+"""authz resource paths indexes
+
+Revision ID: b4f1d2c9e7a3
+Revises: 6819874e85b9
+Create Date: 2026-10-19 10:42:11.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "b4f1d2c9e7a3"
+down_revision = "6819874e85b9"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """
+    Index the resource paths in the `authz` column so that reads can be filtered
+    by the resources a user has access to (`authz -> '<key>' ?| array[...]`).
+
+    The indexes are built concurrently, outside of the migration transaction, so
+    that writes to `metadata` are not blocked while they are built.
+    """
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "metadata_authz_resource_paths_idx",
+            "metadata",
+            [sa.text("(authz -> 'resource_paths')")],
+            postgresql_using="gin",
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "metadata_authz__resource_paths_idx",
+            "metadata",
+            [sa.text("(authz -> '_resource_paths')")],
+            postgresql_using="gin",
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "metadata_authz__resource_paths_idx",
+            table_name="metadata",
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            "metadata_authz_resource_paths_idx",
+            table_name="metadata",
+            postgresql_concurrently=True,
+        )
@@ -1,5 +1,27 @@
+import importlib.util
+import sys
+
 import cdislogging
 from . import config
 
 
 logger = cdislogging.get_logger(__name__, log_level="debug" if config.DEBUG else "info")
+
+
+def lazy_import(name: str):
+    """
+    Returns module `name`, only executed on first attribute access. For modules
+    that are slow to import and not needed by every process, e.g. the aggregate
+    MDS datastore when `USE_AGG_MDS` is false.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    spec.loader = importlib.util.LazyLoader(spec.loader)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    parent, _, child = name.rpartition(".")
+    if parent:
+        setattr(sys.modules[parent], child, module)
+    return module
@@ -1 +1,9 @@
-from .query import init_app
+from mds import config
+
+
+def init_app(app):
+    # the aggregate MDS endpoints and their dependencies are only imported when enabled
+    if config.USE_AGG_MDS:
+        from .query import init_app
+
+        init_app(app)
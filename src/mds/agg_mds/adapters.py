@@ -7,6 +7,9 @@ import xmltodict
 import bleach
 import logging
 import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
 from tenacity import (
     retry,
     RetryError,
@@ -17,6 +20,34 @@ from tenacity import (
 )
 from mds import logger
 
+# size of the responses received by the adapter that is fetching, see `_fetching`
+_received_bytes: ContextVar[Optional[int]] = ContextVar("received_bytes", default=None)
+
+
+def _count_received(response: httpx.Response) -> None:
+    """Adds the size of the response body to the bytes received by the fetch."""
+    received = _received_bytes.get()
+    if received is not None:
+        _received_bytes.set(received + len(response.content))
+
+
+@contextmanager
+def _fetching(report: Dict[str, Any]):
+    """
+    Adds the time spent in the block to `report["fetch_seconds"]`, and the size
+    of the responses received in it to `report["bytes"]`, even if it fails.
+    """
+    start = time.perf_counter()
+    received = _received_bytes.set(0)
+    try:
+        yield
+    finally:
+        report["fetch_seconds"] = (
+            report.get("fetch_seconds", 0.0) + time.perf_counter() - start
+        )
+        report["bytes"] = report.get("bytes", 0) + _received_bytes.get()
+        _received_bytes.reset(received)
+
 
 def strip_email(text: str):
     if not isinstance(text, str):
@@ -408,6 +439,7 @@ class MPSAdapter(RemoteMetadataAdapter):
                     # get url request put data into datadict
                     url = f"{mds_url}/{id}/"
                     response = httpx.get(url)
+                    _count_received(response)
                     response.raise_for_status()
 
                     data_dict = response.json()
@@ -500,6 +532,7 @@ class ISCPSRDublin(RemoteMetadataAdapter):
                 try:
                     url = f"{mds_url}?verb=GetRecord&metadataPrefix=oai_dc&identifier={id}"
                     response = httpx.get(url)
+                    _count_received(response)
                     response.raise_for_status()
 
                     xmlData = response.text
@@ -643,6 +676,7 @@ class ClinicalTrials(RemoteMetadataAdapter):
                     f"{mds_url}?expr={term}"
                     f"&fmt=json&min_rnk={offset}&max_rnk={offset + limit - 1}"
                 )
+                _count_received(response)
                 response.raise_for_status()
 
                 data = response.json()
@@ -787,6 +821,7 @@ class PDAPS(RemoteMetadataAdapter):
                 response = httpx.get(
                     f"{mds_url}/siteitem/{id}/get_by_dataset?site_key=56e805b9d6c9e75c1ac8cb12"
                 )
+                _count_received(response)
                 response.raise_for_status()
                 results["results"].append(response.json())
 
@@ -888,6 +923,7 @@ class HarvardDataverse(RemoteMetadataAdapter):
                     f"{mds_url}/datasets/:persistentId/?persistentId={persistent_id}"
                 )
                 response = httpx.get(dataset_url)
+                _count_received(response)
                 response.raise_for_status()
 
                 data = response.json()
@@ -930,6 +966,7 @@ class HarvardDataverse(RemoteMetadataAdapter):
                         f"{mds_url}/access/datafile/{data_file['id']}/metadata/ddi"
                     )
                     ddi_response = httpx.get(ddi_url)
+                    _count_received(ddi_response)
                     if ddi_response.status_code == 200:
                         ddi_entry = xmltodict.parse(ddi_response.text)
                         vars = (
@@ -1071,6 +1108,7 @@ class Gen3Adapter(RemoteMetadataAdapter):
                 if field_name is not None and field_value is not None:
                     url += f"&{guid_type}.{field_name}={field_value}"
                 response = httpx.get(url, timeout=60)
+                _count_received(response)
                 response.raise_for_status()
 
                 data = response.json()
@@ -1206,6 +1244,7 @@ class DRSIndexdAdapter(RemoteMetadataAdapter):
 
         try:
             response = httpx.get(f"{mds_url}/index/_dist")
+            _count_received(response)
             response.raise_for_status()
             data = response.json()
             # process the entries and create a DRS cache
@@ -1264,6 +1303,7 @@ class ICDCAdapter(RemoteMetadataAdapter):
         }
         try:
             response = httpx.post(mds_url, json=queryObj)
+            _count_received(response)
             response.raise_for_status()
             results["results"].append(response.json())
 
@@ -1356,6 +1396,7 @@ class GDCAdapter(RemoteMetadataAdapter):
                 response = httpx.get(
                     f"{mds_url}?expand=summary&from={offset}&size={batchSize}"
                 )
+                _count_received(response)
                 response.raise_for_status()
 
                 response_data = response.json()
@@ -1462,6 +1503,7 @@ class CIDCAdapter(RemoteMetadataAdapter):
 
         try:
             response = httpx.get(mds_url)
+            _count_received(response)
             response.raise_for_status()
 
             response_data = response.json()
@@ -1563,6 +1605,7 @@ class PDCAdapter(RemoteMetadataAdapter):
         subject_catalog_query = "{studyCatalog(acceptDUA: true){pdc_study_id}}"
         try:
             response = httpx.post(mds_url, json={"query": subject_catalog_query})
+            _count_received(response)
             response.raise_for_status()
             response_data = response.json()
             pid_list = [
@@ -1611,6 +1654,7 @@ class PDCAdapter(RemoteMetadataAdapter):
                 response = httpx.post(
                     mds_url, json={"query": subject_query_string}, timeout=60
                 )
+                _count_received(response)
                 response.raise_for_status()
                 record_list.update(response.json()["data"])
                 logger.info(
@@ -2050,6 +2094,7 @@ query FilteredClinicalDataPaginated($offset_value: Int, $limit_value: Int, $sort
             response = httpx.post(
                 mds_url, json={"query": query, "variables": variables}
             )
+            _count_received(response)
             response.raise_for_status()
             response_data = response.json()
             results["results"] = response_data["data"]["getPaginatedUIClinical"][
@@ -2292,6 +2337,7 @@ class PDCStudyAdapter(RemoteMetadataAdapter):
             response = httpx.post(
                 mds_url, json={"query": query, "variables": variables}
             )
+            _count_received(response)
             response.raise_for_status()
             response_data = response.json()
             results["results"] = response_data["data"]["getPaginatedUIStudy"][
@@ -2396,6 +2442,7 @@ class TCIAAdapter(RemoteMetadataAdapter):
 
         try:
             response = httpx.get(mds_url)
+            _count_received(response)
             response.raise_for_status()
 
             response_data = response.json()
@@ -2491,6 +2538,7 @@ class WindberSubjectAdapter(RemoteMetadataAdapter):
 
         try:
             response = httpx.get(mds_url)
+            _count_received(response)
             response.raise_for_status()
 
             response_data = response.json()
@@ -2577,11 +2625,22 @@ def gather_metadata(
     keepOriginalFields,
     globalFieldFilters,
     schema,
+    report=None,
 ):
+    """
+    Fetches and normalizes the metadata of a commons. If a `report` dict is
+    given, the time spent fetching and normalizing is added to its
+    "fetch_seconds" and "normalize_seconds", the size of the responses received
+    to its "bytes", and a failure is recorded in its "error".
+    """
+    if report is None:
+        report = {}
     try:
-        json_data = gather.getRemoteDataAsJson(
-            mds_url=mds_url, filters=filters, config=config
-        )
+        with _fetching(report):
+            json_data = gather.getRemoteDataAsJson(
+                mds_url=mds_url, filters=filters, config=config
+            )
+        fetched = time.perf_counter()
         results = gather.normalizeToGen3MDSFields(
             json_data,
             config=config,
@@ -2591,13 +2650,18 @@ def gather_metadata(
             globalFieldFilters=globalFieldFilters,
             schema=schema,
         )
+        report["normalize_seconds"] = (
+            report.get("normalize_seconds", 0.0) + time.perf_counter() - fetched
+        )
         logger.debug("Result after normalizing: ")
         logger.debug(results)
         return results
     except ValueError as exc:
         logger.error(f"Exception occurred: {exc}. Returning no results")
+        report["error"] = str(exc)
     except RetryError:
         logger.error("Multiple retries failed. Returning no results")
+        report["error"] = "multiple retries failed"
     return {}
 
 
@@ -2630,6 +2694,7 @@ def get_metadata(
     keepOriginalFields=False,
     globalFieldFilters=None,
     schema=None,
+    report=None,
 ):
     if config is None:
         config = {}
@@ -2645,6 +2710,8 @@ def get_metadata(
         logger.error(
             f"unknown adapter for commons {adapter_name}. Returning no results."
         )
+        if report is not None:
+            report["error"] = f"unknown adapter {adapter_name}"
         return {}
 
     return gather_metadata(
@@ -2657,4 +2724,5 @@ def get_metadata(
         keepOriginalFields=keepOriginalFields,
         globalFieldFilters=globalFieldFilters,
         schema=schema,
+        report=report,
     )
@@ -0,0 +1,138 @@
+"""
+In-process cache for the aggregate read endpoints.
+
+The aggregate indexes only change when populate runs, so responses are cached
+per index generation: populate writes a fresh generation id into the info index
+and, once that generation goes live, every entry from the previous one is
+dropped. Bodies are stored already serialized, plus a gzip copy for clients
+that accept it.
+"""
+import gzip
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Optional, Tuple
+
+from fastapi.encoders import jsonable_encoder
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+
+from mds import config, logger
+from mds.agg_mds import datastore
+
+# bodies smaller than this are not worth compressing
+GZIP_MINIMUM_SIZE = 500
+
+
+@dataclass
+class CachedResponse:
+    generation: str
+    body: bytes
+    gzip_body: Optional[bytes] = None
+
+    @classmethod
+    def from_content(cls, content: Any, generation: str) -> "CachedResponse":
+        body = JSONResponse(jsonable_encoder(content)).body
+        gzip_body = gzip.compress(body) if len(body) >= GZIP_MINIMUM_SIZE else None
+        return cls(generation=generation, body=body, gzip_body=gzip_body)
+
+    def to_response(self, request: Request) -> Response:
+        headers = {"Vary": "Accept-Encoding"}
+        body = self.body
+        if self.gzip_body and "gzip" in request.headers.get("accept-encoding", ""):
+            headers["Content-Encoding"] = "gzip"
+            body = self.gzip_body
+        return Response(content=body, media_type="application/json", headers=headers)
+
+
+class ResponseCache:
+    """
+    LRU cache of serialized responses, keyed by request path and query
+    parameters, valid for a single index generation.
+    """
+
+    def __init__(self, max_entries: int, generation_ttl: float):
+        self.max_entries = max_entries
+        self.generation_ttl = generation_ttl
+        self._entries: "OrderedDict[Tuple, CachedResponse]" = OrderedDict()
+        self._generation: Optional[str] = None
+        self._generation_checked_at: Optional[float] = None
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._generation = None
+        self._generation_checked_at = None
+
+    async def current_generation(self) -> Optional[str]:
+        """
+        Returns the live index generation id, re-reading it from the datastore
+        at most once every `generation_ttl` seconds. Entries belonging to an
+        older generation are dropped as soon as a new one is seen.
+        """
+        now = time.monotonic()
+        if (
+            self._generation_checked_at is None
+            or now - self._generation_checked_at >= self.generation_ttl
+        ):
+            generation = await datastore.get_generation()
+            self._generation_checked_at = now
+            if generation != self._generation:
+                logger.info(
+                    f"aggregate index generation changed from {self._generation} "
+                    f"to {generation}, clearing {len(self._entries)} cached responses"
+                )
+                self._entries.clear()
+                self._generation = generation
+        return self._generation
+
+    async def respond(
+        self,
+        request: Request,
+        compute: Callable[[], Awaitable[Any]],
+        key: Optional[Tuple] = None,
+    ) -> Any:
+        """
+        Returns the cached response for this request if there is one for the
+        live generation, otherwise awaits `compute()` and caches its result.
+
+        Entries are keyed by request path and query string unless a `key` is
+        given, e.g. the parsed parameters, so that equivalent requests share
+        one entry.
+
+        Nothing is cached while the generation is unknown (e.g. before the first
+        populate run that records one) or when `compute()` returns an empty
+        result, since the datastore helpers return empty values on errors.
+        Exceptions raised by `compute()` propagate uncached.
+        """
+        if not config.AGG_MDS_RESPONSE_CACHE:
+            return await compute()
+
+        generation = await self.current_generation()
+        if generation is None:
+            return await compute()
+
+        if key is None:
+            key = (
+                request.url.path,
+                tuple(sorted(request.query_params.multi_items())),
+            )
+        entry = self._entries.get(key)
+        if entry is not None and entry.generation == generation:
+            self._entries.move_to_end(key)
+            return entry.to_response(request)
+
+        content = await compute()
+        if not content:
+            return content
+
+        entry = CachedResponse.from_content(content, generation)
+        self._entries[key] = entry
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return entry.to_response(request)
+
+
+response_cache = ResponseCache(
+    max_entries=config.AGG_MDS_RESPONSE_CACHE_MAX_ENTRIES,
+    generation_ttl=config.AGG_MDS_RESPONSE_CACHE_GENERATION_TTL,
+)
@@ -1,4 +1,7 @@
-import mds.agg_mds.datastore.elasticsearch_dao as client
+from mds import lazy_import
+
+# opensearchpy is only imported when the datastore is first used
+client = lazy_import("mds.agg_mds.datastore.elasticsearch_dao")
 
 """
 This abstraction may seem pointless, but workds towards a few goals. This adds
@@ -52,10 +55,30 @@ async def update_global_info(*args):
     await client.update_global_info(*args)
 
 
+async def update_generation(*args):
+    await client.update_generation(*args)
+
+
+async def update_tags_summary(*args):
+    await client.update_tags_summary(*args)
+
+
+async def update_commons_summary(*args):
+    await client.update_commons_summary(*args)
+
+
 async def update_config_info(*args):
     await client.update_config_info(*args)
 
 
+async def update_populate_report(*args):
+    await client.update_populate_report(*args)
+
+
+async def get_generation():
+    return await client.get_generation()
+
+
 async def get_commons_metadata(*args):
     return await client.get_commons_metadata(*args)
 
@@ -72,6 +95,10 @@ async def get_by_guid(*args):
     return await client.get_by_guid(*args)
 
 
+async def get_by_guids(*args):
+    return await client.get_by_guids(*args)
+
+
 async def get_commons_attribute(*args):
     return await client.get_commons_attribute(*args)
 
@@ -1,7 +1,14 @@
-from opensearchpy import OpenSearch, exceptions as os_exceptions, helpers
+from opensearchpy import (
+    OpenSearch,
+    Urllib3HttpConnection,
+    exceptions as os_exceptions,
+    helpers,
+)
 from typing import Any, List, Dict, Union, Optional, Tuple
 from math import ceil
 from mds import logger
+from mds.metrics import observe_opensearch_request
+from mds.tracing import start_span
 from mds.config import (
     AGG_MDS_NAMESPACE,
     ES_RETRY_LIMIT,
@@ -19,6 +26,21 @@ AGG_MDS_INDEX_TEMP = f"{AGG_MDS_NAMESPACE}-commons-index-temp"
 AGG_MDS_INFO_INDEX = f"{AGG_MDS_NAMESPACE}-commons-info-index"
 AGG_MDS_INFO_TYPE = "commons-info"
 AGG_MDS_INFO_INDEX_TEMP = f"{AGG_MDS_NAMESPACE}-commons-info-index-temp"
+# id of the Commons Info document holding the id of the current index generation
+AGG_MDS_GENERATION_ID = "generation"
+# ids of the Commons Info documents holding the tag counts and commons list
+# computed by populate
+AGG_MDS_TAGS_SUMMARY_ID = "tags_summary"
+AGG_MDS_COMMONS_SUMMARY_ID = "commons_summary"
+# id of the Commons Info document holding the report of the last populate run
+AGG_MDS_POPULATE_REPORT_ID = "populate_report"
+# internal Commons Info documents, never served as commons info
+AGG_MDS_RESERVED_INFO_IDS = (
+    AGG_MDS_GENERATION_ID,
+    AGG_MDS_TAGS_SUMMARY_ID,
+    AGG_MDS_COMMONS_SUMMARY_ID,
+    AGG_MDS_POPULATE_REPORT_ID,
+)
 
 AGG_MDS_CONFIG_INDEX = f"{AGG_MDS_NAMESPACE}-commons-config-index"
 AGG_MDS_CONFIG_TYPE = "commons-config"
@@ -85,10 +107,31 @@ SEARCH_CONFIG = {
 elastic_search_client = None
 
 
+class TimedConnection(Urllib3HttpConnection):
+    """
+    Connection that records the time of each request in the OpenSearch metrics,
+    and in a span when tracing is enabled.
+    """
+
+    def perform_request(self, method, url, *args, **kwargs):
+        start = time.perf_counter()
+        attributes = {
+            "db.system": "opensearch",
+            "http.request.method": method,
+            "url.path": url.split("?")[0],
+        }
+        try:
+            with start_span(f"OpenSearch {method}", attributes):
+                return super().perform_request(method, url, *args, **kwargs)
+        finally:
+            observe_opensearch_request(method, url, time.perf_counter() - start)
+
+
 async def init(hostname: str = "0.0.0.0", port: int = 9200):
     global elastic_search_client
     elastic_search_client = OpenSearch(
         hosts=[f"{hostname}:{port}"],
+        connection_class=TimedConnection,
         timeout=ES_RETRY_INTERVAL,
         max_retries=ES_RETRY_LIMIT,
         retry_on_timeout=True,
@@ -262,6 +305,44 @@ async def update_global_info(key, doc, use_temp_index: bool = False) -> None:
     elastic_search_client.index(index=index_to_update, id=key, body=doc)
 
 
+async def update_generation(generation: str, use_temp_index: bool = False) -> None:
+    index_to_update = AGG_MDS_INFO_INDEX_TEMP if use_temp_index else AGG_MDS_INFO_INDEX
+    elastic_search_client.index(
+        index=index_to_update,
+        id=AGG_MDS_GENERATION_ID,
+        body={"id": generation},
+    )
+
+
+async def update_tags_summary(tags: List[Dict], use_temp_index: bool = False) -> None:
+    index_to_update = AGG_MDS_INFO_INDEX_TEMP if use_temp_index else AGG_MDS_INFO_INDEX
+    elastic_search_client.index(
+        index=index_to_update,
+        id=AGG_MDS_TAGS_SUMMARY_ID,
+        body={"tags": tags},
+    )
+
+
+async def update_commons_summary(
+    commons: List[str], use_temp_index: bool = False
+) -> None:
+    index_to_update = AGG_MDS_INFO_INDEX_TEMP if use_temp_index else AGG_MDS_INFO_INDEX
+    elastic_search_client.index(
+        index=index_to_update,
+        id=AGG_MDS_COMMONS_SUMMARY_ID,
+        body={"commons": commons},
+    )
+
+
+async def update_populate_report(report: Dict, use_temp_index: bool = False) -> None:
+    index_to_update = AGG_MDS_INFO_INDEX_TEMP if use_temp_index else AGG_MDS_INFO_INDEX
+    elastic_search_client.index(
+        index=index_to_update,
+        id=AGG_MDS_POPULATE_REPORT_ID,
+        body=report,
+    )
+
+
 async def update_config_info(doc, use_temp_index: bool = False) -> None:
     index_to_update = (
         AGG_MDS_CONFIG_INDEX_TEMP if use_temp_index else AGG_MDS_CONFIG_INDEX
@@ -283,8 +364,25 @@ async def close():
     pass
 
 
+def get_info_document(id: str) -> Optional[dict]:
+    """
+    Returns the source of a Commons Info document, or None if there is no
+    document with that id.
+    """
+    try:
+        return elastic_search_client.get(index=AGG_MDS_INFO_INDEX, id=id)["_source"]
+    except os_exceptions.NotFoundError:
+        return None
+
+
 async def get_commons():
     try:
+        summary = get_info_document(AGG_MDS_COMMONS_SUMMARY_ID)
+        if summary is not None:
+            return {"commons": summary["commons"]}
+
+        # indexes populated before summaries were written
+        logger.warning("commons summary not found, aggregating commons names")
         res = elastic_search_client.search(
             index=AGG_MDS_INDEX,
             body={
@@ -462,6 +560,18 @@ async def get_all_named_commons_metadata(name):
 
 async def metadata_tags():
     try:
+        summary = get_info_document(AGG_MDS_TAGS_SUMMARY_ID)
+        if summary is not None:
+            return {
+                tag["category"]: {
+                    "total": tag["total"],
+                    "names": [{n["name"]: n["count"] for n in tag["names"]}],
+                }
+                for tag in summary["tags"]
+            }
+
+        # indexes populated before summaries were written
+        logger.warning("tags summary not found, aggregating tags")
         res = elastic_search_client.search(
             index=AGG_MDS_INDEX,
             body={
@@ -503,6 +613,8 @@ async def metadata_tags():
 
 
 async def get_commons_attribute(name):
+    if name in AGG_MDS_RESERVED_INFO_IDS:
+        return None
     try:
         data = elastic_search_client.search(
             index=AGG_MDS_INFO_INDEX,
@@ -556,3 +668,40 @@ async def get_by_guid(guid):
     except Exception as error:
         logger.error(error)
         return None
+
+
+async def get_by_guids(
+    guids: List[str], fields: Optional[List[str]] = None
+) -> Optional[Dict[str, dict]]:
+    """
+    Fetches many metadata records in a single multi-get. Returns a dict of
+    guid to record for the guids that were found, optionally restricted to
+    the given source fields.
+    """
+    try:
+        params = {"_source_includes": fields} if fields else {}
+        data = elastic_search_client.mget(
+            index=AGG_MDS_INDEX,
+            body={"ids": guids},
+            **params,
+        )
+        return {doc["_id"]: doc["_source"] for doc in data["docs"] if doc.get("found")}
+    except Exception as error:
+        logger.error(error)
+        return None
+
+
+async def get_generation() -> Optional[str]:
+    """
+    Returns the id of the index generation currently live, as written by the
+    last populate run, or None if it cannot be read.
+    """
+    try:
+        data = elastic_search_client.get(
+            index=AGG_MDS_INFO_INDEX,
+            id=AGG_MDS_GENERATION_ID,
+        )
+        return data["_source"].get("id")
+    except Exception as error:
+        logger.debug(f"unable to read index generation: {error}")
+        return None
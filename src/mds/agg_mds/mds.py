@@ -1,3 +1,5 @@
+from typing import Optional
+
 import httpx
 from mds import logger
 import logging
@@ -20,11 +22,14 @@ httpx.Client(timeout=20.0)
     wait=wait_random_exponential(multiplier=1, max=20),
     before_sleep=before_sleep_log(logger, logging.DEBUG),
 )
-def pull_mds(baseURL: str, guid_type: str, batchSize: int = 1000) -> dict:
+def pull_mds(
+    baseURL: str, guid_type: str, batchSize: int = 1000, report: Optional[dict] = None
+) -> dict:
     """
     Pull all data from the MDS server at the baseURL. Will pull data using paging in set of "batchsize"
     until all data from NDS is completed. Note that the httpx get request probably needs a retry using
-    tenacity or some other retry pattern.
+    tenacity or some other retry pattern. If a `report` dict is given, the size of the responses
+    received is added to its "bytes".
     """
 
     more = True
@@ -34,6 +39,8 @@ def pull_mds(baseURL: str, guid_type: str, batchSize: int = 1000) -> dict:
         url = f"{baseURL}/mds/metadata?data=True&_guid_type={guid_type}&limit={batchSize}&offset={offset}"
         try:
             response = httpx.get(url)
+            if report is not None:
+                report["bytes"] = report.get("bytes", 0) + len(response.content)
             response.raise_for_status()
 
             data = response.json()
@@ -1,16 +1,34 @@
 from fastapi import HTTPException, Path, Query, APIRouter, Request, Depends
-from starlette.status import HTTP_404_NOT_FOUND
+from starlette.status import (
+    HTTP_400_BAD_REQUEST,
+    HTTP_404_NOT_FOUND,
+    HTTP_500_INTERNAL_SERVER_ERROR,
+)
 from mds import config
 from mds.agg_mds import datastore
-from typing import Any, Dict, List
+from mds.agg_mds.cache import response_cache
+from typing import Any, Dict, List, Optional
 from pydantic import BaseModel
 from mds.authorizations import metadata_queries_access_required
 
 mod = APIRouter()
 
 
+class GuidsQuery(BaseModel):
+    """
+    Batch lookup of metadata records.
+
+    guids (list): GUIDs of the records to return
+    fields (list, optional): only return these fields of each record, e.g.
+        "gen3_discovery.study_title"; all fields are returned when omitted
+    """
+
+    guids: List[str]
+    fields: Optional[List[str]] = None
+
+
 @mod.get("/aggregate/commons")
-async def get_commons():
+async def get_commons(request: Request):
     """Returns a list of all commons with data in the aggregate metadata-service
 
     Example:
@@ -18,11 +36,11 @@ async def get_commons():
         { commons: ["commonsA", "commonsB" ] }
 
     """
-    return await datastore.get_commons()
+    return await response_cache.respond(request, datastore.get_commons)
 
 
 @mod.get("/aggregate/info/{what}")
-async def get_commons_info(what: str):
+async def get_commons_info(what: str, request: Request):
     """Returns status and configuration information about aggregate metadata service.
 
     Return configuration information. Currently supports only 1 information type:
@@ -56,7 +74,9 @@ async def get_commons_info(what: str):
     }
 
     """
-    res = await datastore.get_commons_attribute(what)
+    res = await response_cache.respond(
+        request, lambda: datastore.get_commons_attribute(what)
+    )
     if res:
         return res
     else:
@@ -68,7 +88,7 @@ async def get_commons_info(what: str):
 
 @mod.get("/aggregate/metadata")
 async def get_aggregate_metadata(
-    _: Request,
+    request: Request,
     limit: int = Query(
         20, description="Maximum number of records returned. (e.g. max: 2000)"
     ),
@@ -136,10 +156,18 @@ async def get_aggregate_metadata(
     the field value with its length. If the field values is None it will replace it with 0.
     All other types will be unchanged.
     """
-    results = await datastore.get_all_metadata(limit, offset, counts, flatten)
-    if pagination is False:
-        return results.get("results", {})
-    return results
+
+    async def compute():
+        results = await datastore.get_all_metadata(limit, offset, counts, flatten)
+        if pagination is False:
+            return results.get("results", {})
+        return results
+
+    # only the first pages are requested often enough to be worth caching
+    if offset + limit <= config.AGG_MDS_RESPONSE_CACHE_MAX_OFFSET:
+        key = (request.url.path, limit, offset, counts, flatten, pagination)
+        return await response_cache.respond(request, compute, key=key)
+    return await compute()
 
 
 @mod.get("/aggregate/metadata/{name}")
@@ -188,7 +216,7 @@ async def get_aggregate_metadata_for_commons(
 
 
 @mod.get("/aggregate/tags")
-async def get_aggregate_tags():
+async def get_aggregate_tags(request: Request):
     """Returns aggregate category, name and counts across all commons
 
     Example:
@@ -213,7 +241,7 @@ async def get_aggregate_tags():
               }
             }
     """
-    res = await datastore.get_all_tags()
+    res = await response_cache.respond(request, datastore.get_all_tags)
     if res:
         return res
     else:
@@ -243,6 +271,55 @@ async def get_aggregate_metadata_commons_info(name: str):
         )
 
 
+@mod.post("/aggregate/metadata/guids")
+async def get_aggregate_metadata_guids(body: GuidsQuery):
+    """Returns the metadata records for many GUIDs at once
+
+    Records that exist are returned under `results`, keyed by GUID; GUIDs
+    without a record are listed in `not_found`. Use `fields` to only return
+    part of each record.
+
+    Example request:
+
+        {
+            "guids": ["guid1", "guid2", "guid3"],
+            "fields": ["gen3_discovery.study_title"]
+        }
+
+    Example response:
+
+        {
+            "results": {
+                "guid1": {"gen3_discovery": {"study_title": "cat"}},
+                "guid2": {"gen3_discovery": {"study_title": "bear"}}
+            },
+            "not_found": ["guid3"]
+        }
+    """
+    guids = list(dict.fromkeys(body.guids))
+    if len(guids) > config.METADATA_QUERY_RESULTS_LIMIT:
+        raise HTTPException(
+            HTTP_400_BAD_REQUEST,
+            {
+                "message": f"at most {config.METADATA_QUERY_RESULTS_LIMIT} guids can be requested at once",
+                "code": 400,
+            },
+        )
+    if not guids:
+        return {"results": {}, "not_found": []}
+
+    res = await datastore.get_by_guids(guids, body.fields)
+    if res is None:
+        raise HTTPException(
+            HTTP_500_INTERNAL_SERVER_ERROR,
+            {"message": "error retrieving metadata from service", "code": 500},
+        )
+    return {
+        "results": res,
+        "not_found": [guid for guid in guids if guid not in res],
+    }
+
+
 @mod.get("/aggregate/metadata/guid/{guid:path}")
 async def get_aggregate_metadata_guid(guid: str):
     """Returns a metadata record by GUID
@@ -1,4 +1,15 @@
-from fastapi import Depends, HTTPException, Security
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+import jwt
+from authutils.errors import AuthError, JWTError
+from authutils.token import core as token_core
+from authutils.token.keys import get_pem_key
+from fastapi import Depends, HTTPException, Request, Security
 from fastapi.security import (
     HTTPAuthorizationCredentials,
     HTTPBasic,
@@ -6,16 +17,278 @@ from fastapi.security import (
     HTTPBearer,
 )
 from gen3authz.client.arborist.async_client import ArboristClient
-from starlette.status import HTTP_403_FORBIDDEN
+from starlette.status import (
+    HTTP_401_UNAUTHORIZED,
+    HTTP_403_FORBIDDEN,
+    HTTP_500_INTERNAL_SERVER_ERROR,
+)
 
 from . import config, logger
+from .http_client import TimedAsyncClient
 
 security = HTTPBasic(auto_error=False)
 bearer = HTTPBearer(auto_error=False)
+
+
+class ArboristHTTPClient(TimedAsyncClient):
+    upstream = "arborist"
+
+
 arborist = ArboristClient()
+# the Arborist client creates a new httpx client for each request
+arborist.client_cls = ArboristHTTPClient
+
+
+class AuthzDecisionCache:
+    """
+    Short-lived LRU cache of Arborist authorization decisions, keyed by a hash of
+    the token and the (service, method, resource) being checked.
+
+    Allowed decisions are kept for `ttl` seconds, but never past the token's
+    `exp`. Denied decisions are kept for `negative_ttl` seconds. The resources a
+    token can read (see `readable_resources`) are cached the same way.
+    """
+
+    def __init__(self, ttl: float, negative_ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple, Tuple[Any, float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    @staticmethod
+    def _token_expiration(token: str) -> Optional[float]:
+        # The signature is checked by Arborist, this is only used to bound the
+        # lifetime of a cached decision
+        try:
+            claims = jwt.decode(token, options={"verify_signature": False})
+            return float(claims["exp"])
+        except Exception:
+            return None
+
+    def _lookup(self, key: Tuple, now: float) -> Tuple[bool, Any]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, expires_at = entry
+            if now < expires_at:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, value
+            del self._entries[key]
+        self.misses += 1
+        return False, None
+
+    def _store(self, key: Tuple, value: Any, expires_at: float, now: float) -> None:
+        if expires_at > now:
+            self._entries[key] = (value, expires_at)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    async def auth_request(
+        self, token: str, service: str, method: str, resource: str
+    ) -> bool:
+        """
+        Returns Arborist's decision for the token to perform `method` on
+        `resource` for `service`, from the cache when possible.
+        """
+        if self.ttl <= 0:
+            return await arborist.auth_request(token, service, method, resource)
+
+        key = (
+            hashlib.sha256(token.encode()).hexdigest(),
+            service,
+            method,
+            resource,
+        )
+        now = time.time()
+        found, allowed = self._lookup(key, now)
+        if found:
+            return allowed
+
+        allowed = bool(await arborist.auth_request(token, service, method, resource))
+
+        if allowed:
+            expires_at = now + self.ttl
+            token_expiration = self._token_expiration(token)
+            if token_expiration is None:
+                # can't tell when the token expires, so don't cache an allowed decision
+                return allowed
+            expires_at = min(expires_at, token_expiration)
+        else:
+            expires_at = now + self.negative_ttl
+
+        self._store(key, allowed, expires_at, now)
+        return allowed
+
+    async def readable_resources(self, token: Optional[str]) -> List[str]:
+        """
+        Returns the resource paths the token (or an anonymous user, if there is
+        no token) can `read` in the `mds_gateway` service, according to
+        Arborist's auth mapping. Cached like allowed decisions.
+        """
+        if self.ttl > 0:
+            key = (hashlib.sha256((token or "").encode()).hexdigest(), "mapping")
+            now = time.time()
+            found, resources = self._lookup(key, now)
+            if found:
+                return resources
+
+        mapping = await arborist.auth_mapping(jwt=token or "")
+        resources = sorted(
+            path
+            for path, permissions in mapping.items()
+            if any(
+                permission.get("method") in ("read", "*")
+                and permission.get("service") in ("mds_gateway", "*")
+                for permission in permissions
+            )
+        )
+
+        if self.ttl > 0:
+            expires_at = now + self.ttl
+            if token:
+                token_expiration = self._token_expiration(token)
+                if token_expiration is None:
+                    return resources
+                expires_at = min(expires_at, token_expiration)
+            self._store(key, resources, expires_at, now)
+        return resources
+
+
+authz_cache = AuthzDecisionCache(
+    ttl=config.AUTHZ_CACHE_TTL,
+    negative_ttl=config.AUTHZ_CACHE_NEGATIVE_TTL,
+    max_entries=config.AUTHZ_CACHE_MAX_ENTRIES,
+)
+
+# an unknown `kid` triggers a refetch of the issuer's keys at most this often
+JWKS_MIN_REFRESH_INTERVAL = 60
+
+# issuer -> (time fetched, {kid: public key})
+_jwks_cache = {}
+# issuer -> fetch of its keys in progress, shared by concurrent callers
+_jwks_pending: Dict[str, asyncio.Future] = {}
+
+
+async def _get_public_keys(
+    issuer: str, client: httpx.AsyncClient, refresh: bool = False
+) -> dict:
+    """
+    Returns the issuer's public keys by `kid`, fetching them with `client` when
+    they are not cached, older than AUTHZ_JWKS_CACHE_TTL, or `refresh` is
+    requested and the cached keys are older than JWKS_MIN_REFRESH_INTERVAL.
+    While the keys of an issuer are being fetched, other callers wait for that
+    fetch instead of starting their own.
+    """
+    cached = _jwks_cache.get(issuer)
+    if cached:
+        age = time.monotonic() - cached[0]
+        max_age = JWKS_MIN_REFRESH_INTERVAL if refresh else config.AUTHZ_JWKS_CACHE_TTL
+        if age < max_age:
+            return cached[1]
+
+    pending = _jwks_pending.get(issuer)
+    if pending is None:
+        pending = asyncio.ensure_future(_fetch_public_keys(issuer, client))
+        _jwks_pending[issuer] = pending
+        pending.add_done_callback(lambda _: _jwks_pending.pop(issuer, None))
+    # a waiter being cancelled must not cancel the fetch the others are sharing
+    return await asyncio.shield(pending)
+
+
+async def _fetch_public_keys(issuer: str, client: httpx.AsyncClient) -> dict:
+    # looking up the keys url may do a (blocking) OIDC discovery request, unless
+    # FORCE_ISSUER is set and the keys are read from <issuer>/jwt/keys
+    keys_url = await asyncio.get_running_loop().run_in_executor(
+        None, token_core.get_keys_url, issuer, config.FORCE_ISSUER
+    )
+    response = await client.get(keys_url)
+    response.raise_for_status()
+    keys = dict(get_pem_key(key) for key in response.json()["keys"])
+    _jwks_cache[issuer] = (time.monotonic(), keys)
+    return keys
+
+
+async def validate_token(token: str, client: httpx.AsyncClient) -> None:
+    """Rejects bad tokens locally, before they are sent to Arborist.
+
+    Checks that the token is a well-formed JWT that has not expired. When
+    ALLOWED_ISSUERS is configured, also checks that the token comes from one of
+    them and that its signature verifies against the issuer's (cached) public
+    keys. If the keys can't be fetched, the token is left for Arborist to
+    validate.
+
+    Does nothing when AUTHZ_VALIDATE_TOKENS_LOCALLY is False.
+
+    Args:
+        token: encoded JWT from the Authorization header
+        client: HTTP client to fetch the issuer's public keys with (the app's)
+
+    Raises:
+        HTTPException: With status code 401 if the token is malformed, expired
+        or badly signed, or 403 if it comes from an issuer that is not allowed.
+    """
+    if not config.AUTHZ_VALIDATE_TOKENS_LOCALLY:
+        return
+
+    try:
+        kid = token_core.get_kid(token)
+        # also checks `exp`
+        issuer = token_core.get_iss(token)
+    except JWTError as err:
+        logger.error(f"Authorization error: bad bearer token: {err}")
+        raise HTTPException(HTTP_401_UNAUTHORIZED, f"Bad bearer token: {err}")
+
+    if not config.ALLOWED_ISSUERS:
+        # no trusted issuers to fetch keys from, leave the signature to Arborist
+        return
+    if issuer not in config.ALLOWED_ISSUERS:
+        logger.error(f"Authorization error: issuer is not allowed: {issuer}")
+        raise HTTPException(
+            HTTP_403_FORBIDDEN, f"Bad bearer token: issuer is not allowed: {issuer}"
+        )
+
+    try:
+        public_keys = await _get_public_keys(issuer, client)
+        if kid not in public_keys:
+            public_keys = await _get_public_keys(issuer, client, refresh=True)
+    except Exception as err:
+        logger.warning(
+            f"Unable to fetch public keys from issuer {issuer}, "
+            f"skipping local token validation: {err}"
+        )
+        return
+
+    if kid not in public_keys:
+        logger.error(f"Authorization error: kid {kid} not found in issuer {issuer}")
+        raise HTTPException(
+            HTTP_401_UNAUTHORIZED, f"Bad bearer token: kid not found in issuer {issuer}"
+        )
+
+    try:
+        token_core.validate_jwt(token, public_keys[kid], None, None, [issuer])
+    except AuthError as err:
+        logger.error(f"Authorization error: bad bearer token: {err}")
+        raise HTTPException(HTTP_401_UNAUTHORIZED, f"Bad bearer token: {err}")
 
 
 async def admin_required(
+    request: Request,
     credentials: HTTPBasicCredentials = Depends(security),
     token: HTTPAuthorizationCredentials = Security(bearer),
 ):
@@ -31,7 +304,8 @@ async def admin_required(
     If a token is provided: it verifies that the provided bearer token has
     `access` permission on the
     `/mds_gateway` resource for the
-    `mds_gateway` service by querying Arborist.
+    `mds_gateway` service by querying Arborist
+    (decisions are cached briefly, see `AuthzDecisionCache`).
 
     In "TESTING_WITH_DISABLED_AUTHZ" mode, the authorization check (i.e. Arborist query) is skipped.
 
@@ -39,6 +313,7 @@ async def admin_required(
     when this method is added as a dependency to the API router.
 
     Args:
+        request: starlette request (which contains reference to FastAPI app)
         credentials: (optional) HTTP Basic authentication credentials provided by the client.
         token: (optional) Bearer token credentials extracted from the Authorization header.
 
@@ -47,7 +322,8 @@ async def admin_required(
 
     Raises:
         HTTPException: With status code 403 if the token is missing or does not
-        have the required authorization.
+        have the required authorization, or 401 if it fails local validation
+        (see `validate_token`).
     """
     if config.TESTING_WITH_DISABLED_AUTHZ:
         logger.warning("Skipping authorization check")
@@ -66,7 +342,9 @@ async def admin_required(
     method = "access"
     resource = "/mds_gateway"
     service = "mds_gateway"
-    if not token or not await arborist.auth_request(
+    if token:
+        await validate_token(token.credentials, request.app.async_client)
+    if not token or not await authz_cache.auth_request(
         token.credentials, service, method, resource
     ):
         logger.error(
@@ -76,6 +354,7 @@ async def admin_required(
 
 
 async def metadata_queries_access_required(
+    request: Request,
     token: HTTPAuthorizationCredentials = Security(bearer),
 ):
     """Enforces authorization, checking for a specific "metadata query permission".
@@ -84,7 +363,8 @@ async def metadata_queries_access_required(
     It verifies that the provided bearer token has
     `access` permission on the
     `/mds_metadata_queries` resource for the
-    `mds_gateway` service by querying Arborist.
+    `mds_gateway` service by querying Arborist
+    (decisions are cached briefly, see `AuthzDecisionCache`).
 
     In "TESTING_WITH_DISABLED_AUTHZ" mode, the authorization check (i.e. Arborist query) is skipped.
 
@@ -92,6 +372,7 @@ async def metadata_queries_access_required(
     when this method is added as a dependency to the API router.
 
     Args:
+        request: starlette request (which contains reference to FastAPI app)
         token: Bearer token credentials extracted from the Authorization header.
 
     Returns:
@@ -99,7 +380,8 @@ async def metadata_queries_access_required(
 
     Raises:
         HTTPException: With status code 403 if the token is missing or does not
-        have the required authorization.
+        have the required authorization, or 401 if it fails local validation
+        (see `validate_token`).
     """
     if config.TESTING_WITH_DISABLED_AUTHZ:
         logger.warning("Skipping authorization check")
@@ -108,10 +390,51 @@ async def metadata_queries_access_required(
     method = "access"
     resource = "/mds_metadata_queries"
     service = "mds_gateway"
-    if not token or not await arborist.auth_request(
+    if token:
+        await validate_token(token.credentials, request.app.async_client)
+    if not token or not await authz_cache.auth_request(
         token.credentials, service, method, resource
     ):
         logger.error(
             f"Authorization error: token must have '{method}' access on {resource} for service '{service}'."
         )
         raise HTTPException(status_code=HTTP_403_FORBIDDEN)
+
+
+async def readable_resource_paths(
+    request: Request,
+    token: HTTPAuthorizationCredentials = Security(bearer),
+) -> Optional[List[str]]:
+    """Returns the resource paths the caller can read, for filtering records by authz.
+
+    This function is meant to be added as a dependency to read endpoints. When
+    AUTHZ_FILTER_METADATA_RECORDS is on, it asks Arborist (through the decision
+    cache) for the resources the bearer token, or an anonymous user without one,
+    has `read` access to. Only records with at least one of those paths in their
+    authz resource paths should be returned.
+
+    Args:
+        request: starlette request (which contains reference to FastAPI app)
+        token: (optional) Bearer token credentials extracted from the Authorization header.
+
+    Returns:
+        The readable resource paths, or None if records should not be filtered
+        (AUTHZ_FILTER_METADATA_RECORDS is off, or in "TESTING_WITH_DISABLED_AUTHZ" mode).
+
+    Raises:
+        HTTPException: With status code 401 or 403 if the token fails local
+        validation (see `validate_token`), or 500 if Arborist can't be reached.
+    """
+    if not config.AUTHZ_FILTER_METADATA_RECORDS or config.TESTING_WITH_DISABLED_AUTHZ:
+        return None
+
+    credentials = token.credentials if token else None
+    if credentials:
+        await validate_token(credentials, request.app.async_client)
+    try:
+        return await authz_cache.readable_resources(credentials)
+    except Exception as err:
+        logger.error(f"Unable to get auth mapping from Arborist: {err}")
+        raise HTTPException(
+            HTTP_500_INTERNAL_SERVER_ERROR, "Unable to check authorization"
+        )
@@ -30,6 +30,11 @@ AGG_MDS_DEFAULT_DATA_DICT_FIELD = config(
     "AGG_MDS_DEFAULT_DATA_DICT_FIELD", cast=str, default="data_dictionaries"
 )
 ES_ENDPOINT = config("GEN3_ES_ENDPOINT", default="http://localhost:9200")
+# At startup, open the database pool connections, prepare the frequent statements and
+# check the connections to OpenSearch and indexd before reporting ready at /_ready
+# (see `mds.warmup`). The warmup gives up after WARMUP_TIMEOUT seconds.
+WARMUP_ON_STARTUP = config("WARMUP_ON_STARTUP", cast=bool, default=True)
+WARMUP_TIMEOUT = config("WARMUP_TIMEOUT", cast=float, default=30.0)
 
 # =============== Database ===============
 
@@ -59,14 +64,73 @@ DB_DSN = config(
 )
 DB_POOL_MIN_SIZE = config("DB_POOL_MIN_SIZE", cast=int, default=5)
 DB_POOL_MAX_SIZE = config("DB_POOL_MAX_SIZE", cast=int, default=15)
+# Optional read replica. Endpoints that only read (metadata queries, object lookups) use
+# it, with a pool of its own of the same size, while its replication lag is at most
+# DB_REPLICA_MAX_LAG seconds. The lag is checked at most every
+# DB_REPLICA_LAG_CHECK_INTERVAL seconds; when the replica lags behind or can't be
+# reached within DB_REPLICA_CHECK_TIMEOUT seconds, reads go to the primary.
+DB_REPLICA_DSN = config("DB_REPLICA_DSN", cast=make_url, default=None)
+DB_REPLICA_MAX_LAG = config("DB_REPLICA_MAX_LAG", cast=float, default=10.0)
+DB_REPLICA_LAG_CHECK_INTERVAL = config(
+    "DB_REPLICA_LAG_CHECK_INTERVAL", cast=float, default=5.0
+)
+DB_REPLICA_CHECK_TIMEOUT = config("DB_REPLICA_CHECK_TIMEOUT", cast=float, default=1.0)
+# Number of server processes, each with its own connection pool. Set by the gunicorn
+# configuration (deployment/wsgi/gunicorn.conf.py).
+WEB_CONCURRENCY = config("WEB_CONCURRENCY", cast=int, default=1)
+# Maximum number of connections of all the processes together (to each database):
+# DB_POOL_MAX_SIZE (and DB_POOL_MIN_SIZE if needed) is lowered so that WEB_CONCURRENCY
+# pools fit in it. The default stays below the default `max_connections` of PostgreSQL
+# (100), leaving room for migrations and admin sessions. 0 disables the cap.
+DB_POOL_TOTAL_MAX_SIZE = config("DB_POOL_TOTAL_MAX_SIZE", cast=int, default=80)
 DB_ECHO = config("DB_ECHO", cast=bool, default=False)
 DB_SSL = config("DB_SSL", default=None)
 DB_CONNECT_RETRIES = config("DB_CONNECT_RETRIES", cast=int, default=32)
+# Statements taking longer than this many seconds are logged with the shapes of their
+# parameters (0 disables the log)
+DB_SLOW_QUERY_THRESHOLD = config("DB_SLOW_QUERY_THRESHOLD", cast=float, default=1.0)
+# Fraction of the slow SELECT statements that are run again with EXPLAIN (ANALYZE, BUFFERS)
+# to log their plan. This doubles their cost, so keep it low (0 disables it).
+DB_EXPLAIN_SAMPLE_RATE = config("DB_EXPLAIN_SAMPLE_RATE", cast=float, default=0.0)
+
+
+# =============== Metrics ===============
+# Serve Prometheus metrics at /metrics. With several gunicorn workers, also set the
+# PROMETHEUS_MULTIPROC_DIR environment variable (see `mds.metrics`).
+ENABLE_PROMETHEUS_METRICS = config(
+    "ENABLE_PROMETHEUS_METRICS", cast=bool, default=False
+)
+
+# =============== Tracing ===============
+# OpenTelemetry spans for routes, database statements and requests to other services.
+# Requires the OpenTelemetry packages (see `mds.tracing`).
+ENABLE_OTEL_TRACING = config("ENABLE_OTEL_TRACING", cast=bool, default=False)
+# "otlp" (configured with the standard OTEL_EXPORTER_OTLP_* environment variables) or
+# "file" (one JSON span per line in OTEL_TRACING_FILE)
+OTEL_TRACING_EXPORTER = config("OTEL_TRACING_EXPORTER", default="otlp")
+OTEL_TRACING_FILE = config("OTEL_TRACING_FILE", default="/var/tmp/mds_traces.jsonl")
+OTEL_SERVICE_NAME = config("OTEL_SERVICE_NAME", default="metadata-service")
 
 
 # =============== Elasticsearch ===============
 ES_RETRY_INTERVAL = config("ES_RETRY_INTERVAL", cast=int, default=20)
 ES_RETRY_LIMIT = config("ES_RETRY_LIMIT", cast=int, default=5)
+
+# =============== Aggregate MDS response cache ===============
+# In-process cache of aggregate read responses, invalidated whenever populate
+# publishes a new index generation
+AGG_MDS_RESPONSE_CACHE = config("AGG_MDS_RESPONSE_CACHE", cast=bool, default=True)
+AGG_MDS_RESPONSE_CACHE_MAX_ENTRIES = config(
+    "AGG_MDS_RESPONSE_CACHE_MAX_ENTRIES", cast=int, default=512
+)
+# How often (in seconds) to re-read the live index generation id
+AGG_MDS_RESPONSE_CACHE_GENERATION_TTL = config(
+    "AGG_MDS_RESPONSE_CACHE_GENERATION_TTL", cast=float, default=30.0
+)
+# /aggregate/metadata pages are only cached while offset + limit stays below this
+AGG_MDS_RESPONSE_CACHE_MAX_OFFSET = config(
+    "AGG_MDS_RESPONSE_CACHE_MAX_OFFSET", cast=int, default=100
+)
 # =============== Authz string ===============
 
 DEFAULT_AUTHZ_STR = config(
@@ -84,12 +148,33 @@ METADATA_QUERY_RESULTS_LIMIT = config(
 
 # Optional. Can be set to enable basic auth on some admin endpoints. E.g. ADMIN_LOGINS=alice:123,bob:456
 ADMIN_LOGINS = config("ADMIN_LOGINS", cast=CommaSeparatedLogins, default=[])
+# Flag passed to authutils: when set, the issuers' public keys are read from
+# <issuer>/jwt/keys instead of being found through OIDC discovery.
 FORCE_ISSUER = config("FORCE_ISSUER", default=None)
+# Issuers (e.g. https://example.com/user) that bearer tokens must come from
 ALLOWED_ISSUERS = set(config("ALLOWED_ISSUERS", cast=CommaSeparatedStrings, default=""))
+# When True, malformed, expired and badly-signed tokens are rejected before asking Arborist.
+# Signatures are only checked locally when ALLOWED_ISSUERS is configured.
+AUTHZ_VALIDATE_TOKENS_LOCALLY = config(
+    "AUTHZ_VALIDATE_TOKENS_LOCALLY", cast=bool, default=True
+)
+# How long (in seconds) to keep an issuer's public keys before fetching them again
+AUTHZ_JWKS_CACHE_TTL = config("AUTHZ_JWKS_CACHE_TTL", cast=float, default=600.0)
 # If set to True, this flag will force an authorization check for all metadata query endpoints:
 FORCE_AUTHZ_CHECK_FOR_METADATA_QUERIES = config(
     "FORCE_AUTHZ_CHECK_FOR_METADATA_QUERIES", cast=bool, default=False
 )
+# Arborist decisions are cached per token for this many seconds (0 disables the cache).
+# Allowed decisions never outlive the token's `exp`.
+AUTHZ_CACHE_TTL = config("AUTHZ_CACHE_TTL", cast=float, default=60.0)
+# Denied decisions are cached for a shorter time so that newly granted access shows up quickly
+AUTHZ_CACHE_NEGATIVE_TTL = config("AUTHZ_CACHE_NEGATIVE_TTL", cast=float, default=5.0)
+AUTHZ_CACHE_MAX_ENTRIES = config("AUTHZ_CACHE_MAX_ENTRIES", cast=int, default=10000)
+# If set to True, metadata reads only return records whose authz resource paths include
+# at least one resource the caller has `read` access to in Arborist:
+AUTHZ_FILTER_METADATA_RECORDS = config(
+    "AUTHZ_FILTER_METADATA_RECORDS", cast=bool, default=False
+)
 
 # =============== Other Services ===============
 
@@ -99,3 +184,51 @@ INDEXING_SERVICE_ENDPOINT = config(
 DATA_ACCESS_SERVICE_ENDPOINT = config(
     "DATA_ACCESS_SERVICE_ENDPOINT", cast=str, default="http://fence-service"
 )
+# Resolved indexd GUIDs/aliases are cached for this many seconds (0 disables the cache)
+INDEXD_CACHE_TTL = config("INDEXD_CACHE_TTL", cast=float, default=10.0)
+INDEXD_CACHE_MAX_ENTRIES = config("INDEXD_CACHE_MAX_ENTRIES", cast=int, default=10000)
+
+# =============== HTTP client ===============
+# Settings of the client used for indexd/fence requests. The defaults are httpx's.
+
+HTTP_CLIENT_MAX_CONNECTIONS = config(
+    "HTTP_CLIENT_MAX_CONNECTIONS", cast=int, default=100
+)
+HTTP_CLIENT_MAX_KEEPALIVE_CONNECTIONS = config(
+    "HTTP_CLIENT_MAX_KEEPALIVE_CONNECTIONS", cast=int, default=20
+)
+# Seconds an idle connection is kept open
+HTTP_CLIENT_KEEPALIVE_EXPIRY = config(
+    "HTTP_CLIENT_KEEPALIVE_EXPIRY", cast=float, default=5.0
+)
+# Timeouts in seconds. The pool timeout is how long a request waits for a free
+# connection before failing, rather than queueing behind slow upstream requests.
+HTTP_CLIENT_CONNECT_TIMEOUT = config(
+    "HTTP_CLIENT_CONNECT_TIMEOUT", cast=float, default=5.0
+)
+HTTP_CLIENT_READ_TIMEOUT = config("HTTP_CLIENT_READ_TIMEOUT", cast=float, default=5.0)
+HTTP_CLIENT_WRITE_TIMEOUT = config("HTTP_CLIENT_WRITE_TIMEOUT", cast=float, default=5.0)
+HTTP_CLIENT_POOL_TIMEOUT = config("HTTP_CLIENT_POOL_TIMEOUT", cast=float, default=5.0)
+# Use HTTP/2 with the upstreams that support it (`h2` comes with the `httpx[http2]` extra)
+HTTP_CLIENT_HTTP2 = config("HTTP_CLIENT_HTTP2", cast=bool, default=False)
+# Per-upstream circuit breaker: after this many consecutive failures (errors or 5xx
+# responses) requests fail immediately for HTTP_CLIENT_BREAKER_RESET_TIMEOUT seconds,
+# then one trial request decides whether to close it again. 0 disables the breaker.
+HTTP_CLIENT_BREAKER_FAILURE_THRESHOLD = config(
+    "HTTP_CLIENT_BREAKER_FAILURE_THRESHOLD", cast=int, default=5
+)
+HTTP_CLIENT_BREAKER_RESET_TIMEOUT = config(
+    "HTTP_CLIENT_BREAKER_RESET_TIMEOUT", cast=float, default=30.0
+)
+# Per-upstream bulkhead: at most this many concurrent requests (0 for no limit). Requests
+# that can't get a slot within HTTP_CLIENT_BULKHEAD_TIMEOUT seconds fail immediately.
+HTTP_CLIENT_BULKHEAD_MAX_CONCURRENT = config(
+    "HTTP_CLIENT_BULKHEAD_MAX_CONCURRENT", cast=int, default=50
+)
+HTTP_CLIENT_BULKHEAD_TIMEOUT = config(
+    "HTTP_CLIENT_BULKHEAD_TIMEOUT", cast=float, default=1.0
+)
+# At most this many upstream deletes are sent at once by `POST /bulk/objects/delete`,
+# and never more than half of HTTP_CLIENT_BULKHEAD_MAX_CONCURRENT, so that the deletes
+# don't fill the bulkhead and other requests to the upstream still get through.
+BULK_DELETE_MAX_CONCURRENT = config("BULK_DELETE_MAX_CONCURRENT", cast=int, default=20)
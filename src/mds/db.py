@@ -20,6 +20,8 @@ What do we do in this file?
 
 - We create a sqlalchemy engine and session maker factory as globals
     - This reads in the db URL from config
+    - And the same for the optional read replica, used by read-only endpoints
+      while its replication lag is low enough
 - We define a data access layer class here which isolates the database manipulations
     - All CRUD operations go through this interface instead of bleeding specific database
       manipulations into the higher level web app endpoint code
@@ -27,14 +29,27 @@ What do we do in this file?
   a fresh session from the session maker factory
     - This is what gets injected into endpoint code using FastAPI's dep injections
 """
+import asyncio
 import hashlib
 import re
+import time
 from collections.abc import AsyncIterable
 from typing import Any, AsyncGenerator
 
 from cdislogging import get_logger
-from sqlalchemy import delete, literal_column, or_, select, text
-from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy import (
+    String,
+    any_,
+    bindparam,
+    delete,
+    literal,
+    literal_column,
+    or_,
+    select,
+    text,
+    union_all,
+)
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB, insert
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import (
     AsyncEngine,
@@ -44,35 +59,190 @@ from sqlalchemy.ext.asyncio import (
 )
 
 from . import config
+from .db_monitoring import instrument_engine
 from .models import Metadata, MetadataAlias
 
+# keys of the resource paths in `Metadata.authz`
+AUTHZ_RESOURCE_PATHS_KEYS = ("resource_paths", "_resource_paths")
 INDEX_REGEXP = re.compile(r"data #>> '{(.+)}'::text")
 
 logger = get_logger(__name__)
 
+
+def _any_of(values: list[str]):
+    """
+    `= ANY(:values)` comparand binding the whole list as a single array
+    parameter, rather than one bind parameter per value like `IN` does.
+    """
+    return any_(bindparam(None, list(values), type_=ARRAY(String)))
+
+
+def _readable_by(resource_paths: list[str]):
+    """
+    Only records with at least one of the resource paths in their authz. Records
+    created through /objects keep them in `authz.resource_paths` and the rest in
+    `authz._resource_paths`, so both are checked. Each `authz -> '<key>'`
+    expression matches a GIN index on it.
+    """
+    paths = bindparam(None, list(resource_paths), type_=ARRAY(String))
+    return or_(
+        *(
+            Metadata.authz.op("->", return_type=JSONB)(literal_column(f"'{key}'")).op(
+                "?|"
+            )(paths)
+            for key in AUTHZ_RESOURCE_PATHS_KEYS
+        )
+    )
+
+
 engine: AsyncEngine | None = None
 async_sessionmaker_instance: async_sessionmaker | None = None
+# the optional read replica (`DB_REPLICA_DSN`)
+replica_engine: AsyncEngine | None = None
+replica_sessionmaker_instance: async_sessionmaker | None = None
+replica_monitor: "ReplicaMonitor | None" = None
+
+# seconds the replica is behind the primary: 0 when it has replayed all the WAL it
+# received, so that an idle primary doesn't look like lag
+REPLICATION_LAG_QUERY = text(
+    """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery()
+            OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(
+            EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0
+        )
+    END
+    """
+)
 
 
-def initiate_db() -> None:
+def db_pool_sizes() -> tuple[int, int]:
     """
-    Initialize the database engine and async sessionmaker.
+    Minimum and maximum size of the connection pool of this process. Every server
+    process has its own pool, so unless `DB_POOL_TOTAL_MAX_SIZE` is 0 the maximum is
+    at most its share of the total for `WEB_CONCURRENCY` processes.
     """
-    global engine, async_sessionmaker_instance
-    engine = create_async_engine(
-        url=config.DB_DSN.render_as_string(hide_password=False),
-        pool_size=config.DB_POOL_MIN_SIZE,
-        max_overflow=config.DB_POOL_MAX_SIZE - config.DB_POOL_MIN_SIZE,
+    pool_min, pool_max = config.DB_POOL_MIN_SIZE, config.DB_POOL_MAX_SIZE
+    if config.DB_POOL_TOTAL_MAX_SIZE:
+        share = max(config.DB_POOL_TOTAL_MAX_SIZE // max(config.WEB_CONCURRENCY, 1), 1)
+        pool_max = min(pool_max, share)
+        pool_min = min(pool_min, pool_max)
+    return pool_min, pool_max
+
+
+def _create_engine(dsn) -> AsyncEngine:
+    pool_min, pool_max = db_pool_sizes()
+    new_engine = create_async_engine(
+        url=dsn.render_as_string(hide_password=False),
+        pool_size=pool_min,
+        max_overflow=pool_max - pool_min,
         echo=config.DB_ECHO,
         connect_args={"ssl": config.DB_SSL} if config.DB_SSL else {},
         pool_pre_ping=True,
     )
+    instrument_engine(new_engine)
+    return new_engine
+
+
+def initiate_db() -> None:
+    """
+    Initialize the database engine and async sessionmaker, and those of the read
+    replica if `DB_REPLICA_DSN` is set.
+
+    Called at startup of each server process (after gunicorn forks its workers,
+    also with `preload_app`), so that processes never share pooled connections.
+    """
+    global engine, async_sessionmaker_instance
+    global replica_engine, replica_sessionmaker_instance, replica_monitor
+    engine = _create_engine(config.DB_DSN)
 
     # creates AsyncSession instances
     async_sessionmaker_instance = async_sessionmaker(
         bind=engine, expire_on_commit=False
     )
 
+    if config.DB_REPLICA_DSN:
+        replica_engine = _create_engine(config.DB_REPLICA_DSN)
+        replica_sessionmaker_instance = async_sessionmaker(
+            bind=replica_engine, expire_on_commit=False
+        )
+        replica_monitor = ReplicaMonitor(
+            replica_engine,
+            max_lag=config.DB_REPLICA_MAX_LAG,
+            check_interval=config.DB_REPLICA_LAG_CHECK_INTERVAL,
+            check_timeout=config.DB_REPLICA_CHECK_TIMEOUT,
+        )
+    else:
+        replica_engine = replica_sessionmaker_instance = replica_monitor = None
+
+
+class ReplicaMonitor:
+    """
+    Whether the read replica can be used: it can be reached and its replication
+    lag is at most `max_lag` seconds. The lag is checked when it is needed and the
+    last check is older than `check_interval` seconds. Reads wait for the check,
+    so a check that takes more than `check_timeout` seconds makes the replica
+    unusable.
+    """
+
+    def __init__(
+        self,
+        engine: AsyncEngine,
+        max_lag: float,
+        check_interval: float,
+        check_timeout: float,
+    ):
+        self.engine = engine
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.check_timeout = check_timeout
+        self.lag: float | None = None
+        self.usable = False
+        self.checked_at: float | None = None
+        self._lock = asyncio.Lock()
+
+    def _stale(self) -> bool:
+        return (
+            self.checked_at is None
+            or time.monotonic() - self.checked_at >= self.check_interval
+        )
+
+    async def is_usable(self) -> bool:
+        if self._stale():
+            # concurrent requests wait for a single check
+            async with self._lock:
+                if self._stale():
+                    await self.check()
+        return self.usable
+
+    async def check(self) -> None:
+        try:
+            self.lag = await asyncio.wait_for(self._get_lag(), self.check_timeout)
+        except Exception as err:
+            if self.usable or self.checked_at is None:
+                logger.warning(
+                    f"Read replica unavailable, reading from the primary: {err!r}"
+                )
+            self.lag = None
+            self.usable = False
+        else:
+            usable = self.lag <= self.max_lag
+            if self.usable and not usable:
+                logger.warning(
+                    f"Read replica is {self.lag:.1f}s behind (more than "
+                    f"{self.max_lag}s), reading from the primary"
+                )
+            self.usable = usable
+        self.checked_at = time.monotonic()
+
+    async def _get_lag(self) -> float:
+        async with self.engine.connect() as connection:
+            return float((await connection.execute(REPLICATION_LAG_QUERY)).scalar())
+
+    def stats(self) -> dict:
+        return {"usable": self.usable, "lag_seconds": self.lag}
+
 
 def get_db_engine_and_sessionmaker() -> tuple[AsyncEngine, async_sessionmaker]:
     """
@@ -156,6 +326,88 @@ class DataAccessLayer:
             return await self.get_metadata(alias_record.guid)
         return None
 
+    async def resolve_metadata(
+        self, key: str, resource_paths: list[str] | None = None
+    ) -> dict | None:
+        """
+        Get single metadata by a key that is either its GUID or one of its aliases.
+
+        Both lookups run as one `UNION ALL` query. A GUID match takes precedence
+        over an alias with the same value.
+
+        Args:
+            key: The GUID or alias to look up
+            resource_paths: If provided, only a record with at least one of these
+                in its authz resource paths is returned
+
+        Returns:
+            Dictionary with guid, data, and authz keys, or None if not found
+        """
+        by_guid = select(Metadata, literal(0).label("precedence")).where(
+            Metadata.guid == key
+        )
+        by_alias = (
+            select(Metadata, literal(1).label("precedence"))
+            .join(MetadataAlias, MetadataAlias.guid == Metadata.guid)
+            .where(MetadataAlias.alias == key)
+        )
+        if resource_paths is not None:
+            by_guid = by_guid.where(_readable_by(resource_paths))
+            by_alias = by_alias.where(_readable_by(resource_paths))
+        union = union_all(by_guid, by_alias).subquery()
+        result = await self.db_session.execute(
+            select(union.c.guid, union.c.data, union.c.authz)
+            .order_by(union.c.precedence)
+            .limit(1)
+        )
+        row = result.first()
+        if row:
+            return dict(row._mapping)
+        return None
+
+    async def get_metadata_for_keys(
+        self, keys: list[str], resource_paths: list[str] | None = None
+    ) -> dict[str, dict]:
+        """
+        Get metadata for many keys at once, where each key is a GUID or an alias.
+
+        Issues one query matching all the keys as GUIDs, then one query joining
+        aliases to metadata for the keys that were not GUIDs.
+
+        Args:
+            keys: GUIDs and/or aliases to look up
+            resource_paths: If provided, only records with at least one of these
+                in their authz resource paths are returned
+
+        Returns:
+            Dict of key -> metadata dict (guid, data, and authz keys) for each key
+            found, in the order requested. Keys that were not found are omitted.
+        """
+        keys = list(dict.fromkeys(keys))
+        if not keys:
+            return {}
+
+        query = select(Metadata).where(Metadata.guid == _any_of(keys))
+        if resource_paths is not None:
+            query = query.where(_readable_by(resource_paths))
+        result = await self.db_session.execute(query)
+        found = {metadata.guid: metadata.to_dict() for metadata in result.scalars()}
+
+        remaining = [key for key in keys if key not in found]
+        if remaining:
+            query = (
+                select(MetadataAlias.alias, Metadata)
+                .join(Metadata, Metadata.guid == MetadataAlias.guid)
+                .where(MetadataAlias.alias == _any_of(remaining))
+            )
+            if resource_paths is not None:
+                query = query.where(_readable_by(resource_paths))
+            result = await self.db_session.execute(query)
+            for alias, metadata in result.all():
+                found[alias] = metadata.to_dict()
+
+        return {key: found[key] for key in keys if key in found}
+
     async def create_metadata(
         self, guid: str, data: dict | None, authz: dict, overwrite: bool = False
     ) -> tuple[dict, bool]:
@@ -261,12 +513,73 @@ class DataAccessLayer:
         await self.db_session.flush()
         return deleted_data
 
+    async def lock_metadata(self, guid: str) -> dict | None:
+        """
+        Get metadata by GUID and lock its row (SELECT ... FOR UPDATE) until the
+        end of the transaction.
+
+        Args:
+            guid: The GUID to look up
+
+        Returns:
+            Dictionary with guid, data, and authz keys, or None if not found
+        """
+        result = await self.db_session.execute(
+            select(Metadata).where(Metadata.guid == guid).with_for_update()
+        )
+        metadata = result.scalar_one_or_none()
+        if metadata:
+            return metadata.to_dict()
+        return None
+
+    async def lock_metadata_for_keys(self, guids: list[str]) -> list[str]:
+        """
+        Lock the rows of many GUIDs (SELECT ... FOR UPDATE) until the end of the
+        transaction. Rows are locked in GUID order so that concurrent callers
+        can't deadlock.
+
+        Args:
+            guids: The GUIDs to lock
+
+        Returns:
+            The GUIDs that were found, sorted
+        """
+        if not guids:
+            return []
+        result = await self.db_session.execute(
+            select(Metadata.guid)
+            .where(Metadata.guid == _any_of(guids))
+            .order_by(Metadata.guid)
+            .with_for_update()
+        )
+        return list(result.scalars())
+
+    async def batch_delete_metadata(self, guids: list[str]) -> list[str]:
+        """
+        Delete the metadata (and aliases) of many GUIDs in a single statement.
+
+        Args:
+            guids: The GUIDs to delete
+
+        Returns:
+            The GUIDs that were deleted
+        """
+        if not guids:
+            return []
+        result = await self.db_session.execute(
+            delete(Metadata)
+            .where(Metadata.guid == _any_of(guids))
+            .returning(Metadata.guid)
+        )
+        return list(result.scalars())
+
     async def search_metadata(
         self,
         filters: dict[str, list[str]],
         limit: int = 10,
         offset: int = 0,
         return_data: bool = False,
+        resource_paths: list[str] | None = None,
     ) -> dict[str, dict] | list[str]:
         """
         Search metadata with filters.
@@ -278,6 +591,8 @@ class DataAccessLayer:
             offset: Number of records to skip
             return_data: If True, return dict of guid -> data.
                          If False, return list of guids only.
+            resource_paths: If provided, only return records with at least one of
+                            these in their authz resource paths.
 
         Returns:
             Either dict[guid, data] or list[guid] depending on return_data flag
@@ -308,6 +623,9 @@ class DataAccessLayer:
                 if conditions:
                     query = query.where(or_(*conditions))
 
+        if resource_paths is not None:
+            query = query.where(_readable_by(resource_paths))
+
         # TODO/FIXME: There's no updated date on the records, and without that
         # this "pagination" is prone to produce inconsistent results if someone is
         # trying to paginate using offset WHILE data is being added
@@ -506,7 +824,7 @@ class DataAccessLayer:
         TODO: evaluate efficiency compared to old GINO implementation
         The old GINO implementation explicitly cached the statement in postgres
         This current implentation depends on implicit sqlalchemy caching, and asyncpg caching prepared statments
-        We should definitely do batch creation benchmarking
+        `python -m benchmarks.metadata_api` measures batch creation (see benchmarks/)
 
         Additional changes from previous GINO implmentation:
         - Old: `overwrite=True` by default
@@ -679,6 +997,23 @@ class DataAccessLayer:
         await self.db_session.execute(text(f"DROP INDEX path_idx_{name}"))
 
 
+async def get_read_only_data_access_layer() -> AsyncGenerator[DataAccessLayer, Any]:
+    """
+    Like `get_data_access_layer`, for endpoints that only read: the session is on
+    the read replica when one is configured and usable (see `ReplicaMonitor`),
+    and on the primary otherwise.
+    """
+    sessionmaker = async_sessionmaker_instance
+    if replica_monitor is not None and await replica_monitor.is_usable():
+        sessionmaker = replica_sessionmaker_instance
+    if sessionmaker is None:
+        raise Exception("Database not initialized. Call initiate_db() first.")
+
+    async with sessionmaker() as session:
+        async with session.begin():
+            yield DataAccessLayer(session)
+
+
 async def get_data_access_layer() -> AsyncGenerator[DataAccessLayer, Any]:
     """
     Create an AsyncSession and yield an instance of the Data Access Layer,
@@ -0,0 +1,149 @@
+"""
+Statement timing for the database engine, without turning on `DB_ECHO`.
+
+Every statement is timed and recorded in the `mds_db_statement_duration_seconds`
+histogram under its fingerprint: a short hash of the statement with literals and
+bind parameters replaced by `?`, so that the same query with different values is
+one series. Statements slower than `DB_SLOW_QUERY_THRESHOLD` are logged with
+their fingerprint and the shapes (types and sizes, never the values) of their
+bind parameters. A sample (`DB_EXPLAIN_SAMPLE_RATE`) of the slow SELECT
+statements is also run again with `EXPLAIN (ANALYZE, BUFFERS)` and its plan is
+logged.
+"""
+import hashlib
+import random
+import re
+import time
+from functools import lru_cache
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from . import config, logger
+from .metrics import DB_STATEMENT_DURATION
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w$])\d+(?:\.\d+)?\b")
+_BIND_PARAMETER = re.compile(r"\$\d+|%\(\w+\)s")
+_VALUE_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+_START_TIMES_KEY = "mds_statement_start_times"
+EXPLAIN_PREFIX = "EXPLAIN (ANALYZE, BUFFERS)"
+
+
+@lru_cache(maxsize=1024)
+def normalize_statement(statement: str) -> str:
+    """
+    The statement with literals and bind parameters replaced by `?`, lists of
+    values collapsed to `(?, ...)` and whitespace collapsed.
+    """
+    normalized = _STRING_LITERAL.sub("?", statement)
+    normalized = _BIND_PARAMETER.sub("?", normalized)
+    normalized = _NUMBER.sub("?", normalized)
+    normalized = _VALUE_LIST.sub("(?, ...)", normalized)
+    return _WHITESPACE.sub(" ", normalized).strip()
+
+
+@lru_cache(maxsize=1024)
+def fingerprint(statement: str) -> str:
+    normalized = normalize_statement(statement)
+    return hashlib.sha1(normalized.encode()).hexdigest()[:12]
+
+
+def _shape(value) -> str:
+    if isinstance(value, (str, bytes, list, tuple, dict)):
+        return f"{type(value).__name__}({len(value)})"
+    return type(value).__name__
+
+
+def parameter_shapes(parameters, executemany: bool = False):
+    """
+    The type (and length, for sized values) of each bind parameter.
+    """
+    if executemany:
+        rows = list(parameters or [])
+        first = parameter_shapes(rows[0]) if rows else None
+        return {"rows": len(rows), "first": first}
+    if isinstance(parameters, dict):
+        return {key: _shape(value) for key, value in parameters.items()}
+    return [_shape(value) for value in parameters or ()]
+
+
+def _operation(statement: str) -> str:
+    words = statement.lstrip().split(None, 1)
+    return words[0].upper() if words else ""
+
+
+def _before_cursor_execute(
+    conn, cursor, statement, parameters, context, executemany
+) -> None:
+    conn.info.setdefault(_START_TIMES_KEY, []).append(time.perf_counter())
+
+
+def _after_cursor_execute(
+    conn, cursor, statement, parameters, context, executemany
+) -> None:
+    start_times = conn.info.get(_START_TIMES_KEY)
+    if not start_times:
+        return
+    elapsed = time.perf_counter() - start_times.pop()
+    statement_fingerprint = fingerprint(statement)
+    operation = _operation(statement)
+    DB_STATEMENT_DURATION.labels(statement_fingerprint, operation).observe(elapsed)
+
+    threshold = config.DB_SLOW_QUERY_THRESHOLD
+    if threshold <= 0 or elapsed < threshold:
+        return
+    logger.warning(
+        f"Slow query ({elapsed:.3f}s, fingerprint {statement_fingerprint}): "
+        f"{normalize_statement(statement)} "
+        f"parameters: {parameter_shapes(parameters, executemany)}"
+    )
+    if (
+        operation == "SELECT"
+        and not executemany
+        and random.random() < config.DB_EXPLAIN_SAMPLE_RATE
+    ):
+        _log_explain(conn, statement, parameters, statement_fingerprint)
+
+
+def _handle_error(context) -> None:
+    # the statement failed, so `after_cursor_execute` won't pop its start time
+    if context.connection is not None:
+        start_times = context.connection.info.get(_START_TIMES_KEY)
+        if start_times:
+            start_times.pop()
+
+
+def _log_explain(conn, statement, parameters, statement_fingerprint: str) -> None:
+    """
+    Run the statement again with `EXPLAIN (ANALYZE, BUFFERS)` and log the plan.
+    This runs inside a savepoint on the same connection, so that a failure
+    doesn't abort the caller's transaction.
+    """
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute("SAVEPOINT mds_explain")
+        try:
+            cursor.execute(f"{EXPLAIN_PREFIX} {statement}", parameters)
+            plan = "\n".join(row[0] for row in cursor.fetchall())
+            cursor.execute("RELEASE SAVEPOINT mds_explain")
+        except Exception:
+            cursor.execute("ROLLBACK TO SAVEPOINT mds_explain")
+            raise
+        logger.warning(f"Plan of slow query {statement_fingerprint}:\n{plan}")
+    except Exception as err:
+        logger.warning(f"Unable to explain slow query {statement_fingerprint}: {err}")
+    finally:
+        cursor.close()
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    """
+    Time the statements executed by `engine`.
+    """
+    sync_engine = engine.sync_engine
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(sync_engine, "handle_error", _handle_error)
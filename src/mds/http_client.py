@@ -0,0 +1,344 @@
+"""
+The HTTP client used for requests to other services (indexd, fence).
+
+Its pool limits, keep-alive and timeouts come from the `HTTP_CLIENT_*` config.
+Requests go through an instrumented transport that keeps per-upstream counts
+(in-flight requests, errors, timeouts waiting for a pooled connection, latency)
+so that a slow upstream shows up in `/_status` instead of only as queueing.
+
+Each upstream also gets a circuit breaker and a bulkhead (a cap on concurrent
+requests). While an upstream is failing, or while all its slots are taken,
+requests to it fail straight away with `UpstreamUnavailable` instead of holding
+a worker until they time out, and requests to other upstreams are unaffected.
+"""
+import asyncio
+import time
+from collections import defaultdict
+from urllib.parse import urlparse
+
+import httpx
+
+from . import config, logger
+from .metrics import observe_upstream_request
+
+
+def upstream_name(url: httpx.URL) -> str:
+    """
+    Name of the service a request is for: "indexd" or "fence" for the configured
+    endpoints, the host otherwise.
+    """
+    for name, endpoint in (
+        ("indexd", config.INDEXING_SERVICE_ENDPOINT),
+        ("fence", config.DATA_ACCESS_SERVICE_ENDPOINT),
+    ):
+        parsed = urlparse(endpoint)
+        if url.host == parsed.hostname and url.port == parsed.port:
+            return name
+    return url.host
+
+
+class UpstreamUnavailable(Exception):
+    """
+    Raised without sending the request when the upstream's circuit breaker is
+    open or its bulkhead is full.
+
+    Not an `httpx.HTTPError`, so that the write endpoints' handlers of upstream
+    errors let it through and it is answered with a 503 (see `mds.objects`)
+    rather than handled like an error response from the upstream. The object
+    lookups catch it and serve the metadata without the indexd record.
+    """
+
+    def __init__(self, message: str, *, request: httpx.Request):
+        super().__init__(message)
+        self.request = request
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures (transport errors or 5xx
+    responses) and rejects requests for `reset_timeout` seconds. After that a
+    single trial request is let through ("half_open"): the breaker closes if it
+    succeeds and opens again if it fails. A threshold of 0 disables the breaker.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def allow_request(self) -> bool:
+        if self.failure_threshold <= 0 or self.state == self.CLOSED:
+            return True
+        if (
+            self.state == self.OPEN
+            and time.monotonic() - self.opened_at >= self.reset_timeout
+        ):
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self._trial_in_flight = False
+        self.state = self.CLOSED
+
+    def record_cancelled(self) -> None:
+        """
+        The request was not completed, e.g. it was cancelled: frees the trial
+        slot without changing the state.
+        """
+        self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._trial_in_flight = False
+        if self.failure_threshold <= 0:
+            return
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                logger.warning(
+                    f"Opening circuit breaker after {self.failures} consecutive failures"
+                )
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+
+class UpstreamStats:
+    def __init__(self):
+        self.in_flight = 0
+        self.requests = 0
+        self.errors = 0
+        self.pool_timeouts = 0
+        self.rejected = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.breaker = CircuitBreaker(
+            failure_threshold=config.HTTP_CLIENT_BREAKER_FAILURE_THRESHOLD,
+            reset_timeout=config.HTTP_CLIENT_BREAKER_RESET_TIMEOUT,
+        )
+        self.bulkhead = (
+            asyncio.Semaphore(config.HTTP_CLIENT_BULKHEAD_MAX_CONCURRENT)
+            if config.HTTP_CLIENT_BULKHEAD_MAX_CONCURRENT > 0
+            else None
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "errors": self.errors,
+            "pool_timeouts": self.pool_timeouts,
+            "rejected": self.rejected,
+            "average_seconds": (
+                self.total_seconds / self.requests if self.requests else 0.0
+            ),
+            "max_seconds": self.max_seconds,
+            "circuit_breaker": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+        }
+
+
+class _InstrumentedStream(httpx.AsyncByteStream):
+    """
+    Response stream that reports when the response is closed, which is when its
+    connection goes back to the pool.
+    """
+
+    def __init__(self, stream: httpx.AsyncByteStream, on_close):
+        self._stream = stream
+        self._on_close = on_close
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            if self._on_close:
+                self._on_close()
+                self._on_close = None
+
+
+class InstrumentedTransport(httpx.AsyncHTTPTransport):
+    """
+    Connection pool that keeps per-upstream request stats and applies each
+    upstream's circuit breaker and bulkhead. A request is in flight (and holds a
+    bulkhead slot) from when it starts waiting for a connection until its
+    response is closed. Latency is measured until the response headers are
+    received.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.upstreams = defaultdict(UpstreamStats)
+
+    async def _acquire_bulkhead(
+        self, request: httpx.Request, name: str, stats: UpstreamStats, trial: bool
+    ) -> None:
+        """
+        Wait for a bulkhead slot. If the request is the breaker's trial request,
+        the trial slot is freed when it doesn't get one.
+        """
+        try:
+            await asyncio.wait_for(
+                stats.bulkhead.acquire(), timeout=config.HTTP_CLIENT_BULKHEAD_TIMEOUT
+            )
+        except BaseException as err:
+            if trial:
+                stats.breaker.record_cancelled()
+            if not isinstance(err, asyncio.TimeoutError):
+                raise
+            stats.rejected += 1
+            raise UpstreamUnavailable(
+                f"Too many concurrent requests to {name}, not sending the request",
+                request=request,
+            )
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        name = upstream_name(request.url)
+        stats = self.upstreams[name]
+        if not stats.breaker.allow_request():
+            stats.rejected += 1
+            raise UpstreamUnavailable(
+                f"Circuit breaker for {name} is open, not sending the request",
+                request=request,
+            )
+        # only the trial request is let through while the breaker is half open
+        trial = stats.breaker.state == CircuitBreaker.HALF_OPEN
+        if stats.bulkhead:
+            await self._acquire_bulkhead(request, name, stats, trial)
+
+        stats.in_flight += 1
+        stats.requests += 1
+        start = time.perf_counter()
+
+        def done():
+            stats.in_flight -= 1
+            if stats.bulkhead:
+                stats.bulkhead.release()
+
+        status = "error"
+        try:
+            response = await super().handle_async_request(request)
+            status = response.status_code
+        except BaseException as err:
+            done()
+            stats.errors += 1
+            if isinstance(err, httpx.PoolTimeout):
+                stats.pool_timeouts += 1
+            if isinstance(err, Exception):
+                stats.breaker.record_failure()
+            elif trial:
+                stats.breaker.record_cancelled()
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            stats.total_seconds += elapsed
+            stats.max_seconds = max(stats.max_seconds, elapsed)
+            observe_upstream_request(name, request.method, status, elapsed)
+
+        if response.status_code >= 500:
+            stats.breaker.record_failure()
+        else:
+            stats.breaker.record_success()
+        response.stream = _InstrumentedStream(response.stream, done)
+        return response
+
+    def stats(self) -> dict:
+        """
+        Returns the pool's connection counts and the stats and circuit breaker
+        state of each upstream.
+        """
+        connections = getattr(self._pool, "connections", [])
+        return {
+            "connections": len(connections),
+            "idle_connections": sum(1 for c in connections if c.is_idle()),
+            "upstreams": {
+                name: stats.to_dict() for name, stats in sorted(self.upstreams.items())
+            },
+        }
+
+
+class TimedAsyncClient(httpx.AsyncClient):
+    """
+    Client that records the latency of its requests in the upstream metrics,
+    for services called through their own client library (e.g. Arborist's),
+    which creates its own httpx clients.
+    """
+
+    upstream = None
+
+    async def send(self, request: httpx.Request, **kwargs) -> httpx.Response:
+        start = time.perf_counter()
+        status = "error"
+        try:
+            response = await super().send(request, **kwargs)
+            status = response.status_code
+            return response
+        finally:
+            observe_upstream_request(
+                self.upstream or upstream_name(request.url),
+                request.method,
+                status,
+                time.perf_counter() - start,
+            )
+
+
+def client_stats(client: httpx.AsyncClient) -> dict:
+    """
+    Returns the stats of a client made by `create_async_client`, or an empty
+    dict for any other client.
+    """
+    transport = getattr(client, "_transport", None)
+    if isinstance(transport, InstrumentedTransport):
+        return transport.stats()
+    return {}
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def create_async_client() -> httpx.AsyncClient:
+    """
+    Returns a client configured from the `HTTP_CLIENT_*` settings, with an
+    InstrumentedTransport.
+    """
+    http2 = config.HTTP_CLIENT_HTTP2
+    if http2 and not _http2_available():
+        logger.warning(
+            "HTTP_CLIENT_HTTP2 is enabled but the `h2` package is not installed, "
+            "using HTTP/1.1"
+        )
+        http2 = False
+
+    transport = InstrumentedTransport(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=config.HTTP_CLIENT_MAX_CONNECTIONS,
+            max_keepalive_connections=config.HTTP_CLIENT_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=config.HTTP_CLIENT_KEEPALIVE_EXPIRY,
+        ),
+    )
+    timeout = httpx.Timeout(
+        connect=config.HTTP_CLIENT_CONNECT_TIMEOUT,
+        read=config.HTTP_CLIENT_READ_TIMEOUT,
+        write=config.HTTP_CLIENT_WRITE_TIMEOUT,
+        pool=config.HTTP_CLIENT_POOL_TIMEOUT,
+    )
+    return httpx.AsyncClient(transport=transport, timeout=timeout)
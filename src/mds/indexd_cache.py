@@ -0,0 +1,111 @@
+"""
+In-process cache of indexd GUID/alias resolution.
+
+Several object endpoints resolve the same GUID or alias against indexd (to get
+the record's did, rev and authz) within a short time. Resolved records are kept
+for a few seconds, and concurrent lookups of the same key share a single indexd
+request. Entries are dropped when MDS deletes a record or creates a new version
+of it; changes made to indexd by other clients can be seen up to
+`INDEXD_CACHE_TTL` seconds late.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Tuple
+
+from . import config
+
+
+class IndexdRecordCache:
+    """
+    LRU cache of indexd records keyed by the GUID or alias they were resolved
+    from, with single-flight lookups. Only successful lookups are cached.
+    """
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, dict]]" = OrderedDict()
+        self._pending: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def invalidate(self, guid: str) -> None:
+        """
+        Drop the entry for `guid` and every entry that resolved to the record
+        whose did is `guid` (i.e. its aliases). A lookup of `guid` that is
+        already in progress is not cached when it completes.
+        """
+        self._pending.pop(guid, None)
+        for key in [
+            key
+            for key, (_, record) in self._entries.items()
+            if key == guid or record.get("did") == guid
+        ]:
+            del self._entries[key]
+
+    async def get(self, key: str, fetch: Callable[[], Awaitable[dict]]) -> dict:
+        """
+        Returns the cached record for `key`, otherwise awaits `fetch()` and
+        caches its result. While a fetch for `key` is in progress, other callers
+        wait for it instead of starting their own, and get its exception if it
+        fails.
+        """
+        if self.ttl <= 0:
+            return await fetch()
+
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            del self._entries[key]
+        self.misses += 1
+
+        pending = self._pending.get(key)
+        if pending is None:
+            pending = asyncio.ensure_future(self._fetch_and_store(key, fetch))
+            self._pending[key] = pending
+            pending.add_done_callback(lambda done: self._forget_pending(key, done))
+        # a waiter being cancelled (e.g. its client disconnected) must not
+        # cancel the lookup the other waiters are sharing
+        return await asyncio.shield(pending)
+
+    def _forget_pending(self, key: str, lookup: asyncio.Future) -> None:
+        if self._pending.get(key) is lookup:
+            del self._pending[key]
+
+    async def _fetch_and_store(
+        self, key: str, fetch: Callable[[], Awaitable[dict]]
+    ) -> dict:
+        record = await fetch()
+        if self._pending.get(key) is not asyncio.current_task():
+            # invalidated while the lookup was in progress
+            return record
+        self._entries[key] = (time.monotonic() + self.ttl, record)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return record
+
+
+def create_indexd_cache() -> IndexdRecordCache:
+    return IndexdRecordCache(
+        ttl=config.INDEXD_CACHE_TTL, max_entries=config.INDEXD_CACHE_MAX_ENTRIES
+    )
@@ -2,9 +2,12 @@ import asyncio
 from contextlib import asynccontextmanager
 from urllib.parse import urlparse
 
-import httpx
-from fastapi import APIRouter, Depends, FastAPI, HTTPException
-from starlette.status import HTTP_500_INTERNAL_SERVER_ERROR
+from fastapi import APIRouter, Depends, FastAPI, HTTPException, Request
+from starlette.responses import JSONResponse
+from starlette.status import (
+    HTTP_500_INTERNAL_SERVER_ERROR,
+    HTTP_503_SERVICE_UNAVAILABLE,
+)
 
 try:
     from importlib.metadata import entry_points, version
@@ -12,8 +15,18 @@ except ImportError:
     from importlib_metadata import entry_points, version
 
 from .agg_mds import datastore as aggregate_datastore
-from . import config, logger
-from .db import DataAccessLayer, get_data_access_layer, initiate_db
+from . import config, db, logger
+from .authorizations import authz_cache
+from .db import (
+    DataAccessLayer,
+    get_data_access_layer,
+    get_db_engine_and_sessionmaker,
+    initiate_db,
+)
+from .http_client import client_stats, create_async_client
+from .metrics import PrometheusMiddleware, get_metrics, instrument_db_pool
+from . import tracing
+from .warmup import Warmup
 
 
 def get_app() -> FastAPI:
@@ -25,7 +38,11 @@ def get_app() -> FastAPI:
     )
     app.include_router(router)
     app.add_middleware(ClientDisconnectMiddleware)
-    app.async_client = httpx.AsyncClient()
+    if config.ENABLE_PROMETHEUS_METRICS:
+        app.add_middleware(PrometheusMiddleware)
+        app.add_route("/metrics", get_metrics, include_in_schema=False)
+    app.async_client = create_async_client()
+    app.tracing_enabled = tracing.setup_tracing(app)
     load_modules(app)
 
     return app
@@ -84,13 +101,36 @@ async def close_aggregate_datastore(app):
 async def lifespan(app: FastAPI):
     # Startup actions
     initiate_db()
+    engine, _ = get_db_engine_and_sessionmaker()
+    if config.ENABLE_PROMETHEUS_METRICS:
+        instrument_db_pool(engine, "primary")
+        if db.replica_engine is not None:
+            instrument_db_pool(db.replica_engine, "replica")
+    if app.tracing_enabled:
+        tracing.trace_engine(engine)
     await setup_aggregate_datastore(app)
+    app.warmup = Warmup()
+    warmup_task = None
+    if config.WARMUP_ON_STARTUP:
+        # requests are served meanwhile, /_ready tells when it's done
+        warmup_task = asyncio.create_task(app.warmup.run(app))
+    else:
+        app.warmup.skip()
 
     yield
 
     # Shutdown actions
+    if warmup_task is not None and not warmup_task.done():
+        warmup_task.cancel()
     await close_aggregate_datastore(app)
     await app.async_client.aclose()
+    if app.tracing_enabled:
+        tracing.untrace_engine()
+        tracing.flush()
+    # close the pooled connections, e.g. when gunicorn restarts the worker
+    await engine.dispose()
+    if db.replica_engine is not None:
+        await db.replica_engine.dispose()
 
 
 def load_modules(app=None):
@@ -120,8 +160,25 @@ def get_version():
     return version("mds")
 
 
+@router.get("/_ready")
+async def get_ready(request: Request):
+    """
+    Returns 200 once the startup warmup of the server process is done and its
+    database warmup succeeded (see `mds.warmup`), and 503 before, with the
+    warmup report. A failed database warmup is retried.
+    """
+    warmup = request.app.warmup
+    if warmup.done.is_set() and not warmup.ready:
+        await warmup.retry_database()
+    return JSONResponse(
+        {"ready": warmup.ready, "warmup": warmup.report},
+        status_code=200 if warmup.ready else HTTP_503_SERVICE_UNAVAILABLE,
+    )
+
+
 @router.get("/_status")
 async def get_status(
+    request: Request,
     data_access_layer: DataAccessLayer = Depends(get_data_access_layer),
 ):
     """
@@ -129,6 +186,10 @@ async def get_status(
      * error: if there was no error this will be "none"
      * last_update: timestamp of the last data pull from the commons
      * count: number of entries
+     * authz_cache: hit/miss counts of the Arborist decision cache
+     * http_client: connection pool usage and per-upstream request stats
+     * db_replica: whether the read replica is used and its replication lag, if
+       one is configured
     """
     now = await data_access_layer.get_current_time()
 
@@ -145,6 +206,13 @@ async def get_status(
                 },
             )
 
-    return dict(
-        status="OK", timestamp=now, aggregate_metadata_enabled=config.USE_AGG_MDS
+    status = dict(
+        status="OK",
+        timestamp=now,
+        aggregate_metadata_enabled=config.USE_AGG_MDS,
+        authz_cache=authz_cache.stats(),
+        http_client=client_stats(request.app.async_client),
     )
+    if db.replica_monitor is not None:
+        status["db_replica"] = db.replica_monitor.stats()
+    return status
@@ -0,0 +1,186 @@
+"""
+Prometheus metrics, served at `/metrics` when `ENABLE_PROMETHEUS_METRICS` is on.
+
+Recorded:
+ * HTTP requests: count and latency per route template, and requests in flight
+ * database connection pools: connections checked out, overflow and pool size,
+   per engine ("primary", and "replica" with `DB_REPLICA_DSN`)
+ * database statements: latency per statement fingerprint (see `mds.db_monitoring`)
+ * requests to indexd, fence and Arborist: latency per upstream and status
+ * OpenSearch requests: latency per operation
+
+When the server runs several worker processes (gunicorn), set the
+`PROMETHEUS_MULTIPROC_DIR` environment variable to an empty directory shared by
+the workers: each worker then writes its metrics there, and `/metrics` serves
+the metrics of all of them, whichever worker handles the scrape.
+"""
+import os
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client import multiprocess
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.requests import Request
+from starlette.responses import Response
+
+HTTP_REQUESTS = Counter(
+    "mds_http_requests_total",
+    "HTTP requests handled, by route template and status code",
+    ["method", "route", "status"],
+)
+HTTP_REQUEST_DURATION = Histogram(
+    "mds_http_request_duration_seconds",
+    "Time to handle HTTP requests, by route template",
+    ["method", "route"],
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    "mds_http_requests_in_progress",
+    "HTTP requests being handled",
+    ["method"],
+    multiprocess_mode="livesum",
+)
+
+DB_POOL_CHECKED_OUT = Gauge(
+    "mds_db_pool_checked_out_connections",
+    "Database connections currently checked out of the pool, by engine",
+    ["engine"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_OVERFLOW = Gauge(
+    "mds_db_pool_overflow_connections",
+    "Database connections open beyond the pool size (DB_POOL_MIN_SIZE), by engine",
+    ["engine"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_SIZE = Gauge(
+    "mds_db_pool_size",
+    "Size of the database connection pool, by engine",
+    ["engine"],
+    multiprocess_mode="livesum",
+)
+
+DB_STATEMENT_DURATION = Histogram(
+    "mds_db_statement_duration_seconds",
+    "Time to execute database statements, by statement fingerprint",
+    ["fingerprint", "operation"],
+)
+
+UPSTREAM_REQUEST_DURATION = Histogram(
+    "mds_upstream_request_duration_seconds",
+    "Time until the response headers of requests to other services, by status "
+    "code, or 'error' if there was no response",
+    ["upstream", "method", "status"],
+)
+
+OPENSEARCH_REQUEST_DURATION = Histogram(
+    "mds_opensearch_request_duration_seconds",
+    "Time of requests to OpenSearch, by operation",
+    ["method", "operation"],
+)
+
+# route label of requests that did not match any route, so that unknown paths
+# don't each create a new series
+UNMATCHED_ROUTE = "unmatched"
+
+
+class PrometheusMiddleware:
+    """
+    Records the count, latency and number in flight of HTTP requests. Requests
+    are labeled with the template of the route that handled them (e.g.
+    `/metadata/{guid:path}`), which the router adds to the request scope.
+    """
+
+    def __init__(self, app):
+        self._app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self._app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        in_progress = HTTP_REQUESTS_IN_PROGRESS.labels(method)
+        in_progress.inc()
+        start = time.perf_counter()
+        try:
+            await self._app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            in_progress.dec()
+            route = scope.get("route")
+            route = getattr(route, "path", UNMATCHED_ROUTE)
+            HTTP_REQUEST_DURATION.labels(method, route).observe(elapsed)
+            HTTP_REQUESTS.labels(method, route, status).inc()
+            update_db_pool_gauges()
+
+
+# the pools of the engines passed to instrument_db_pool, by engine label
+_db_pools = {}
+
+
+def instrument_db_pool(engine: AsyncEngine, label: str = "primary") -> None:
+    """
+    Keep the database pool gauges labeled `label` up to date with the pool of
+    `engine`. They are updated when connections are opened or checked out, and
+    after each request, once its connection is back in the pool (the pool's
+    `checkin` event fires before the connection is counted as returned).
+    """
+    pool = engine.sync_engine.pool
+    _db_pools[label] = pool
+    for name in ("connect", "checkout"):
+        event.listen(pool, name, lambda *args: update_db_pool_gauges())
+    update_db_pool_gauges()
+
+
+def update_db_pool_gauges() -> None:
+    for label, pool in _db_pools.items():
+        DB_POOL_CHECKED_OUT.labels(label).set(pool.checkedout())
+        DB_POOL_OVERFLOW.labels(label).set(max(pool.overflow(), 0))
+        DB_POOL_SIZE.labels(label).set(pool.size())
+
+
+def observe_upstream_request(
+    upstream: str, method: str, status, elapsed: float
+) -> None:
+    UPSTREAM_REQUEST_DURATION.labels(upstream, method, str(status)).observe(elapsed)
+
+
+def observe_opensearch_request(method: str, url: str, elapsed: float) -> None:
+    """
+    The operation is the first API endpoint in the url (e.g. "_search" for
+    `/<index>/_search`), or "index" for urls without one.
+    """
+    operation = next(
+        (part for part in url.split("?")[0].split("/") if part.startswith("_")),
+        "index",
+    )
+    OPENSEARCH_REQUEST_DURATION.labels(method, operation).observe(elapsed)
+
+
+async def get_metrics(request: Request) -> Response:
+    """
+    Returns the metrics in the Prometheus text format.
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
@@ -1,7 +1,7 @@
 from typing import Optional
 
 from pydantic import BaseModel, ConfigDict
-from sqlalchemy import Column, ForeignKey, String
+from sqlalchemy import Column, ForeignKey, Index, String, text
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import declarative_base, relationship
 
@@ -24,6 +24,19 @@ class Metadata(Base):
     """
 
     __tablename__ = "metadata"
+    __table_args__ = (
+        # used to filter reads by the resources a user has access to
+        Index(
+            "metadata_authz_resource_paths_idx",
+            text("(authz -> 'resource_paths')"),
+            postgresql_using="gin",
+        ),
+        Index(
+            "metadata_authz__resource_paths_idx",
+            text("(authz -> '_resource_paths')"),
+            postgresql_using="gin",
+        ),
+    )
 
     guid = Column(String, primary_key=True)
     data = Column(JSONB(), nullable=True)
@@ -1,5 +1,7 @@
+import asyncio
 from collections.abc import Iterable
 from enum import Enum
+from typing import Awaitable, Optional
 
 from authutils.token.fastapi import access_token
 from sqlalchemy.exc import IntegrityError
@@ -20,11 +22,17 @@ from starlette.status import (
     HTTP_403_FORBIDDEN,
     HTTP_404_NOT_FOUND,
     HTTP_500_INTERNAL_SERVER_ERROR,
+    HTTP_503_SERVICE_UNAVAILABLE,
 )
 
 from . import config, logger
-from .query import get_metadata
-from .db import get_data_access_layer, DataAccessLayer
+from .db import (
+    get_data_access_layer,
+    get_read_only_data_access_layer,
+    DataAccessLayer,
+)
+from .http_client import UpstreamUnavailable
+from .indexd_cache import create_indexd_cache
 
 mod = APIRouter()
 
@@ -75,6 +83,28 @@ class CreateObjForIdInput(BaseModel):
     metadata: dict = None
 
 
+class BulkObjectsInput(BaseModel):
+    """
+    Bulk object lookup
+
+    guids (list): indexd GUIDs and/or MDS keys to get the records and metadata of
+    """
+
+    guids: list[str]
+
+
+class BulkDeleteObjectsInput(BaseModel):
+    """
+    Bulk object deletion
+
+    guids (list): indexd GUIDs to delete the records and metadata of
+    delete_file_locations (bool): whether to also delete the files, through fence
+    """
+
+    guids: list[str]
+    delete_file_locations: bool = False
+
+
 @mod.post("/objects/upload")
 async def create_object(
     body: CreateObjInput,
@@ -146,11 +176,13 @@ async def create_object(
             HTTP_400_BAD_REQUEST, f"GUID cannot have value: {FORBIDDEN_IDS}"
         )
 
-    if aliases:
-        await _create_aliases_for_record(aliases, blank_guid, auth_header, request)
-
-    metadata = await _add_metadata(
-        blank_guid, metadata, authz, uploader, data_access_layer
+    # the aliases (indexd) and the metadata (db) don't depend on each other
+    _, metadata = await _create_aliases_and_metadata(
+        aliases,
+        _add_metadata(blank_guid, metadata, authz, uploader, data_access_layer),
+        blank_guid,
+        auth_header,
+        request,
     )
 
     response = {
@@ -198,12 +230,9 @@ async def create_object_for_id(
 
     # hit indexd's GUID/alias resolution endpoint to get the indexd did
     try:
-        endpoint = config.INDEXING_SERVICE_ENDPOINT.rstrip("/") + f"/{guid}"
-        response = await request.app.async_client.get(endpoint)
-        response.raise_for_status()
+        indexd_record = await _resolve_indexd_guid(guid, request)
 
         # if the object is found in indexd, we can proceed
-        indexd_record = response.json()
         indexd_did = indexd_record["did"]
     except httpx.HTTPError as err:
         logger.debug(err)
@@ -233,22 +262,25 @@ async def create_object_for_id(
     new_version_did = await _create_blank_version(
         indexd_record, file_name, auth_header, request
     )
+    request.app.indexd_cache.invalidate(indexd_did)
+    request.app.indexd_cache.invalidate(guid)
     logger.debug(f"Created a new version of {indexd_did}: {new_version_did}")
 
-    # get an upload URL for the newly created blank record
-    signed_upload_url = await _create_url_for_blank_record(
-        new_version_did, auth_header, request
-    )
-
-    if aliases:
-        await _create_aliases_for_record(aliases, new_version_did, auth_header, request)
-
-    metadata = await _add_metadata(
+    # get an upload URL for the newly created blank record (fence), while the
+    # aliases (indexd) and the metadata (db) are created for it
+    signed_upload_url, metadata = await _create_aliases_and_metadata(
+        aliases,
+        _add_metadata(
+            new_version_did,
+            metadata,
+            {"resource_paths": indexd_record["authz"]},
+            uploader,
+            data_access_layer,
+        ),
         new_version_did,
-        metadata,
-        {"resource_paths": indexd_record["authz"]},
-        uploader,
-        data_access_layer,
+        auth_header,
+        request,
+        create_url=_create_url_for_blank_record(new_version_did, auth_header, request),
     )
 
     response = {
@@ -324,7 +356,7 @@ async def get_object_signed_download_url(
 async def get_object_latest(
     guid: str,
     request: Request,
-    data_access_layer: DataAccessLayer = Depends(get_data_access_layer),
+    data_access_layer: DataAccessLayer = Depends(get_read_only_data_access_layer),
 ) -> JSONResponse:
     """
     Attempt to fetch the latest version of the provided guid/key from indexd.
@@ -342,28 +374,13 @@ async def get_object_latest(
         200: { "record": { indexd record }, "metadata": { MDS metadata } }
         404: if the key is not in indexd and not in MDS
     """
-    mds_key = guid
-    indexd_record = {}
-
-    try:
-        endpoint = (
-            config.INDEXING_SERVICE_ENDPOINT.rstrip("/") + f"/index/{guid}/latest"
-        )
-        response = await request.app.async_client.get(endpoint)
-        response.raise_for_status()
-
-        # if the object is found in indexd, use the indexd did as MDS key
-        indexd_record = response.json()
-        mds_key = indexd_record["did"]
-    except httpx.HTTPError as err:
-        logger.debug(err)
-        if err.response and err.response.status_code == 404:
-            logger.debug(f"Could not find latest record for GUID '{guid}' in indexd")
-        else:
-            msg = f"Unable to query indexd for latest record for GUID '{guid}'"
-            logger.error(f"{msg}\nException:\n{err}", exc_info=True)
-
-    mds_metadata = await _get_metadata(mds_key, data_access_layer)
+    endpoint = config.INDEXING_SERVICE_ENDPOINT.rstrip("/") + f"/index/{guid}/latest"
+    indexd_record, mds_metadata = await _get_indexd_record_and_metadata(
+        guid,
+        _get_from_indexd(endpoint, request),
+        f"latest record for GUID '{guid}'",
+        data_access_layer,
+    )
 
     if not indexd_record and not mds_metadata:
         raise HTTPException(HTTP_404_NOT_FOUND, f"Not found: '{guid}'")
@@ -380,7 +397,7 @@ async def get_object_latest(
 async def get_object(
     guid: str,
     request: Request,
-    data_access_layer: DataAccessLayer = Depends(get_data_access_layer),
+    data_access_layer: DataAccessLayer = Depends(get_read_only_data_access_layer),
 ) -> JSONResponse:
     """
     Get the metadata associated with the provided key. If the key is an
@@ -394,27 +411,13 @@ async def get_object(
         200: { "record": { indexd record }, "metadata": { MDS metadata } }
         404: if the key is not in indexd and not in MDS
     """
-    mds_key = guid
-
     # hit indexd's GUID/alias resolution endpoint to get the indexd did
-    indexd_record = {}
-    try:
-        endpoint = config.INDEXING_SERVICE_ENDPOINT.rstrip("/") + f"/{guid}"
-        response = await request.app.async_client.get(endpoint)
-        response.raise_for_status()
-
-        # if the object is found in indexd, use the indexd did as MDS key
-        indexd_record = response.json()
-        mds_key = indexd_record["did"]
-    except httpx.HTTPError as err:
-        logger.debug(err)
-        if err.response and err.response.status_code == 404:
-            logger.debug(f"Could not find GUID or alias '{guid}' in indexd")
-        else:
-            msg = f"Unable to query indexd for GUID or alias '{guid}'"
-            logger.error(f"{msg}\nException:\n{err}", exc_info=True)
-
-    mds_metadata = await _get_metadata(mds_key, data_access_layer)
+    indexd_record, mds_metadata = await _get_indexd_record_and_metadata(
+        guid,
+        _resolve_indexd_guid(guid, request),
+        f"GUID or alias '{guid}'",
+        data_access_layer,
+    )
 
     if not indexd_record and not mds_metadata:
         raise HTTPException(HTTP_404_NOT_FOUND, f"Not found: '{guid}'")
@@ -427,6 +430,71 @@ async def get_object(
     return JSONResponse(response, HTTP_200_OK)
 
 
+@mod.post("/bulk/objects")
+async def get_objects_bulk(
+    body: BulkObjectsInput,
+    request: Request,
+    data_access_layer: DataAccessLayer = Depends(get_read_only_data_access_layer),
+) -> JSONResponse:
+    """
+    Get the indexd records and metadata of many keys at once. This is the bulk
+    version of `GET /objects/{guid}`, except that indexd aliases are not
+    supported: indexd is queried for all the keys in a single bulk request, and
+    the metadata for all of them in a single query.
+
+        POST /bulk/objects
+        {"guids": ["dg.1234/guid1", "guid2", "guid3"]}
+
+        {
+            "results": {
+                "dg.1234/guid1": {"record": {...}, "metadata": {...}},
+                "guid2": {"record": {}, "metadata": {...}}
+            },
+            "not_found": ["guid3"]
+        }
+
+    At most `METADATA_QUERY_RESULTS_LIMIT` keys can be requested at once.
+
+    Args:
+        body (BulkObjectsInput): indexd GUIDs and/or MDS keys
+        request (Request): starlette request (which contains reference to FastAPI app)
+
+    Returns:
+        200: { "results": { key: { "record": ..., "metadata": ... } }, "not_found": [...] }
+        400: if too many keys are requested
+    """
+    guids = list(dict.fromkeys(body.guids))
+    if len(guids) > config.METADATA_QUERY_RESULTS_LIMIT:
+        raise HTTPException(
+            HTTP_400_BAD_REQUEST,
+            f"At most {config.METADATA_QUERY_RESULTS_LIMIT} GUIDs can be requested at once",
+        )
+    if not guids:
+        return JSONResponse({"results": {}, "not_found": []}, HTTP_200_OK)
+
+    # indexd's bulk documents are looked up by did, so the keys are also the MDS
+    # keys and both lookups can run at once
+    indexd_records, mds_records = await _gather_all(
+        _get_indexd_records(guids, request),
+        data_access_layer.get_metadata_for_keys(guids),
+    )
+
+    results = {}
+    not_found = []
+    for guid in guids:
+        indexd_record = indexd_records.get(guid, {})
+        mds_record = mds_records.get(guid)
+        if not indexd_record and not mds_record:
+            not_found.append(guid)
+            continue
+        results[guid] = {
+            "record": indexd_record,
+            "metadata": mds_record["data"] if mds_record else {},
+        }
+
+    return JSONResponse({"results": results, "not_found": not_found}, HTTP_200_OK)
+
+
 @mod.delete("/objects/{guid:path}")
 async def delete_object(
     guid: str,
@@ -448,9 +516,6 @@ async def delete_object(
         403: if fence/indexd returns a 403 unauthorized response
         500: if fence/indexd does not return 204 or 403 or there is an error deleting metadata
     """
-    # Attempt to get the row, then attempt delete the row from Metadata table
-    deleted_record = await data_access_layer.delete_metadata(guid)
-
     delete_file_locations = False
     if "delete_file_locations" in request.query_params:
         if request.query_params["delete_file_locations"]:
@@ -459,72 +524,355 @@ async def delete_object(
                 f"Query param `delete_file_locations` should not contain any value",
             )
         delete_file_locations = True
+
+    # Lock the row while fence/indexd is called, and only delete it once they
+    # succeed. On errors the transaction is rolled back, which releases the lock.
+    record = await data_access_layer.lock_metadata(guid)
+
     svc_name = "fence" if delete_file_locations else "indexd"
     try:
         auth_header = str(request.headers.get("Authorization", ""))
-        headers = {"Authorization": auth_header}
         if delete_file_locations:
-            fence_endpoint = urljoin(
-                config.DATA_ACCESS_SERVICE_ENDPOINT, f"data/{guid}"
-            )
-            response = await request.app.async_client.delete(
-                fence_endpoint, headers=headers
-            )
+            rev = None
         else:
             rev = await get_indexd_revision(guid, request)
-            indexd_endpoint = urljoin(config.INDEXING_SERVICE_ENDPOINT, f"index/{guid}")
-            response = await request.app.async_client.delete(
-                indexd_endpoint, params={"rev": rev}, headers=headers
-            )
-        response.raise_for_status()
+        await _delete_upstream_record(
+            guid, delete_file_locations, rev, auth_header, request
+        )
     except httpx.HTTPError as err:
         logger.debug(err)
-        # Recreate data in metadata table in case of any exception
-        if deleted_record:
-            await data_access_layer.create_metadata(
-                guid=deleted_record["guid"],
-                data=deleted_record["data"],
-                authz=deleted_record["authz"],
-                overwrite=False,
-            )
-        status_code = (
-            err.response.status_code if err.response else HTTP_500_INTERNAL_SERVER_ERROR
+        request.app.indexd_cache.invalidate(guid)
+        raise HTTPException(
+            _upstream_status_code(err), f"Error during request to {svc_name}"
         )
-        raise HTTPException(status_code, f"Error during request to {svc_name}")
 
+    if record:
+        await data_access_layer.delete_metadata(guid)
+    request.app.indexd_cache.invalidate(guid)
     return JSONResponse({}, HTTP_204_NO_CONTENT)
 
 
+@mod.post("/bulk/objects/delete")
+async def delete_objects_bulk(
+    body: BulkDeleteObjectsInput,
+    request: Request,
+    data_access_layer: DataAccessLayer = Depends(get_data_access_layer),
+) -> JSONResponse:
+    """
+    Delete many objects at once. This is the bulk version of
+    `DELETE /objects/{guid}`: each object's metadata is deleted only if its
+    record was deleted from indexd (or its files were deleted by fence, if
+    `delete_file_locations` is true).
+
+        POST /bulk/objects/delete
+        {"guids": ["dg.1234/guid1", "guid2"], "delete_file_locations": false}
+
+        {"deleted": ["dg.1234/guid1"], "failed": {"guid2": 403}}
+
+    The metadata rows are locked while the upstream deletes run concurrently
+    (`BULK_DELETE_MAX_CONCURRENT` at a time), then all the deleted ones are
+    removed in a single statement. The revisions
+    needed by indexd are fetched in a single bulk request, so indexd aliases are
+    not supported. At most `METADATA_QUERY_RESULTS_LIMIT` GUIDs can be deleted
+    at once.
+
+    Args:
+        body (BulkDeleteObjectsInput): indexd GUIDs
+        request (Request): starlette request (which contains reference to FastAPI app)
+
+    Returns:
+        200: { "deleted": [...], "failed": { guid: status code from fence/indexd } }
+        400: if too many GUIDs are requested
+    """
+    guids = list(dict.fromkeys(body.guids))
+    if len(guids) > config.METADATA_QUERY_RESULTS_LIMIT:
+        raise HTTPException(
+            HTTP_400_BAD_REQUEST,
+            f"At most {config.METADATA_QUERY_RESULTS_LIMIT} GUIDs can be deleted at once",
+        )
+    if not guids:
+        return JSONResponse({"deleted": [], "failed": {}}, HTTP_200_OK)
+
+    await data_access_layer.lock_metadata_for_keys(guids)
+
+    failed = {}
+    revs = {}
+    if not body.delete_file_locations:
+        try:
+            indexd_records = await _fetch_indexd_records(guids, request)
+        except httpx.HTTPError as err:
+            logger.error(
+                f"Unable to query indexd for {len(guids)} GUIDs\nException:\n{err}",
+                exc_info=True,
+            )
+            status_code = _upstream_status_code(err)
+            return JSONResponse(
+                {"deleted": [], "failed": {guid: status_code for guid in guids}},
+                HTTP_200_OK,
+            )
+        for guid in guids:
+            if guid in indexd_records:
+                revs[guid] = indexd_records[guid].get("rev")
+            else:
+                failed[guid] = HTTP_404_NOT_FOUND
+        guids = [guid for guid in guids if guid in revs]
+
+    auth_header = str(request.headers.get("Authorization", ""))
+    slots = asyncio.Semaphore(_bulk_delete_concurrency())
+
+    async def delete_upstream_record(guid):
+        async with slots:
+            await _delete_upstream_record(
+                guid, body.delete_file_locations, revs.get(guid), auth_header, request
+            )
+
+    results = await asyncio.gather(
+        *(delete_upstream_record(guid) for guid in guids),
+        return_exceptions=True,
+    )
+
+    deleted = []
+    for guid, result in zip(guids, results):
+        request.app.indexd_cache.invalidate(guid)
+        if isinstance(result, (httpx.HTTPError, UpstreamUnavailable)):
+            logger.debug(result)
+            failed[guid] = _upstream_status_code(result)
+        elif isinstance(result, Exception):
+            # the other GUIDs may already be deleted upstream: keep going so that
+            # their metadata is deleted too
+            logger.error(
+                f"Unable to delete {guid}\nException:\n{result}", exc_info=result
+            )
+            failed[guid] = HTTP_500_INTERNAL_SERVER_ERROR
+        elif isinstance(result, BaseException):
+            raise result
+        else:
+            deleted.append(guid)
+
+    await data_access_layer.batch_delete_metadata(deleted)
+    return JSONResponse({"deleted": deleted, "failed": failed}, HTTP_200_OK)
+
+
+def _bulk_delete_concurrency() -> int:
+    """
+    How many upstream deletes `POST /bulk/objects/delete` sends at once: at
+    most half of the upstream's bulkhead, so that the others don't time out
+    waiting for a slot and other requests to the upstream still get one.
+    """
+    limit = config.BULK_DELETE_MAX_CONCURRENT
+    if config.HTTP_CLIENT_BULKHEAD_MAX_CONCURRENT > 0:
+        limit = min(limit, config.HTTP_CLIENT_BULKHEAD_MAX_CONCURRENT // 2)
+    return max(1, limit)
+
+
+def _upstream_status_code(err: Exception) -> int:
+    """
+    The status code fence/indexd responded with, 503 if the request was not sent
+    because the upstream is unavailable, or 500 if the request failed without a
+    response (e.g. a connection error).
+    """
+    if isinstance(err, UpstreamUnavailable):
+        return HTTP_503_SERVICE_UNAVAILABLE
+    response = getattr(err, "response", None)
+    return response.status_code if response else HTTP_500_INTERNAL_SERVER_ERROR
+
+
+async def _delete_upstream_record(
+    guid: str,
+    delete_file_locations: bool,
+    rev: Optional[str],
+    auth_header: str,
+    request: Request,
+) -> None:
+    """
+    Delete a record from indexd, or its files and record through fence.
+
+    Args:
+        guid (str): indexd GUID
+        delete_file_locations (bool): whether to delete the files through fence
+        rev (str): the record's indexd revision, when deleting from indexd
+        auth_header (str): Authorization header to pass on to fence/indexd
+
+    Raises:
+        httpx.HTTPError: if fence/indexd could not be reached or returned an error
+    """
+    headers = {"Authorization": auth_header}
+    if delete_file_locations:
+        fence_endpoint = urljoin(config.DATA_ACCESS_SERVICE_ENDPOINT, f"data/{guid}")
+        response = await request.app.async_client.delete(
+            fence_endpoint, headers=headers
+        )
+    else:
+        indexd_endpoint = urljoin(config.INDEXING_SERVICE_ENDPOINT, f"index/{guid}")
+        response = await request.app.async_client.delete(
+            indexd_endpoint, params={"rev": rev}, headers=headers
+        )
+    response.raise_for_status()
+
+
 async def get_indexd_revision(guid, request):
+    """
+    Get the current revision of an indexd record. It is read from indexd
+    directly: a revision from the cache may be stale, and indexd refuses to
+    update or delete a record with a stale revision.
+    """
+    request.app.indexd_cache.invalidate(guid)
     endpoint = config.INDEXING_SERVICE_ENDPOINT.rstrip("/") + f"/{guid}"
+    indexd_record = await _get_from_indexd(endpoint, request)
+    return indexd_record.get("rev")
+
+
+async def _get_from_indexd(endpoint: str, request: Request) -> dict:
     response = await request.app.async_client.get(endpoint)
     response.raise_for_status()
-    indexd_record = response.json()
-    return indexd_record.get("rev")
+    return response.json()
 
 
-async def _get_metadata(mds_key: str, data_access_layer: DataAccessLayer) -> dict:
+async def _resolve_indexd_guid(guid: str, request: Request) -> dict:
     """
-    Query the metadata database for mds_key.
+    Resolve a GUID or alias with indexd, through the app's indexd cache.
 
     Args:
-        mds_key (str): key used to query the metadata database
+        guid (str): indexd GUID or alias
 
     Returns:
-        dict: the object queried from the metadata database
+        dict: the indexd record
+
+    Raises:
+        httpx.HTTPError: if indexd could not be queried or returned an error
+    """
+    endpoint = config.INDEXING_SERVICE_ENDPOINT.rstrip("/") + f"/{guid}"
+    return await request.app.indexd_cache.get(
+        guid, lambda: _get_from_indexd(endpoint, request)
+    )
+
+
+async def _get_indexd_record(lookup: Awaitable[dict], description: str) -> dict:
+    """
+    Get a record from indexd.
+
+    Args:
+        lookup (Awaitable[dict]): request for the record
+        description (str): what is being looked up, for logging
+
+    Returns:
+        dict: the indexd record, or an empty dict if indexd did not return one
+        or is unavailable (see `mds.http_client`)
     """
-    mds_metadata = {}
     try:
-        logger.debug(f"Querying the metadata database directly for key '{mds_key}'")
-        mds_metadata = await get_metadata(mds_key, data_access_layer)
-    except HTTPException as err:
+        return await lookup
+    except httpx.HTTPError as err:
         logger.debug(err)
-        if err.status_code == 404:
-            logger.debug(f"Could not find key '{mds_key}', returning empty metadata")
+        if err.response and err.response.status_code == 404:
+            logger.debug(f"Could not find {description} in indexd")
         else:
-            msg = f"Unable to query key '{mds_key}', returning empty metadata"
+            msg = f"Unable to query indexd for {description}"
             logger.error(f"{msg}\nException:\n{err}", exc_info=True)
-    return mds_metadata
+    except UpstreamUnavailable as err:
+        # serve the metadata without waiting on indexd
+        logger.warning(f"Not querying indexd for {description}: {err}")
+    return {}
+
+
+async def _fetch_indexd_records(guids: list, request: Request) -> dict:
+    """
+    Get many records from indexd in a single bulk request.
+
+    Args:
+        guids (list): indexd GUIDs (not aliases)
+
+    Returns:
+        dict: did -> indexd record for the records that were found
+
+    Raises:
+        httpx.HTTPError: if indexd could not be queried
+    """
+    endpoint = config.INDEXING_SERVICE_ENDPOINT.rstrip("/") + "/bulk/documents"
+    response = await request.app.async_client.post(endpoint, json=guids)
+    response.raise_for_status()
+    return {record["did"]: record for record in response.json()}
+
+
+async def _get_indexd_records(guids: list, request: Request) -> dict:
+    """
+    Get many records from indexd in a single bulk request.
+
+    Args:
+        guids (list): indexd GUIDs (not aliases)
+
+    Returns:
+        dict: did -> indexd record for the records that were found. Empty if
+        indexd could not be queried or is unavailable.
+    """
+    try:
+        return await _fetch_indexd_records(guids, request)
+    except httpx.HTTPError as err:
+        logger.debug(err)
+        msg = f"Unable to query indexd for {len(guids)} GUIDs"
+        logger.error(f"{msg}\nException:\n{err}", exc_info=True)
+    except UpstreamUnavailable as err:
+        logger.warning(f"Not querying indexd for {len(guids)} GUIDs: {err}")
+    return {}
+
+
+async def _gather_all(*aws: Awaitable) -> list:
+    """
+    Like `asyncio.gather`, but if one of the awaitables fails, wait for the others to finish before raising the
+    first error, so that none of them is still using the request's database
+    session when it is closed.
+    """
+    results = await asyncio.gather(*aws, return_exceptions=True)
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+    return results
+
+
+async def _get_indexd_record_and_metadata(
+    guid: str,
+    lookup: Awaitable[dict],
+    description: str,
+    data_access_layer: DataAccessLayer,
+) -> tuple:
+    """
+    Get the indexd record returned by `lookup` and the metadata of the MDS key
+    it points to: the record's `did` if indexd returned one, `guid` otherwise.
+
+    The key is usually `guid` already, so its metadata is queried while waiting
+    for indexd, and only queried again for the `did` if it is different.
+
+    Returns:
+        tuple: (indexd record or {}, metadata or {})
+    """
+    indexd_record, mds_metadata = await _gather_all(
+        _get_indexd_record(lookup, description),
+        _get_metadata(guid, data_access_layer),
+    )
+
+    # if the object is found in indexd, use the indexd did as MDS key
+    mds_key = indexd_record.get("did", guid)
+    if mds_key != guid:
+        mds_metadata = await _get_metadata(mds_key, data_access_layer)
+
+    return indexd_record, mds_metadata
+
+
+async def _get_metadata(mds_key: str, data_access_layer: DataAccessLayer) -> dict:
+    """
+    Query the metadata database for mds_key.
+
+    Args:
+        mds_key (str): key used to query the metadata database
+
+    Returns:
+        dict: the object queried from the metadata database
+    """
+    logger.debug(f"Querying the metadata database directly for key '{mds_key}'")
+    metadata = await data_access_layer.resolve_metadata(mds_key)
+    if not metadata:
+        logger.debug(f"Could not find key '{mds_key}', returning empty metadata")
+        return {}
+    return metadata["data"]
 
 
 async def _create_aliases_for_record(
@@ -574,6 +922,101 @@ async def _create_aliases_for_record(
     logger.info(f"added aliases: {aliases} for guid: {blank_guid}")
 
 
+async def _delete_aliases_for_record(guid: str, auth_header: str, request: Request):
+    """
+    Delete all the aliases of the provided indexd record. Errors are logged, not
+    raised, since this is only used to clean up after a failed upload request.
+    """
+    logger.debug(f"trying to delete aliases for guid {guid}")
+    try:
+        endpoint = (
+            config.INDEXING_SERVICE_ENDPOINT.rstrip("/") + f"/index/{guid}/aliases"
+        )
+        headers = {"Authorization": auth_header}
+        response = await request.app.async_client.delete(endpoint, headers=headers)
+        response.raise_for_status()
+    except Exception as err:
+        logger.error(
+            f"Unable to delete aliases for guid {guid}.\nException:\n{err}",
+            exc_info=True,
+        )
+        return
+    logger.info(f"deleted aliases for guid: {guid}")
+
+
+async def _delete_blank_record(guid: str, auth_header: str, request: Request):
+    """
+    Delete the blank indexd record created for a failed upload request. Errors
+    are logged, not raised.
+    """
+    logger.debug(f"trying to delete blank record {guid}")
+    try:
+        rev = await get_indexd_revision(guid, request)
+        endpoint = config.INDEXING_SERVICE_ENDPOINT.rstrip("/") + f"/index/{guid}"
+        response = await request.app.async_client.delete(
+            endpoint,
+            params={"rev": rev},
+            headers={"Authorization": auth_header},
+        )
+        response.raise_for_status()
+    except Exception as err:
+        logger.error(
+            f"Unable to delete blank record {guid}.\nException:\n{err}",
+            exc_info=True,
+        )
+        return
+    logger.info(f"deleted blank record: {guid}")
+
+
+async def _create_aliases_and_metadata(
+    aliases: list,
+    add_metadata: Awaitable,
+    guid: str,
+    auth_header: str,
+    request: Request,
+    create_url: Optional[Awaitable] = None,
+):
+    """
+    Create the aliases for `guid` in indexd, the metadata in the db
+    (`add_metadata`) and, if provided, the signed upload url (`create_url`)
+    concurrently, since none of them depend on the others.
+
+    All of them are awaited before returning. If anything fails, the aliases (if
+    they were created) and the blank record `guid` are deleted again so that they
+    aren't left in indexd for a record the user never got back, and the first
+    error is raised in the order: upload url, aliases, metadata. The metadata is
+    rolled back with the request's transaction.
+
+    Returns:
+        tuple: (signed upload url or None, metadata)
+    """
+
+    async def nothing():
+        return None
+
+    operations = [
+        create_url or nothing(),
+        (
+            _create_aliases_for_record(aliases, guid, auth_header, request)
+            if aliases
+            else nothing()
+        ),
+        add_metadata,
+    ]
+    signed_upload_url, aliases_result, metadata = results = await asyncio.gather(
+        *operations, return_exceptions=True
+    )
+
+    errors = [result for result in results if isinstance(result, BaseException)]
+    if errors:
+        if aliases and not isinstance(aliases_result, BaseException):
+            await _delete_aliases_for_record(guid, auth_header, request)
+        await _delete_blank_record(guid, auth_header, request)
+        raise errors[0]
+
+    return signed_upload_url, metadata
+
+
 async def _create_blank_version(
     indexd_record: dict,
     file_name: str,
@@ -736,5 +1179,11 @@ def _is_authz_version_supported(authz):
     return False
 
 
+async def upstream_unavailable_handler(request: Request, exc: UpstreamUnavailable):
+    return JSONResponse({"detail": str(exc)}, HTTP_503_SERVICE_UNAVAILABLE)
+
+
 def init_app(app):
     app.include_router(mod, tags=["Object"])
+    app.indexd_cache = create_indexd_cache()
+    app.add_exception_handler(UpstreamUnavailable, upstream_unavailable_handler)
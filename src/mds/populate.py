@@ -1,18 +1,27 @@
 import argparse
 import asyncio
+import json
 import sys
+import time
+import uuid
 from argparse import Namespace
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timezone
 from pathlib import Path
 from typing import Any, Dict, List, Optional
 from urllib.parse import urlparse
 
 from pathvalidate import ValidationError, sanitize_filepath, validate_filepath
 
-from mds import config, logger
-from mds.agg_mds import adapters, datastore
+from mds import config, lazy_import, logger
+from mds.agg_mds import datastore
 from mds.agg_mds.commons import ColumnsToFields, Commons, MDSInstance, parse_config
 from mds.agg_mds.mds import pull_mds
 
+# the adapters and their parsing libraries are only imported when a commons uses one
+adapters = lazy_import("mds.agg_mds.adapters")
+
 
 def parse_args(argv: List[str]) -> Namespace:
     """
@@ -22,18 +31,162 @@ def parse_args(argv: List[str]) -> Namespace:
 
     parser = argparse.ArgumentParser()
     parser.add_argument("--config", help="config file to use", type=str, required=True)
+    parser.add_argument(
+        "--report", help="file to write the JSON run report to", type=str
+    )
+    parser.add_argument(
+        "--push-report",
+        help="also store the run report in the info index",
+        action="store_true",
+    )
     known_args, unknown_args = parser.parse_known_args(argv)
     return known_args
 
 
-async def populate_metadata(name: str, common, results, use_temp_index=False):
+def _by_count(counts: Counter) -> List[tuple]:
+    """Items of counts ordered by descending count, then key."""
+    return sorted(counts.items(), key=lambda item: (-item[1], str(item[0])))
+
+
+class AggregateSummary:
+    """
+    Tag counts and commons names across every commons populated in one run.
+    These are stored in the info index so that /aggregate/tags and
+    /aggregate/commons don't need to aggregate over all the metadata.
+    """
+
+    def __init__(self):
+        self.tag_totals = Counter()
+        self.tag_names = defaultdict(Counter)
+        self.commons = Counter()
+
+    def add(self, study_data: dict) -> None:
+        """Count the commons and tags of one normalized metadata entry."""
+        self.commons[study_data["commons_name"]] += 1
+        for t in study_data.get("tags") or []:
+            if "category" not in t:
+                continue
+            self.tag_totals[t["category"]] += 1
+            if t.get("name") is not None:
+                self.tag_names[t["category"]][t["name"]] += 1
+
+    def tags(self) -> List[Dict[str, Any]]:
+        return [
+            {
+                "category": category,
+                "total": total,
+                "names": [
+                    {"name": name, "count": count}
+                    for name, count in _by_count(self.tag_names[category])
+                ],
+            }
+            for category, total in _by_count(self.tag_totals)
+        ]
+
+    def commons_names(self) -> List[str]:
+        return [name for name, _ in _by_count(self.commons)]
+
+
+@contextmanager
+def _timed(report: Optional[Dict[str, Any]], key: str):
+    """Adds the time spent in the block to `report[key]`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if report is not None:
+            report[key] = report.get(key, 0.0) + time.perf_counter() - start
+
+
+class PopulateReport:
+    """
+    Timings, document counts and failures of each commons in one populate run,
+    so that the commons that dominate the run can be found. Logged as JSON at
+    the end of the run, and optionally written to a file and to the info index.
+    """
+
+    PHASES = ("fetch_seconds", "normalize_seconds", "prepare_seconds", "index_seconds")
+
+    def __init__(self):
+        self.started_at = datetime.now(timezone.utc)
+        self._start = time.perf_counter()
+        self.commons: Dict[str, Dict[str, Any]] = {}
+        self.status = "running"
+        self.error = None
+        self.clone_seconds = 0.0
+
+    def add_commons(self, name: str, source: str) -> Dict[str, Any]:
+        report = {
+            "source": source,
+            "status": "ok",
+            "documents_received": 0,
+            "documents_indexed": 0,
+            "bytes": 0,
+            **{phase: 0.0 for phase in self.PHASES},
+        }
+        self.commons[name] = report
+        return report
+
+    def commons_seconds(self, name: str) -> float:
+        return sum(self.commons[name][phase] for phase in self.PHASES)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "started_at": self.started_at.isoformat(),
+            "duration_seconds": time.perf_counter() - self._start,
+            "status": self.status,
+            "error": self.error,
+            "documents": sum(c["documents_indexed"] for c in self.commons.values()),
+            "failed_commons": [
+                name for name, c in self.commons.items() if c["status"] == "failed"
+            ],
+            # commons ordered by the time spent on them, slowest first
+            "slowest_commons": sorted(
+                self.commons, key=self.commons_seconds, reverse=True
+            ),
+            "clone_seconds": self.clone_seconds,
+            "commons": self.commons,
+        }
+
+
+async def populate_metadata(
+    name: str,
+    common,
+    results,
+    use_temp_index=False,
+    summary: Optional[AggregateSummary] = None,
+    report: Optional[Dict[str, Any]] = None,
+):
+    """
+    Normalizes the metadata of a commons and writes it to the datastore. If a
+    `report` dict is given, the number of documents written is stored in its
+    "documents_indexed", and the time spent preparing and writing them is added
+    to its "prepare_seconds" and "index_seconds".
+    """
+    with _timed(report, "prepare_seconds"):
+        args = await _prepare_metadata(name, common, results, summary)
+    if args is None:
+        return
+    with _timed(report, "index_seconds"):
+        await datastore.update_metadata(*args, use_temp_index)
+    if report is not None:
+        report["documents_indexed"] = len(args[1])
+
+
+async def _prepare_metadata(
+    name: str, common, results, summary: Optional[AggregateSummary]
+) -> Optional[tuple]:
+    """
+    Returns the arguments of `datastore.update_metadata` for the commons, or
+    None if there is nothing to write.
+    """
     mds_arr = [{k: v} for k, v in results.items()]
 
     total_items = len(mds_arr)
 
     if total_items == 0:
         logger.warning(f"populating {name} aborted as there are no items to add")
-        return
+        return None
 
     # prefilter to remove entries not matching a certain field.
     if hasattr(common, "select_field") and common.select_field is not None:
@@ -100,6 +253,9 @@ async def populate_metadata(name: str, common, results, use_temp_index=False):
             if "name" in t:
                 tags[t["category"]].add(t["name"])
 
+        if summary is not None:
+            summary.add(entry[config.AGG_MDS_DEFAULT_STUDY_DATA_FIELD])
+
     # process tags set to list
     for k, v in tags.items():
         tags[k] = list(tags[k])
@@ -107,7 +263,7 @@ async def populate_metadata(name: str, common, results, use_temp_index=False):
     keys = list(results.keys())
     info = {"commons_url": common.commons_url}
 
-    await datastore.update_metadata(name, mds_arr, keys, tags, info, use_temp_index)
+    return name, mds_arr, keys, tags, info
 
 
 async def populate_info(commons_config: Commons, use_temp_index=False) -> None:
@@ -135,6 +291,11 @@ async def populate_drs_info(commons_config: Commons, use_temp_index=False) -> No
                 await datastore.update_global_info(id, entry, use_temp_index)
 
 
+async def populate_summaries(summary: AggregateSummary, use_temp_index=False) -> None:
+    await datastore.update_tags_summary(summary.tags(), use_temp_index)
+    await datastore.update_commons_summary(summary.commons_names(), use_temp_index)
+
+
 def extract_array_fields(commons_config: Commons, prefix: str = None) -> list:
     """Extract array type fields from configuration schema, optionally with prefix."""
     array_fields = [
@@ -155,7 +316,11 @@ async def populate_config(commons_config: Commons, use_temp_index=False) -> None
     await datastore.update_config_info(array_definition, use_temp_index)
 
 
-async def main(commons_config: Commons) -> None:
+async def main(
+    commons_config: Commons,
+    report_path: Optional[str] = None,
+    push_report: bool = False,
+) -> None:
     """
     Given a config structure, pull all metadata from each one in the config and cache into the following
     structure:
@@ -203,17 +368,31 @@ async def main(commons_config: Commons) -> None:
     await datastore.create_temp_indexes(commons_mapping=field_mapping)
 
     mdsCount = 0
+    summary = AggregateSummary()
+    report = PopulateReport()
+    commons_count = len(commons_config.gen3_commons) + len(
+        commons_config.adapter_commons
+    )
     try:
         for name, common in commons_config.gen3_commons.items():
             logger.info(f"Populating {name} using Gen3 MDS connector")
-            results = pull_mds(common.mds_url, common.guid_type)
-            logger.info(f"Received {len(results)} from {name}")
-            if len(results) > 0:
-                mdsCount += len(results)
-                await populate_metadata(name, common, results, use_temp_index=True)
+            commons_report = report.add_commons(name, "gen3")
+            try:
+                with _timed(commons_report, "fetch_seconds"):
+                    results = pull_mds(
+                        common.mds_url, common.guid_type, report=commons_report
+                    )
+            except Exception as ex:
+                commons_report["status"] = "failed"
+                commons_report["error"] = str(ex)
+                raise
+            mdsCount += await _populate_commons(
+                name, common, results, summary, report, commons_count
+            )
 
         for name, common in commons_config.adapter_commons.items():
             logger.info(f"Populating {name} using adapter: {common.adapter}")
+            commons_report = report.add_commons(name, common.adapter)
             results = adapters.get_metadata(
                 common.adapter,
                 common.mds_url,
@@ -224,32 +403,43 @@ async def main(commons_config: Commons) -> None:
                 common.keep_original_fields,
                 common.global_field_filters,
                 schema=commons_config.configuration.schema,
+                report=commons_report,
+            )
+            mdsCount += await _populate_commons(
+                name, common, results, summary, report, commons_count
             )
-            logger.info(f"Received {len(results)} from {name}")
-            if len(results) > 0:
-                mdsCount += len(results)
-                await populate_metadata(name, common, results, use_temp_index=True)
 
         if mdsCount == 0:
             logger.info(
                 "Could not obtain any metadata from any adapters. Existing indexes are left in place."
             )
+            report.status = "empty"
+            _finish_report(report, report_path)
             return
 
         # populate global information index
         await populate_info(commons_config, use_temp_index=True)
         # populate array index information to support guppy
         await populate_config(commons_config, use_temp_index=True)
+        # precomputed tag counts and commons list served by the aggregate API
+        await populate_summaries(summary, use_temp_index=True)
+        # new generation id, goes live with the cloned indexes and invalidates
+        # cached aggregate responses
+        await datastore.update_generation(uuid.uuid4().hex, True)
 
     except Exception as ex:
         logger.error(
             "Error occurred during mds population. Existing indexes are left in place."
         )
         logger.error(ex)
+        report.status = "failed"
+        report.error = str(ex)
+        _finish_report(report, report_path)
         raise ex
 
     logger.info(f"Temp indexes populated successfully. Proceeding to clone")
     # All temp indexes created without error, drop current real index, clone temp to real index and then drop temp index
+    clone_start = time.perf_counter()
     try:
         await datastore.drop_all_non_temp_indexes()  # TODO: rename indexes to old
         await datastore.create_indexes(commons_mapping=field_mapping)
@@ -258,13 +448,72 @@ async def main(commons_config: Commons) -> None:
     except Exception as ex:
         logger.error("Error occurred during cloning.")
         logger.error(ex)
+        report.status = "failed"
+        report.error = f"cloning failed: {ex}"
+        _finish_report(report, report_path)
         raise ex
+    report.clone_seconds = time.perf_counter() - clone_start
+
+    report.status = "ok"
+    run_report = _finish_report(report, report_path)
+    if push_report:
+        await datastore.update_populate_report(run_report)
 
     res = await datastore.get_status()
     print(res)
     await datastore.close()
 
 
+async def _populate_commons(
+    name: str,
+    common,
+    results: dict,
+    summary: AggregateSummary,
+    report: PopulateReport,
+    commons_count: int,
+) -> int:
+    """
+    Writes the metadata received from a commons to the temp indexes, records it
+    in the run report and logs the progress. Returns the number of entries
+    received.
+    """
+    commons_report = report.commons[name]
+    commons_report["documents_received"] = len(results)
+    logger.info(f"Received {len(results)} from {name}")
+    if "error" in commons_report:
+        commons_report["status"] = "failed"
+    elif len(results) == 0:
+        commons_report["status"] = "empty"
+    if len(results) > 0:
+        await populate_metadata(
+            name,
+            common,
+            results,
+            use_temp_index=True,
+            summary=summary,
+            report=commons_report,
+        )
+    logger.info(
+        f"Populated {name} ({len(report.commons)}/{commons_count} commons): "
+        f"{commons_report['documents_indexed']} documents "
+        f"({commons_report['bytes']} bytes) in {report.commons_seconds(name):.2f}s "
+        f"(fetch {commons_report['fetch_seconds']:.2f}s, "
+        f"normalize {commons_report['normalize_seconds']:.2f}s, "
+        f"prepare {commons_report['prepare_seconds']:.2f}s, "
+        f"index {commons_report['index_seconds']:.2f}s)"
+    )
+    return len(results)
+
+
+def _finish_report(report: PopulateReport, path: Optional[str]) -> Dict[str, Any]:
+    """Logs the run report, and writes it to `path` if given."""
+    run_report = report.to_dict()
+    logger.info(f"Populate report: {json.dumps(run_report)}")
+    if path:
+        Path(path).write_text(json.dumps(run_report, indent=2))
+    return run_report
+
+
 async def filter_entries(
     common: MDSInstance, mds_arr: List[Dict[Any, Any]]
 ) -> List[Dict[Any, Any]]:
@@ -330,4 +579,10 @@ if __name__ == "__main__":
     if not is_valid_path(args.config):
         exit()
     commons = parse_config_from_file(Path(args.config))
-    asyncio.run(main(commons_config=commons))
+    asyncio.run(
+        main(
+            commons_config=commons,
+            report_path=args.report,
+            push_report=args.push_report,
+        )
+    )
@@ -1,15 +1,29 @@
 from fastapi import HTTPException, Query, APIRouter, Depends
+from pydantic import BaseModel
 from starlette.requests import Request
-from starlette.status import HTTP_404_NOT_FOUND, HTTP_500_INTERNAL_SERVER_ERROR
+from starlette.status import HTTP_400_BAD_REQUEST, HTTP_404_NOT_FOUND
 from starlette.responses import JSONResponse
 
-from .db import get_data_access_layer, DataAccessLayer
+from .db import get_read_only_data_access_layer, DataAccessLayer
 from . import config
-from mds.authorizations import metadata_queries_access_required
+from mds.authorizations import (
+    metadata_queries_access_required,
+    readable_resource_paths,
+)
 
 mod = APIRouter()
 
 
+class BulkMetadataInput(BaseModel):
+    """
+    Bulk metadata lookup
+
+    guids (list): GUIDs and/or aliases to get the metadata of
+    """
+
+    guids: list[str]
+
+
 @mod.get("/metadata")
 async def search_metadata(
     request: Request,
@@ -22,7 +36,8 @@ async def search_metadata(
         10, description="Maximum number of records returned. (max: 2000)"
     ),
     offset: int = Query(0, description="Return results at this given offset."),
-    data_access_layer: DataAccessLayer = Depends(get_data_access_layer),
+    data_access_layer: DataAccessLayer = Depends(get_read_only_data_access_layer),
+    resource_paths: list[str] | None = Depends(readable_resource_paths),
 ):
     """Search the metadata.
 
@@ -69,6 +84,9 @@ async def search_metadata(
     example: `?a=1.*` will only match the exact string `"1.*"`.
 
     To query rows with a value of `"*"` exactly, escape the asterisk. For example: `?a=\*`.
+
+    When `AUTHZ_FILTER_METADATA_RECORDS` is enabled, only records the caller can
+    read (according to their `authz`) are returned.
     """
     limit = min(limit, config.METADATA_QUERY_RESULTS_LIMIT)
     queries = {}
@@ -81,6 +99,7 @@ async def search_metadata(
         limit=limit,
         offset=offset,
         return_data=data,
+        resource_paths=resource_paths,
     )
 
     return result
@@ -89,7 +108,7 @@ async def search_metadata(
 @mod.get("/metadata/{guid:path}/aliases")
 async def get_metadata_aliases(
     guid: str,
-    data_access_layer: DataAccessLayer = Depends(get_data_access_layer),
+    data_access_layer: DataAccessLayer = Depends(get_read_only_data_access_layer),
 ) -> JSONResponse:
     """
     Get the aliases for the provided GUID
@@ -104,27 +123,51 @@ async def get_metadata_aliases(
 @mod.get("/metadata/{guid:path}")
 async def get_metadata(
     guid,
-    data_access_layer: DataAccessLayer = Depends(get_data_access_layer),
+    data_access_layer: DataAccessLayer = Depends(get_read_only_data_access_layer),
+    resource_paths: list[str] | None = Depends(readable_resource_paths),
 ):
-    """Get the metadata of the GUID."""
-    metadata = await data_access_layer.get_metadata(guid)
-
+    """Get the metadata of the GUID (or of the GUID an alias points to)."""
+    metadata = await data_access_layer.resolve_metadata(guid, resource_paths)
     if not metadata:
-        # check if it's an alias
-        alias = guid
-        metadata_alias = await data_access_layer.get_alias(alias)
+        raise HTTPException(HTTP_404_NOT_FOUND, f"Not found: {guid}")
+
+    return metadata["data"]
 
-        if not metadata_alias:
-            raise HTTPException(HTTP_404_NOT_FOUND, f"Not found: {guid}")
 
-        # get metadata for guid based on alias
-        metadata = await data_access_layer.get_metadata_by_alias(alias)
+@mod.post("/bulk/metadata")
+async def get_metadata_bulk(
+    body: BulkMetadataInput,
+    data_access_layer: DataAccessLayer = Depends(get_read_only_data_access_layer),
+    resource_paths: list[str] | None = Depends(readable_resource_paths),
+):
+    """Get the metadata of many GUIDs and/or aliases at once.
 
-        if not metadata:
-            message = f"Alias record exists but GUID not found: {guid}"
-            raise HTTPException(HTTP_500_INTERNAL_SERVER_ERROR, message)
+    Returns the metadata of every key that was found, mapped from the key as
+    requested, and the list of keys that were not found:
 
-    return metadata["data"]
+        POST /bulk/metadata
+        {"guids": ["guid1", "alias_of_guid2", "guid3"]}
+
+        {
+            "results": {"guid1": {...}, "alias_of_guid2": {...}},
+            "not_found": ["guid3"]
+        }
+
+    At most `METADATA_QUERY_RESULTS_LIMIT` keys can be requested at once.
+    """
+    keys = list(dict.fromkeys(body.guids))
+    if len(keys) > config.METADATA_QUERY_RESULTS_LIMIT:
+        raise HTTPException(
+            HTTP_400_BAD_REQUEST,
+            f"At most {config.METADATA_QUERY_RESULTS_LIMIT} GUIDs can be requested at once",
+        )
+
+    records = await data_access_layer.get_metadata_for_keys(keys, resource_paths)
+
+    return {
+        "results": {key: record["data"] for key, record in records.items()},
+        "not_found": [key for key in keys if key not in records],
+    }
 
 
 def init_app(app):
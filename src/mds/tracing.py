@@ -0,0 +1,138 @@
+"""
+OpenTelemetry tracing, enabled by `ENABLE_OTEL_TRACING`.
+
+Spans are created for the FastAPI routes, the database statements, the requests
+made with `app.async_client` (indexd, fence) and the OpenSearch requests, so
+that the time of a slow request can be broken down by where it was spent.
+
+Spans are exported with OTLP over HTTP (`OTEL_TRACING_EXPORTER=otlp`, configured
+with the standard `OTEL_EXPORTER_OTLP_*` environment variables) or written as
+JSON lines to `OTEL_TRACING_FILE` (`OTEL_TRACING_EXPORTER=file`). Sampling
+follows the standard `OTEL_TRACES_SAMPLER` environment variables.
+
+The OpenTelemetry packages are the optional `tracing` extra of MDS. Install them
+to use tracing:
+
+    poetry install --extras tracing
+
+When tracing is disabled (the default) nothing is imported or instrumented, and
+`start_span` returns a context manager that does nothing.
+"""
+import os
+from contextlib import nullcontext
+
+from . import config, logger
+
+# set by setup_tracing; None while tracing is disabled
+_tracer_provider = None
+_tracer = None
+
+
+def _create_exporter():
+    if config.OTEL_TRACING_EXPORTER == "file":
+        from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+
+        return ConsoleSpanExporter(
+            out=open(config.OTEL_TRACING_FILE, "a"),
+            formatter=lambda span: span.to_json(indent=None) + os.linesep,
+        )
+    if config.OTEL_TRACING_EXPORTER == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import (
+            OTLPSpanExporter,
+        )
+
+        return OTLPSpanExporter()
+    raise ValueError(
+        f"Unknown OTEL_TRACING_EXPORTER '{config.OTEL_TRACING_EXPORTER}', "
+        "expected 'otlp' or 'file'"
+    )
+
+
+def _get_tracer_provider():
+    """
+    The tracer provider is created on first use and shared by every app of the
+    process, since OpenTelemetry only allows setting the global one once.
+    """
+    global _tracer_provider, _tracer
+    if _tracer_provider is None:
+        from opentelemetry import trace
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+
+        provider = TracerProvider(
+            resource=Resource.create({"service.name": config.OTEL_SERVICE_NAME})
+        )
+        provider.add_span_processor(BatchSpanProcessor(_create_exporter()))
+        trace.set_tracer_provider(provider)
+        _tracer_provider = provider
+        _tracer = provider.get_tracer("mds")
+    return _tracer_provider
+
+
+def setup_tracing(app) -> bool:
+    """
+    Trace the routes of `app` and the requests made with `app.async_client`.
+    Returns whether tracing is on: it stays off if it is disabled or if the
+    OpenTelemetry packages are not installed.
+    """
+    if not config.ENABLE_OTEL_TRACING:
+        return False
+    try:
+        from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
+        from opentelemetry.instrumentation.httpx import HTTPXClientInstrumentor
+
+        tracer_provider = _get_tracer_provider()
+    except ImportError as err:
+        logger.warning(
+            f"ENABLE_OTEL_TRACING is enabled but OpenTelemetry is not installed "
+            f"({err}), tracing is disabled"
+        )
+        return False
+
+    FastAPIInstrumentor.instrument_app(app, tracer_provider=tracer_provider)
+    HTTPXClientInstrumentor.instrument_client(
+        app.async_client, tracer_provider=tracer_provider
+    )
+    return True
+
+
+def trace_engine(engine) -> None:
+    """
+    Trace the statements executed by `engine` (an AsyncEngine). The
+    instrumentation is process-wide: undo it with `untrace_engine` before
+    tracing another engine.
+    """
+    from opentelemetry.instrumentation.sqlalchemy import SQLAlchemyInstrumentor
+
+    SQLAlchemyInstrumentor().instrument(
+        engine=engine.sync_engine, tracer_provider=_get_tracer_provider()
+    )
+
+
+def untrace_engine() -> None:
+    from opentelemetry.instrumentation.sqlalchemy import SQLAlchemyInstrumentor
+
+    SQLAlchemyInstrumentor().uninstrument()
+
+
+def flush() -> None:
+    """
+    Export the spans that are still buffered.
+    """
+    if _tracer_provider is not None:
+        _tracer_provider.force_flush()
+
+
+def start_span(name: str, attributes: dict = None):
+    """
+    Context manager running its body in a new client span (e.g. a request to
+    another service), or doing nothing while tracing is disabled.
+    """
+    if _tracer is None:
+        return nullcontext()
+    from opentelemetry.trace import SpanKind
+
+    return _tracer.start_as_current_span(
+        name, kind=SpanKind.CLIENT, attributes=attributes
+    )
@@ -0,0 +1,169 @@
+"""
+Startup warmup, so that the first requests after a deploy don't pay for opening
+database connections, preparing statements and connecting to upstreams.
+
+The warmup runs in the background when a server process starts:
+
+ * it opens `DB_POOL_MIN_SIZE` pool connections at once, and runs the frequent
+   read statements on each of them so that asyncpg prepares and caches them
+   (the statement cache is per connection). The same for the read replica, if
+   one is configured;
+ * it pings OpenSearch (when `USE_AGG_MDS` is enabled) and indexd, which also
+   opens a pooled connection of the HTTP client.
+
+`/_ready` reports ready once it is done and the database warmup succeeded. If
+the database warmup failed, `/_ready` runs it again until it succeeds. The other
+failures are logged and reported but don't fail the warmup: the replica is only
+used once it is reachable and the upstreams are retried on use.
+"""
+import asyncio
+import time
+from contextlib import AsyncExitStack
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import config, db, logger
+from .agg_mds import datastore as aggregate_datastore
+from .db import DataAccessLayer, db_pool_sizes, get_db_engine_and_sessionmaker
+
+# key that is never stored, so the statements are prepared without reading records
+WARMUP_KEY = "_mds_warmup"
+
+# the statements of the metadata, alias and object lookups and of the search
+HOT_STATEMENTS = {
+    "guid_lookup": lambda dal: dal.get_metadata(WARMUP_KEY),
+    "alias_lookup": lambda dal: dal.get_metadata_by_alias(WARMUP_KEY),
+    "resolve": lambda dal: dal.resolve_metadata(WARMUP_KEY),
+    "resolve_readable": lambda dal: dal.resolve_metadata(WARMUP_KEY, []),
+    "bulk_lookup": lambda dal: dal.get_metadata_for_keys([WARMUP_KEY]),
+    "aliases_for_guid": lambda dal: dal.get_aliases_for_guid(WARMUP_KEY),
+    "search": lambda dal: dal.search_metadata({"_guid_type": [WARMUP_KEY]}),
+    "search_data": lambda dal: dal.search_metadata(
+        {"_guid_type": [WARMUP_KEY]}, return_data=True
+    ),
+}
+
+
+class Warmup:
+    """
+    State of the warmup of a server process, reported by `/_ready`.
+    """
+
+    def __init__(self):
+        self.done = asyncio.Event()
+        self.report = {}
+        self._retry_lock = asyncio.Lock()
+
+    @property
+    def ready(self) -> bool:
+        """
+        The warmup is done and the database warmup succeeded (or the warmup was
+        skipped): the process can't serve requests without the database.
+        """
+        if not self.done.is_set():
+            return False
+        if self.report.get("skipped"):
+            return True
+        return self.report.get("database", {}).get("ok", False)
+
+    async def retry_database(self) -> None:
+        """
+        Runs the database warmup again after it failed or timed out, e.g.
+        because the database was not reachable yet. Concurrent calls share one
+        attempt.
+        """
+        async with self._retry_lock:
+            if self.ready:
+                return
+            try:
+                await asyncio.wait_for(
+                    self._step("database", warm_up_db()), config.WARMUP_TIMEOUT
+                )
+            except asyncio.TimeoutError:
+                logger.warning(
+                    f"Database warmup did not finish within {config.WARMUP_TIMEOUT} seconds"
+                )
+
+    def skip(self) -> None:
+        self.report = {"skipped": True}
+        self.done.set()
+
+    async def run(self, app) -> dict:
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._run(app), config.WARMUP_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning(
+                f"Warmup did not finish within {config.WARMUP_TIMEOUT} seconds"
+            )
+            self.report["timed_out"] = True
+        self.report["seconds"] = time.perf_counter() - start
+        logger.info(f"Warmup done: {self.report}")
+        self.done.set()
+        return self.report
+
+    async def _run(self, app) -> None:
+        await asyncio.gather(
+            self._step("database", warm_up_db()),
+            self._step("database_replica", warm_up_replica()),
+            self._step("opensearch", ping_opensearch()),
+            self._step("indexd", ping_indexd(app.async_client)),
+        )
+
+    async def _step(self, name: str, step) -> None:
+        start = time.perf_counter()
+        try:
+            result = await step
+        except Exception as err:
+            logger.warning(f"Warmup of {name} failed: {err!r}")
+            result = {"ok": False, "error": repr(err)}
+        result["seconds"] = time.perf_counter() - start
+        self.report[name] = result
+
+
+async def warm_up_db(engine=None) -> dict:
+    """
+    Checks out the minimum number of pool connections of `engine` (the primary by
+    default) at the same time, so that they are all opened, and runs the hot
+    statements on each.
+    """
+    if engine is None:
+        engine, _ = get_db_engine_and_sessionmaker()
+    connections, _ = db_pool_sizes()
+
+    async def run_statements(connection):
+        async with AsyncSession(bind=connection) as session:
+            dal = DataAccessLayer(session)
+            for statement in HOT_STATEMENTS.values():
+                await statement(dal)
+
+    async with AsyncExitStack() as stack:
+        opened = await asyncio.gather(
+            *(stack.enter_async_context(engine.connect()) for _ in range(connections))
+        )
+        await asyncio.gather(*(run_statements(connection) for connection in opened))
+    return {"ok": True, "connections": connections, "statements": len(HOT_STATEMENTS)}
+
+
+async def warm_up_replica() -> dict:
+    if db.replica_engine is None:
+        return {"ok": True, "skipped": True}
+    # the replica is only used once its lag has been checked
+    await db.replica_monitor.check()
+    result = await warm_up_db(db.replica_engine)
+    result.update(db.replica_monitor.stats())
+    return result
+
+
+async def ping_opensearch() -> dict:
+    if not config.USE_AGG_MDS:
+        return {"ok": True, "skipped": True}
+    await aggregate_datastore.get_status()
+    return {"ok": True}
+
+
+async def ping_indexd(client) -> dict:
+    response = await client.get(
+        config.INDEXING_SERVICE_ENDPOINT.rstrip("/") + "/_status"
+    )
+    return {"ok": response.is_success, "status_code": response.status_code}
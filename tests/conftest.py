@@ -16,6 +16,7 @@ from unittest.mock import MagicMock, patch
 
 environ["TESTING"] = "TRUE"
 environ["USE_AGG_MDS"] = "true"  # enable the Agg MDS endpoints
+environ["WARMUP_ON_STARTUP"] = "false"  # tested in test_warmup.py
 from mds import config
 from mds.objects import FORBIDDEN_IDS
 
@@ -1,5 +1,8 @@
+from unittest.mock import patch
+
 import respx
 from mds.agg_mds.adapters import (
+    Gen3Adapter,
     get_metadata,
     get_json_path_value,
     strip_email,
@@ -105,6 +108,33 @@ def test_missing_adapter():
         assert isinstance(err, ValueError) == True
 
 
+@respx.mock
+def test_get_metadata_report():
+    respx.get(
+        "http://test/ok/mds/metadata?data=True&_guid_type=discovery_metadata&limit=1000&offset=0"
+    ).mock(return_value=httpx.Response(200, json={}))
+    report = {}
+    assert get_metadata("gen3", "http://test/ok/", None, report=report) == {}
+    assert report["fetch_seconds"] > 0
+    assert report["bytes"] == len(b"{}")
+    assert "normalize_seconds" in report
+    assert "error" not in report
+
+    # the fetch time is recorded when the fetch fails too
+    report = {}
+    with patch.object(
+        Gen3Adapter, "getRemoteDataAsJson", side_effect=ValueError("bad response")
+    ):
+        assert get_metadata("gen3", "http://test/ok/", None, report=report) == {}
+    assert report["fetch_seconds"] > 0
+    assert report["error"] == "bad response"
+    assert "normalize_seconds" not in report
+
+    report = {}
+    get_metadata("notAKnownAdapter", "http://test/ok/", None, report=report)
+    assert report["error"] == "unknown adapter notAKnownAdapter"
+
+
 def test_json_path_expression():
     sample1 = {
         "study1": {
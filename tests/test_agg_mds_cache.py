@@ -0,0 +1,156 @@
+import gzip
+
+import pytest
+import nest_asyncio
+from unittest.mock import patch
+from conftest import AsyncMock
+from mds.agg_mds import datastore
+from mds.agg_mds.cache import response_cache
+
+# https://github.com/encode/starlette/issues/440
+nest_asyncio.apply()
+
+
+@pytest.fixture()
+def cache():
+    max_entries = response_cache.max_entries
+    generation_ttl = response_cache.generation_ttl
+    response_cache.clear()
+    yield response_cache
+    response_cache.clear()
+    response_cache.max_entries = max_entries
+    response_cache.generation_ttl = generation_ttl
+
+
+@pytest.mark.asyncio
+async def test_cache_hit_within_generation(client, cache):
+    with patch.object(
+        datastore, "get_generation", AsyncMock(return_value="gen1")
+    ), patch.object(
+        datastore,
+        "get_commons",
+        AsyncMock(return_value={"commons": ["commons1"]}),
+    ) as get_commons:
+        for _ in range(3):
+            resp = client.get("/aggregate/commons")
+            assert resp.status_code == 200
+            assert resp.json() == {"commons": ["commons1"]}
+        assert get_commons.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_cache_invalidated_by_new_generation(client, cache):
+    cache.generation_ttl = 0
+    with patch.object(
+        datastore, "get_generation", AsyncMock(return_value="gen1")
+    ) as get_generation, patch.object(
+        datastore,
+        "get_all_tags",
+        AsyncMock(return_value={"Data Type": {"total": 1, "names": [{"WGS": 1}]}}),
+    ) as get_all_tags:
+        client.get("/aggregate/tags")
+        client.get("/aggregate/tags")
+        assert get_all_tags.call_count == 1
+
+        get_generation.return_value = "gen2"
+        get_all_tags.return_value = {"Data Type": {"total": 2, "names": [{"WGS": 2}]}}
+        resp = client.get("/aggregate/tags")
+        assert resp.json() == {"Data Type": {"total": 2, "names": [{"WGS": 2}]}}
+        assert get_all_tags.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_cache_bypassed_without_generation(client, cache):
+    with patch.object(
+        datastore, "get_generation", AsyncMock(return_value=None)
+    ), patch.object(
+        datastore,
+        "get_commons",
+        AsyncMock(return_value={"commons": ["commons1"]}),
+    ) as get_commons:
+        client.get("/aggregate/commons")
+        client.get("/aggregate/commons")
+        assert get_commons.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_cache_does_not_store_empty_or_not_found(client, cache):
+    with patch.object(
+        datastore, "get_generation", AsyncMock(return_value="gen1")
+    ), patch.object(
+        datastore, "get_commons_attribute", AsyncMock(return_value=None)
+    ) as get_commons_attribute:
+        assert client.get("/aggregate/info/schema").status_code == 404
+        assert client.get("/aggregate/info/schema").status_code == 404
+        assert get_commons_attribute.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_cache_keyed_by_query_params(client, cache):
+    with patch.object(
+        datastore, "get_generation", AsyncMock(return_value="gen1")
+    ), patch.object(
+        datastore,
+        "get_all_metadata",
+        AsyncMock(return_value={"results": {"commons1": [{"study1": {}}]}}),
+    ) as get_all_metadata:
+        client.get("/aggregate/metadata")
+        client.get("/aggregate/metadata?limit=20")
+        client.get("/aggregate/metadata?limit=10")
+        assert get_all_metadata.call_count == 2
+
+        # pages past AGG_MDS_RESPONSE_CACHE_MAX_OFFSET are never cached
+        client.get("/aggregate/metadata?offset=1000")
+        client.get("/aggregate/metadata?offset=1000")
+        assert get_all_metadata.call_count == 4
+
+
+@pytest.mark.asyncio
+async def test_cache_serves_gzip(client, cache):
+    commons = {"commons": [f"commons{i}" for i in range(100)]}
+    with patch.object(
+        datastore, "get_generation", AsyncMock(return_value="gen1")
+    ), patch.object(datastore, "get_commons", AsyncMock(return_value=commons)):
+        resp = client.get("/aggregate/commons", headers={"Accept-Encoding": "gzip"})
+        assert resp.headers["content-encoding"] == "gzip"
+        assert resp.json() == commons
+
+        resp = client.get("/aggregate/commons", headers={"Accept-Encoding": "identity"})
+        assert "content-encoding" not in resp.headers
+        assert resp.json() == commons
+
+    entry = next(iter(cache._entries.values()))
+    assert gzip.decompress(entry.gzip_body) == entry.body
+
+
+@pytest.mark.asyncio
+async def test_cache_disabled(client, cache):
+    with patch("mds.config.AGG_MDS_RESPONSE_CACHE", False), patch.object(
+        datastore, "get_generation", AsyncMock(return_value="gen1")
+    ) as get_generation, patch.object(
+        datastore,
+        "get_commons",
+        AsyncMock(return_value={"commons": ["commons1"]}),
+    ) as get_commons:
+        client.get("/aggregate/commons")
+        client.get("/aggregate/commons")
+        assert get_commons.call_count == 2
+        get_generation.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_cache_max_entries(client, cache):
+    cache.max_entries = 2
+    with patch.object(
+        datastore, "get_generation", AsyncMock(return_value="gen1")
+    ), patch.object(
+        datastore,
+        "get_commons_attribute",
+        AsyncMock(return_value={"commons_url": "commons"}),
+    ):
+        for what in ["a", "b", "c"]:
+            client.get(f"/aggregate/info/{what}")
+    assert [key[0] for key in cache._entries] == [
+        "/aggregate/info/b",
+        "/aggregate/info/c",
+    ]
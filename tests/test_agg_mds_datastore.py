@@ -85,6 +85,34 @@ async def test_update_config_info():
     mock_client.update_config_info.assert_called_with()
 
 
+@pytest.mark.asyncio
+async def test_update_generation():
+    with patch("mds.agg_mds.datastore.client", AsyncMock()) as mock_client:
+        await datastore.update_generation("abc", True)
+    mock_client.update_generation.assert_called_with("abc", True)
+
+
+@pytest.mark.asyncio
+async def test_update_tags_summary():
+    with patch("mds.agg_mds.datastore.client", AsyncMock()) as mock_client:
+        await datastore.update_tags_summary([], True)
+    mock_client.update_tags_summary.assert_called_with([], True)
+
+
+@pytest.mark.asyncio
+async def test_update_commons_summary():
+    with patch("mds.agg_mds.datastore.client", AsyncMock()) as mock_client:
+        await datastore.update_commons_summary([], True)
+    mock_client.update_commons_summary.assert_called_with([], True)
+
+
+@pytest.mark.asyncio
+async def test_get_generation():
+    with patch("mds.agg_mds.datastore.client", AsyncMock()) as mock_client:
+        await datastore.get_generation()
+    mock_client.get_generation.assert_called_with()
+
+
 @pytest.mark.asyncio
 async def test_get_commons_metadata():
     with patch("mds.agg_mds.datastore.client", AsyncMock()) as mock_client:
@@ -113,6 +141,13 @@ async def test_get_by_guid():
     mock_client.get_by_guid.assert_called_with("123")
 
 
+@pytest.mark.asyncio
+async def test_get_by_guids():
+    with patch("mds.agg_mds.datastore.client", AsyncMock()) as mock_client:
+        await datastore.get_by_guids(["123", "456"], None)
+    mock_client.get_by_guids.assert_called_with(["123", "456"], None)
+
+
 @pytest.mark.asyncio
 async def test_get_commons_attribute():
     with patch("mds.agg_mds.datastore.client", AsyncMock()) as mock_client:
@@ -12,6 +12,9 @@ from mds.agg_mds.datastore.elasticsearch_dao import (
     AGG_MDS_INFO_INDEX_TEMP,
     AGG_MDS_CONFIG_INDEX_TEMP,
     AGG_MDS_INFO_TYPE,
+    AGG_MDS_GENERATION_ID,
+    AGG_MDS_TAGS_SUMMARY_ID,
+    AGG_MDS_COMMONS_SUMMARY_ID,
     AGG_MDS_DEFAULT_STUDY_DATA_FIELD,
     count,
     process_record,
@@ -44,6 +47,7 @@ async def test_init():
         await elasticsearch_dao.init("myhost")
     mock_client.assert_called_with(
         hosts=["myhost:9200"],
+        connection_class=elasticsearch_dao.TimedConnection,
         timeout=ES_RETRY_INTERVAL,
         max_retries=ES_RETRY_LIMIT,
         retry_on_timeout=True,
@@ -312,6 +316,58 @@ async def test_update_global_info_to_temp_index():
     )
 
 
+@pytest.mark.asyncio
+async def test_update_generation():
+    with patch(
+        "mds.agg_mds.datastore.elasticsearch_dao.elastic_search_client",
+        MagicMock(),
+    ) as mock_client:
+        await elasticsearch_dao.update_generation("abc")
+
+    mock_client.index.assert_called_with(
+        index=AGG_MDS_INFO_INDEX, id=AGG_MDS_GENERATION_ID, body={"id": "abc"}
+    )
+
+    with patch(
+        "mds.agg_mds.datastore.elasticsearch_dao.elastic_search_client",
+        MagicMock(),
+    ) as mock_client:
+        await elasticsearch_dao.update_generation("abc", use_temp_index=True)
+
+    mock_client.index.assert_called_with(
+        index=AGG_MDS_INFO_INDEX_TEMP, id=AGG_MDS_GENERATION_ID, body={"id": "abc"}
+    )
+
+
+@pytest.mark.asyncio
+async def test_update_tags_summary():
+    tags = [{"category": "Access", "total": 1, "names": [{"name": "open", "count": 1}]}]
+    with patch(
+        "mds.agg_mds.datastore.elasticsearch_dao.elastic_search_client",
+        MagicMock(),
+    ) as mock_client:
+        await elasticsearch_dao.update_tags_summary(tags, use_temp_index=True)
+
+    mock_client.index.assert_called_with(
+        index=AGG_MDS_INFO_INDEX_TEMP, id=AGG_MDS_TAGS_SUMMARY_ID, body={"tags": tags}
+    )
+
+
+@pytest.mark.asyncio
+async def test_update_commons_summary():
+    with patch(
+        "mds.agg_mds.datastore.elasticsearch_dao.elastic_search_client",
+        MagicMock(),
+    ) as mock_client:
+        await elasticsearch_dao.update_commons_summary(["commons1"])
+
+    mock_client.index.assert_called_with(
+        index=AGG_MDS_INFO_INDEX,
+        id=AGG_MDS_COMMONS_SUMMARY_ID,
+        body={"commons": ["commons1"]},
+    )
+
+
 @pytest.mark.asyncio
 async def test_update_config_info():
     with patch(
@@ -357,11 +413,26 @@ async def close():
 @pytest.mark.asyncio
 async def test_get_commons():
     with patch(
-        "mds.agg_mds.datastore.elasticsearch_dao.elastic_search_client.search",
-        MagicMock(),
-    ) as mock_search:
+        "mds.agg_mds.datastore.elasticsearch_dao.elastic_search_client", MagicMock()
+    ) as mock_client:
+        mock_client.get.return_value = {
+            "_source": {"commons": ["commons1", "commons2"]}
+        }
+        assert await elasticsearch_dao.get_commons() == {
+            "commons": ["commons1", "commons2"]
+        }
+        mock_client.get.assert_called_with(
+            index=AGG_MDS_INFO_INDEX, id=AGG_MDS_COMMONS_SUMMARY_ID
+        )
+        mock_client.search.assert_not_called()
+
+    # falls back to aggregating when populate has not written a summary
+    with patch(
+        "mds.agg_mds.datastore.elasticsearch_dao.elastic_search_client", MagicMock()
+    ) as mock_client:
+        mock_client.get.side_effect = os_exceptions.NotFoundError(404, "not found")
         await elasticsearch_dao.get_commons()
-        mock_search.assert_called_with(
+        mock_client.search.assert_called_with(
             index=AGG_MDS_INDEX,
             body={
                 "size": 0,
@@ -381,9 +452,9 @@ async def test_get_commons():
         )
 
     with patch(
-        "mds.agg_mds.datastore.elasticsearch_dao.elastic_search_client.search",
-        MagicMock(side_effect=Exception("some error")),
-    ):
+        "mds.agg_mds.datastore.elasticsearch_dao.elastic_search_client", MagicMock()
+    ) as mock_client:
+        mock_client.get.side_effect = Exception("some error")
         assert await elasticsearch_dao.get_commons() == []
 
 
@@ -484,6 +555,35 @@ async def test_metadata_tags():
     with patch(
         "mds.agg_mds.datastore.elasticsearch_dao.elastic_search_client", MagicMock()
     ) as mock_client:
+        mock_client.get.return_value = {
+            "_source": {
+                "tags": [
+                    {
+                        "category": "Data Type",
+                        "total": 3,
+                        "names": [
+                            {"name": "Genotype", "count": 2},
+                            {"name": "WGS", "count": 1},
+                        ],
+                    },
+                    {"category": "Access", "total": 1, "names": []},
+                ]
+            }
+        }
+        assert await elasticsearch_dao.metadata_tags() == {
+            "Data Type": {"total": 3, "names": [{"Genotype": 2, "WGS": 1}]},
+            "Access": {"total": 1, "names": [{}]},
+        }
+        mock_client.get.assert_called_with(
+            index=AGG_MDS_INFO_INDEX, id=AGG_MDS_TAGS_SUMMARY_ID
+        )
+        mock_client.search.assert_not_called()
+
+    # falls back to aggregating when populate has not written a summary
+    with patch(
+        "mds.agg_mds.datastore.elasticsearch_dao.elastic_search_client", MagicMock()
+    ) as mock_client:
+        mock_client.get.side_effect = os_exceptions.NotFoundError(404, "not found")
         await elasticsearch_dao.metadata_tags()
         mock_client.search.assert_called_with(
             index=AGG_MDS_INDEX,
@@ -512,9 +612,9 @@ async def test_metadata_tags():
         )
 
     with patch(
-        "mds.agg_mds.datastore.elasticsearch_dao.elastic_search_client.search",
-        MagicMock(side_effect=Exception("some error")),
-    ):
+        "mds.agg_mds.datastore.elasticsearch_dao.elastic_search_client", MagicMock()
+    ) as mock_client:
+        mock_client.get.side_effect = Exception("some error")
         assert await elasticsearch_dao.metadata_tags() == []
 
 
@@ -535,6 +635,19 @@ async def test_get_commons_attribute():
     ):
         assert await elasticsearch_dao.get_commons_attribute("my-commons") is None
 
+    # the internal documents of the info index are not served
+    with patch(
+        "mds.agg_mds.datastore.elasticsearch_dao.elastic_search_client", MagicMock()
+    ) as mock_client:
+        for name in (
+            "generation",
+            "tags_summary",
+            "commons_summary",
+            "populate_report",
+        ):
+            assert await elasticsearch_dao.get_commons_attribute(name) is None
+        mock_client.search.assert_not_called()
+
 
 @pytest.mark.asyncio
 async def test_get_aggregations():
@@ -582,3 +695,54 @@ async def test_get_by_guid():
         MagicMock(side_effect=Exception("some error")),
     ):
         assert await elasticsearch_dao.get_by_guid("my-commons") is None
+
+
+@pytest.mark.asyncio
+async def test_get_by_guids():
+    with patch(
+        "mds.agg_mds.datastore.elasticsearch_dao.elastic_search_client", MagicMock()
+    ) as mock_client:
+        mock_client.mget.return_value = {
+            "docs": [
+                {"_id": "123", "found": True, "_source": {"gen3_discovery": {}}},
+                {"_id": "456", "found": False},
+            ]
+        }
+        assert await elasticsearch_dao.get_by_guids(["123", "456"]) == {
+            "123": {"gen3_discovery": {}}
+        }
+        mock_client.mget.assert_called_with(
+            index=AGG_MDS_INDEX, body={"ids": ["123", "456"]}
+        )
+
+        await elasticsearch_dao.get_by_guids(["123"], ["gen3_discovery.name"])
+        mock_client.mget.assert_called_with(
+            index=AGG_MDS_INDEX,
+            body={"ids": ["123"]},
+            _source_includes=["gen3_discovery.name"],
+        )
+
+    with patch(
+        "mds.agg_mds.datastore.elasticsearch_dao.elastic_search_client", MagicMock()
+    ) as mock_client:
+        mock_client.mget.side_effect = Exception("some error")
+        assert await elasticsearch_dao.get_by_guids(["123"]) is None
+
+
+@pytest.mark.asyncio
+async def test_get_generation():
+    with patch(
+        "mds.agg_mds.datastore.elasticsearch_dao.elastic_search_client", MagicMock()
+    ) as mock_client:
+        mock_client.get.return_value = {"_source": {"id": "abc"}}
+        assert await elasticsearch_dao.get_generation() == "abc"
+        mock_client.get.assert_called_with(
+            index=AGG_MDS_INFO_INDEX,
+            id=AGG_MDS_GENERATION_ID,
+        )
+
+    with patch(
+        "mds.agg_mds.datastore.elasticsearch_dao.elastic_search_client.get",
+        MagicMock(side_effect=Exception("some error")),
+    ):
+        assert await elasticsearch_dao.get_generation() is None
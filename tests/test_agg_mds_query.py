@@ -510,3 +510,41 @@ async def test_aggregate_metadata_get_schema(client):
                 "message": "information for nothing not found",
             }
         }
+
+
+@pytest.mark.asyncio
+async def test_aggregate_metadata_guids(client):
+    with patch.object(
+        datastore,
+        "get_by_guids",
+        AsyncMock(return_value={"123": {"gen3_discovery": {"name": "cat"}}}),
+    ):
+        resp = client.post(
+            "/aggregate/metadata/guids",
+            json={"guids": ["123", "456", "123"], "fields": ["gen3_discovery.name"]},
+        )
+        assert resp.status_code == 200
+        assert resp.json() == {
+            "results": {"123": {"gen3_discovery": {"name": "cat"}}},
+            "not_found": ["456"],
+        }
+        datastore.get_by_guids.assert_called_with(
+            ["123", "456"], ["gen3_discovery.name"]
+        )
+
+    with patch.object(datastore, "get_by_guids", AsyncMock()):
+        resp = client.post("/aggregate/metadata/guids", json={"guids": []})
+        assert resp.status_code == 200
+        assert resp.json() == {"results": {}, "not_found": []}
+        datastore.get_by_guids.assert_not_called()
+
+    with patch.object(datastore, "get_by_guids", AsyncMock(return_value=None)):
+        resp = client.post("/aggregate/metadata/guids", json={"guids": ["123"]})
+        assert resp.status_code == 500
+
+    with patch("mds.config.METADATA_QUERY_RESULTS_LIMIT", 2):
+        resp = client.post("/aggregate/metadata/guids", json={"guids": ["1", "2", "3"]})
+        assert resp.status_code == 400
+
+    resp = client.post("/aggregate/metadata/guids", json={})
+    assert resp.status_code == 422
@@ -0,0 +1,307 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import httpx
+import jwt
+import pytest
+import pytest_asyncio
+import respx
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+from unittest.mock import patch
+
+from conftest import AsyncMock
+from mds import authorizations, config
+from mds.authorizations import AuthzDecisionCache, validate_token
+from mds.http_client import create_async_client
+
+ISSUER = "https://example.com/user"
+KEYS_URL = ISSUER + "/jwt/keys"
+
+private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+public_key_pem = (
+    private_key.public_key()
+    .public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    .decode()
+)
+
+
+def make_token(exp):
+    return jwt.encode({"sub": "1", "exp": exp}, "secret", algorithm="HS256")
+
+
+@pytest.fixture()
+def auth_request():
+    with patch.object(
+        authorizations.arborist, "auth_request", AsyncMock(return_value=True)
+    ) as mock:
+        yield mock
+
+
+@pytest.mark.asyncio
+async def test_authz_cache_hit(auth_request):
+    cache = AuthzDecisionCache(ttl=60, negative_ttl=5, max_entries=10)
+    token = make_token(time.time() + 3600)
+
+    for _ in range(3):
+        assert await cache.auth_request(token, "mds_gateway", "access", "/a")
+    assert auth_request.call_count == 1
+
+    # a different resource or token is a different decision
+    assert await cache.auth_request(token, "mds_gateway", "access", "/b")
+    assert await cache.auth_request(
+        make_token(time.time() + 1800), "mds_gateway", "access", "/a"
+    )
+    assert auth_request.call_count == 3
+
+    assert cache.stats() == {
+        "entries": 3,
+        "hits": 2,
+        "misses": 3,
+        "hit_rate": 0.4,
+    }
+
+
+@pytest.mark.asyncio
+async def test_authz_cache_negative_ttl(auth_request):
+    auth_request.return_value = False
+    cache = AuthzDecisionCache(ttl=60, negative_ttl=5, max_entries=10)
+    token = make_token(time.time() + 3600)
+
+    with patch("mds.authorizations.time.time", return_value=1000.0):
+        assert not await cache.auth_request(token, "mds_gateway", "access", "/a")
+        assert not await cache.auth_request(token, "mds_gateway", "access", "/a")
+    assert auth_request.call_count == 1
+
+    auth_request.return_value = True
+    with patch("mds.authorizations.time.time", return_value=1006.0):
+        assert await cache.auth_request(token, "mds_gateway", "access", "/a")
+    assert auth_request.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_authz_cache_respects_token_exp(auth_request):
+    cache = AuthzDecisionCache(ttl=60, negative_ttl=5, max_entries=10)
+    token = make_token(1010)
+
+    with patch("mds.authorizations.time.time", return_value=1000.0):
+        await cache.auth_request(token, "mds_gateway", "access", "/a")
+    with patch("mds.authorizations.time.time", return_value=1005.0):
+        await cache.auth_request(token, "mds_gateway", "access", "/a")
+    assert auth_request.call_count == 1
+
+    # past the token's exp, even though the ttl has not elapsed
+    with patch("mds.authorizations.time.time", return_value=1011.0):
+        await cache.auth_request(token, "mds_gateway", "access", "/a")
+    assert auth_request.call_count == 2
+
+    # allowed decisions for tokens without a readable exp are not cached
+    await cache.auth_request("not-a-jwt", "mds_gateway", "access", "/a")
+    await cache.auth_request("not-a-jwt", "mds_gateway", "access", "/a")
+    assert auth_request.call_count == 4
+
+
+@pytest.mark.asyncio
+async def test_authz_cache_disabled_and_max_entries(auth_request):
+    token = make_token(time.time() + 3600)
+
+    cache = AuthzDecisionCache(ttl=0, negative_ttl=5, max_entries=10)
+    await cache.auth_request(token, "mds_gateway", "access", "/a")
+    await cache.auth_request(token, "mds_gateway", "access", "/a")
+    assert auth_request.call_count == 2
+
+    cache = AuthzDecisionCache(ttl=60, negative_ttl=5, max_entries=2)
+    for resource in ["/a", "/b", "/c"]:
+        await cache.auth_request(token, "mds_gateway", "access", resource)
+    assert [key[3] for key in cache._entries] == ["/b", "/c"]
+
+
+def make_signed_token(
+    kid="key-01", iss=ISSUER, exp=None, key=private_key, algorithm="RS256"
+):
+    claims = {"sub": "1", "iss": iss, "exp": exp or time.time() + 3600}
+    return jwt.encode(claims, key, algorithm=algorithm, headers={"kid": kid})
+
+
+@pytest_asyncio.fixture()
+async def client():
+    client = create_async_client()
+    yield client
+    await client.aclose()
+
+
+def make_request(client):
+    return SimpleNamespace(app=SimpleNamespace(async_client=client))
+
+
+@pytest.fixture()
+def force_issuer(monkeypatch):
+    monkeypatch.setattr(config, "AUTHZ_VALIDATE_TOKENS_LOCALLY", True)
+    # as set in Gen3 deployments: a flag, not an issuer
+    monkeypatch.setattr(config, "FORCE_ISSUER", "True")
+    monkeypatch.setattr(config, "ALLOWED_ISSUERS", {ISSUER})
+    authorizations._jwks_cache.clear()
+    with respx.mock:
+        keys_mock = respx.get(KEYS_URL).mock(
+            return_value=httpx.Response(
+                200, json={"keys": [["key-01", public_key_pem]]}
+            )
+        )
+        yield keys_mock
+    authorizations._jwks_cache.clear()
+
+
+@pytest.mark.asyncio
+async def test_validate_token(force_issuer, client):
+    await validate_token(make_signed_token(), client)
+    await validate_token(make_signed_token(), client)
+    # public keys are cached, and read from <issuer>/jwt/keys
+    assert force_issuer.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_validate_token_fetches_keys_once(force_issuer, client):
+    """Concurrent validations with a cold cache share one fetch of the keys"""
+    await asyncio.gather(
+        *(validate_token(make_signed_token(), client) for _ in range(5))
+    )
+    assert force_issuer.call_count == 1
+    assert not authorizations._jwks_pending
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "token,status_code",
+    [
+        ("not-a-jwt", 401),
+        (make_signed_token(exp=time.time() - 60), 401),
+        (make_signed_token(key="secret", algorithm="HS256"), 401),
+        (
+            make_signed_token(
+                key=rsa.generate_private_key(public_exponent=65537, key_size=2048)
+            ),
+            401,
+        ),
+        (make_signed_token(kid="unknown"), 401),
+        (make_signed_token(iss="https://other.example.com/user"), 403),
+    ],
+)
+async def test_validate_token_rejected(force_issuer, client, token, status_code):
+    with pytest.raises(HTTPException) as err:
+        await validate_token(token, client)
+    assert err.value.status_code == status_code
+
+
+@pytest.mark.asyncio
+async def test_validate_token_unavailable_keys(force_issuer, client):
+    """If the issuer's keys can't be fetched, Arborist gets to decide"""
+    force_issuer.mock(return_value=httpx.Response(500))
+    await validate_token(make_signed_token(), client)
+
+    with pytest.raises(HTTPException) as err:
+        await validate_token(make_signed_token(exp=time.time() - 60), client)
+    assert err.value.status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_validate_token_without_trusted_issuers(monkeypatch, client):
+    monkeypatch.setattr(config, "AUTHZ_VALIDATE_TOKENS_LOCALLY", True)
+    monkeypatch.setattr(config, "FORCE_ISSUER", "True")
+    monkeypatch.setattr(config, "ALLOWED_ISSUERS", set())
+    # the signature is not checked, but the token must be a valid and unexpired JWT
+    await validate_token(make_signed_token(kid="unknown"), client)
+    with pytest.raises(HTTPException) as err:
+        await validate_token(make_signed_token(exp=time.time() - 60), client)
+    assert err.value.status_code == 401
+
+    monkeypatch.setattr(config, "AUTHZ_VALIDATE_TOKENS_LOCALLY", False)
+    await validate_token("not-a-jwt", client)
+
+
+@pytest.mark.asyncio
+async def test_admin_required_rejects_bad_token_locally(
+    monkeypatch, force_issuer, auth_request, client
+):
+    request = make_request(client)
+    monkeypatch.setattr(config, "TESTING_WITH_DISABLED_AUTHZ", False)
+    authorizations.authz_cache.clear()
+    credentials = HTTPAuthorizationCredentials(
+        scheme="bearer", credentials=make_signed_token(exp=time.time() - 60)
+    )
+    with pytest.raises(HTTPException) as err:
+        await authorizations.admin_required(request, None, credentials)
+    assert err.value.status_code == 401
+    auth_request.assert_not_called()
+
+    credentials.credentials = make_signed_token()
+    await authorizations.admin_required(request, None, credentials)
+    await authorizations.metadata_queries_access_required(request, credentials)
+    assert auth_request.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_readable_resources():
+    cache = AuthzDecisionCache(ttl=60, negative_ttl=5, max_entries=10)
+    token = make_token(time.time() + 3600)
+    mapping = {
+        "/open": [{"service": "*", "method": "read"}],
+        "/programs/DEV": [{"service": "*", "method": "*"}],
+        "/programs/QA": [{"service": "fence", "method": "create"}],
+        "/programs/PROD": [{"service": "mds_gateway", "method": "read"}],
+        # `read` in another service doesn't allow reading metadata
+        "/programs/TEST": [{"service": "peregrine", "method": "read"}],
+    }
+    with patch.object(
+        authorizations.arborist, "auth_mapping", AsyncMock(return_value=mapping)
+    ) as auth_mapping:
+        assert await cache.readable_resources(token) == [
+            "/open",
+            "/programs/DEV",
+            "/programs/PROD",
+        ]
+        assert await cache.readable_resources(token) == [
+            "/open",
+            "/programs/DEV",
+            "/programs/PROD",
+        ]
+        assert await cache.readable_resources(None) == [
+            "/open",
+            "/programs/DEV",
+            "/programs/PROD",
+        ]
+        assert auth_mapping.call_count == 2
+        auth_mapping.assert_called_with(jwt="")
+
+
+@pytest.mark.asyncio
+async def test_readable_resource_paths(monkeypatch, client):
+    request = make_request(client)
+    monkeypatch.setattr(config, "TESTING_WITH_DISABLED_AUTHZ", False)
+    monkeypatch.setattr(config, "AUTHZ_VALIDATE_TOKENS_LOCALLY", False)
+    authorizations.authz_cache.clear()
+    credentials = HTTPAuthorizationCredentials(scheme="bearer", credentials="token")
+    with patch.object(
+        authorizations.arborist,
+        "auth_mapping",
+        AsyncMock(return_value={"/open": [{"service": "*", "method": "read"}]}),
+    ) as auth_mapping:
+        monkeypatch.setattr(config, "AUTHZ_FILTER_METADATA_RECORDS", False)
+        assert (
+            await authorizations.readable_resource_paths(request, credentials) is None
+        )
+
+        monkeypatch.setattr(config, "AUTHZ_FILTER_METADATA_RECORDS", True)
+        assert await authorizations.readable_resource_paths(request, credentials) == [
+            "/open"
+        ]
+        auth_mapping.assert_called_with(jwt="token")
+
+        auth_mapping.side_effect = Exception("arborist is down")
+        with pytest.raises(HTTPException) as err:
+            await authorizations.readable_resource_paths(request, None)
+        assert err.value.status_code == 500
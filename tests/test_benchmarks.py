@@ -0,0 +1,172 @@
+import json
+from pathlib import Path
+
+import httpx
+import pytest
+import respx
+
+from benchmarks import compare, metadata_api, populate
+from benchmarks.results import summarize
+from mds.agg_mds.adapters import adapters, gather_metadata
+from mds.populate import parse_config_from_file, populate_metadata
+
+BENCHMARKS = Path(__file__).parent.parent / "benchmarks"
+
+
+def test_summarize():
+    summary = summarize([0.3, 0.1, 0.2, 0.4], items=10)
+    assert summary["runs"] == 4
+    assert summary["min"] == 0.1
+    assert summary["median"] == pytest.approx(0.25)
+    assert summary["max"] == 0.4
+    assert summary["items_per_second"] == pytest.approx(40)
+
+
+@pytest.mark.asyncio
+async def test_metadata_api_benchmark(tmp_path):
+    output = tmp_path / "results.json"
+    args = metadata_api.parse_args(
+        ["--records", "40", "--batch-size", "10", "--repeat", "2"]
+        + ["--output", str(output)]
+    )
+    await metadata_api.main(args)
+
+    report = json.loads(output.read_text())
+    assert report["benchmark"] == "metadata_api"
+    assert report["parameters"]["records"] == 40
+    assert report["results"]["batch_create_metadata"]["runs"] == 4
+    assert report["results"]["get_metadata_by_alias"]["runs"] == 2
+    assert "search_metadata[one_value, data=False, indexed]" in report["results"]
+    assert "update_aliases[merge=True]" in report["results"]
+
+    # the benchmark records and indexes are removed
+    benchmark = metadata_api.MetadataBenchmark(40, 10, 1, 0)
+    assert await benchmark.in_transaction(lambda dal: dal.list_metadata_indexes()) == []
+    assert (
+        await benchmark.in_transaction(
+            lambda dal: dal.get_metadata(metadata_api.guid(0))
+        )
+        is None
+    )
+
+
+def test_compare(tmp_path, capsys):
+    def write(name, median):
+        path = tmp_path / name
+        path.write_text(
+            json.dumps(
+                {
+                    "parameters": {"records": 10},
+                    "results": {
+                        "fast": {"median": 1.0},
+                        "slow": {"median": median},
+                    },
+                }
+            )
+        )
+        return str(path)
+
+    before = write("before.json", 1.0)
+    assert compare.main([before, write("same.json", 1.1)]) == 0
+    assert compare.main([before, write("slower.json", 1.5)]) == 1
+    assert "slow" in capsys.readouterr().out
+
+
+def test_populate_benchmark(tmp_path):
+    study = {
+        "_guid_type": "discovery_metadata",
+        "gen3_discovery": {
+            "study_id": "phs000001",
+            "tags": [{"name": "Array", "category": "Data Type"}],
+            "subjects_count": 48,
+        },
+    }
+    config_path = tmp_path / "config.json"
+    config_path.write_text(
+        json.dumps(
+            {
+                "configuration": {"schema": {"_subjects_count": {"type": "integer"}}},
+                "gen3_commons": {
+                    "mds": {"mds_url": "http://mds/", "commons_url": "mds.org"}
+                },
+                "adapter_commons": {
+                    "adapter": {
+                        "mds_url": "http://adapter/",
+                        "commons_url": "adapter.org",
+                        "adapter": "gen3",
+                        "field_mappings": {"_subjects_count": "path:subjects_count"},
+                    }
+                },
+            }
+        )
+    )
+    fixtures = tmp_path / "fixtures"
+
+    with respx.mock:
+        for host, count in (("mds", 2), ("adapter", 3)):
+            respx.get(url__startswith=f"http://{host}/").mock(
+                return_value=httpx.Response(
+                    200, json={f"{host}_{i}": study for i in range(count)}
+                )
+            )
+        populate.main(
+            ["record", "--config", str(config_path), "--fixtures", str(fixtures)]
+        )
+    assert sorted(path.name for path in fixtures.iterdir()) == [
+        "adapter.json",
+        "mds.json",
+    ]
+
+    # replayed without the mocked commons
+    output = tmp_path / "populate.json"
+    populate.main(
+        ["run", "--config", str(config_path), "--fixtures", str(fixtures)]
+        + ["--repeat", "2", "--output", str(output)]
+        + ["--profile", str(tmp_path / "populate.prof")]
+    )
+    report = json.loads(output.read_text())
+    assert report["unmatched_requests"] == 0
+    assert report["commons"]["mds"]["documents"] == 2
+    assert report["commons"]["adapter"]["documents"] == 3
+    assert report["peak_rss_bytes"] > 0
+    results = report["results"]
+    assert results["fetch[mds]"]["runs"] == 2
+    assert "normalize[adapter]" in results
+    assert results["index[adapter]"]["items"] == 3
+    assert results["total"]["items"] == 5
+    assert "finalize[_finalize]" in results
+    assert (tmp_path / "populate.prof").exists()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "name, documents", [("gen3", 3), ("pdc", 3), ("harvard_dataverse", 1)]
+)
+async def test_populate_benchmark_fixtures(name, documents):
+    """
+    The fixtures committed in benchmarks/fixtures replay through the adapters and
+    populate into the in-memory datastore.
+    """
+    commons_config = parse_config_from_file(BENCHMARKS / "populate_config.json")
+    common = commons_config.adapter_commons[name]
+    replayer = populate.Replayer.from_fixtures(BENCHMARKS / "fixtures")
+    memory = populate.InMemoryDatastore()
+
+    with replayer.replaying(), memory.installed():
+        results = gather_metadata(
+            adapters[common.adapter](),
+            mds_url=common.mds_url,
+            config=common.config,
+            filters=common.filters,
+            mappings=common.field_mappings,
+            perItemValues=common.per_item_values,
+            keepOriginalFields=common.keep_original_fields,
+            globalFieldFilters=common.global_field_filters,
+            schema=commons_config.configuration.schema,
+        )
+        await populate_metadata(name, common, results, use_temp_index=True)
+
+    assert replayer.unmatched == []
+    assert len(results) == documents
+    assert sorted(memory.indexes["metadata"]) == sorted(results)
+    assert name in memory.indexes["info"]
@@ -1,10 +1,17 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
 import pytest
 import pytest_asyncio
 from datetime import datetime
 
 from sqlalchemy.exc import IntegrityError, OperationalError, ProgrammingError
 
+from mds import config, db
 from mds.db import (
+    db_pool_sizes,
+    get_read_only_data_access_layer,
     initiate_db,
     get_db_engine_and_sessionmaker,
     DataAccessLayer,
@@ -273,6 +280,87 @@ class TestMetadataCRUD:
         result = await data_access_layer.get_metadata_by_alias("nonexistent-alias")
         assert result is None
 
+    @pytest.mark.asyncio
+    async def test_resolve_metadata(self, data_access_layer):
+        """Resolve a key as either a GUID or an alias."""
+        await create_sample_data(data_access_layer)
+        by_guid = await data_access_layer.resolve_metadata("sample_guid1")
+        by_alias = await data_access_layer.resolve_metadata("sample_alias1a")
+        assert by_guid == by_alias
+        assert by_guid == {
+            "guid": "sample_guid1",
+            "data": {"key1": "value1", "nested": {"a": "b"}},
+            "authz": {"authz": "public"},
+        }
+        assert await data_access_layer.resolve_metadata("nonexistent") is None
+
+    @pytest.mark.asyncio
+    async def test_resolve_metadata_guid_takes_precedence(self, data_access_layer):
+        """Prefer the GUID match when an alias has the same value as a GUID."""
+        await create_sample_data(data_access_layer)
+        await data_access_layer.create_aliases("sample_guid2", ["sample_guid3"])
+        result = await data_access_layer.resolve_metadata("sample_guid3")
+        assert result["guid"] == "sample_guid3"
+
+    @pytest.mark.asyncio
+    async def test_get_metadata_for_keys(self, data_access_layer):
+        """Resolve a mix of GUIDs and aliases, omitting unknown keys."""
+        await create_sample_data(data_access_layer)
+        result = await data_access_layer.get_metadata_for_keys(
+            ["sample_alias2", "sample_guid1", "nonexistent", "sample_alias1a"]
+        )
+        assert list(result) == ["sample_alias2", "sample_guid1", "sample_alias1a"]
+        assert result["sample_alias2"]["guid"] == "sample_guid2"
+        assert result["sample_guid1"]["data"] == {
+            "key1": "value1",
+            "nested": {"a": "b"},
+        }
+        assert result["sample_alias1a"]["guid"] == "sample_guid1"
+
+    @pytest.mark.asyncio
+    async def test_get_metadata_for_keys_empty(self, data_access_layer):
+        """Return an empty dict when no keys or no matches."""
+        assert await data_access_layer.get_metadata_for_keys([]) == {}
+        assert await data_access_layer.get_metadata_for_keys(["nonexistent"]) == {}
+
+    @pytest.mark.asyncio
+    async def test_reads_filtered_by_resource_paths(self, data_access_layer):
+        """Only return records readable through the given resource paths."""
+        await data_access_layer.create_metadata(
+            "authz-open", {"x": 1}, {"version": 0, "_resource_paths": ["/open"]}
+        )
+        await data_access_layer.create_metadata(
+            "authz-dev",
+            {"x": 1},
+            {"version": 0, "resource_paths": ["/programs/DEV", "/programs/QA"]},
+        )
+        await data_access_layer.create_metadata("authz-none", {"x": 1}, {})
+        await data_access_layer.create_aliases("authz-dev", ["authz-dev-alias"])
+
+        result = await data_access_layer.search_metadata(
+            filters={"x": ["1"]}, resource_paths=["/open", "/programs/QA"]
+        )
+        assert result == ["authz-dev", "authz-open"]
+        result = await data_access_layer.search_metadata(
+            filters={"x": ["1"]}, resource_paths=[]
+        )
+        assert result == []
+
+        assert await data_access_layer.resolve_metadata(
+            "authz-dev-alias", resource_paths=["/programs/DEV"]
+        )
+        assert not await data_access_layer.resolve_metadata(
+            "authz-dev-alias", resource_paths=["/open"]
+        )
+        assert not await data_access_layer.resolve_metadata(
+            "authz-none", resource_paths=["/open"]
+        )
+
+        result = await data_access_layer.get_metadata_for_keys(
+            ["authz-open", "authz-dev-alias", "authz-none"], resource_paths=["/open"]
+        )
+        assert list(result) == ["authz-open"]
+
     @pytest.mark.asyncio
     async def test_delete_metadata_cascades_aliases(self, data_access_layer):
         """
@@ -712,6 +800,31 @@ class TestBatchOperations:
         existing2 = await data_access_layer.get_metadata("existing-2")
         assert existing2["data"] == {"old": "data2"}
 
+    @pytest.mark.asyncio
+    async def test_lock_and_batch_delete_metadata(self, data_access_layer):
+        """
+        Test that rows are locked and deleted by GUID, along with their aliases.
+        """
+        await create_sample_data(data_access_layer)
+
+        assert (await data_access_layer.lock_metadata("sample_guid1"))["data"] == {
+            "key1": "value1",
+            "nested": {"a": "b"},
+        }
+        assert await data_access_layer.lock_metadata("missing") is None
+        assert await data_access_layer.lock_metadata_for_keys(
+            ["sample_guid2", "missing", "sample_guid1"]
+        ) == ["sample_guid1", "sample_guid2"]
+
+        deleted = await data_access_layer.batch_delete_metadata(
+            ["sample_guid1", "sample_guid2", "missing"]
+        )
+        assert sorted(deleted) == ["sample_guid1", "sample_guid2"]
+        assert await data_access_layer.get_metadata("sample_guid1") is None
+        assert await data_access_layer.get_alias("sample_alias1") is None
+        assert await data_access_layer.get_metadata("sample_guid3") is not None
+        assert await data_access_layer.batch_delete_metadata([]) == []
+
 
 # =============================================================================
 # Index Operations Tests
@@ -814,3 +927,128 @@ class TestIndexOperations:
 
         await data_access_layer.drop_metadata_index(path1)
         await data_access_layer.drop_metadata_index(path2)
+
+
+class TestPoolSizes:
+    """Tests for the per-process connection pool sizes."""
+
+    def test_pool_sizes_no_total(self, monkeypatch):
+        monkeypatch.setattr(config, "DB_POOL_MIN_SIZE", 5)
+        monkeypatch.setattr(config, "DB_POOL_MAX_SIZE", 15)
+        monkeypatch.setattr(config, "DB_POOL_TOTAL_MAX_SIZE", 0)
+        monkeypatch.setattr(config, "WEB_CONCURRENCY", 8)
+        assert db_pool_sizes() == (5, 15)
+
+    @pytest.mark.parametrize("workers", [1, 4, 16, 64])
+    def test_pool_sizes_default_total(self, monkeypatch, workers):
+        # the default total keeps one worker per CPU within the default
+        # max_connections of PostgreSQL
+        monkeypatch.setattr(config, "WEB_CONCURRENCY", workers)
+        pool_min, pool_max = db_pool_sizes()
+        assert pool_min <= pool_max
+        assert workers * pool_max <= max(config.DB_POOL_TOTAL_MAX_SIZE, workers)
+        assert config.DB_POOL_TOTAL_MAX_SIZE < 100
+
+    @pytest.mark.parametrize(
+        "workers, total, sizes",
+        [(4, 100, (5, 15)), (4, 40, (5, 10)), (8, 24, (3, 3)), (64, 10, (1, 1))],
+    )
+    def test_pool_sizes_split_total(self, monkeypatch, workers, total, sizes):
+        monkeypatch.setattr(config, "DB_POOL_MIN_SIZE", 5)
+        monkeypatch.setattr(config, "DB_POOL_MAX_SIZE", 15)
+        monkeypatch.setattr(config, "DB_POOL_TOTAL_MAX_SIZE", total)
+        monkeypatch.setattr(config, "WEB_CONCURRENCY", workers)
+        assert db_pool_sizes() == sizes
+
+    def test_initiate_db_pool_sizes(self, monkeypatch):
+        monkeypatch.setattr(config, "DB_POOL_TOTAL_MAX_SIZE", 12)
+        monkeypatch.setattr(config, "WEB_CONCURRENCY", 4)
+        initiate_db()
+        engine, _ = get_db_engine_and_sessionmaker()
+        pool = engine.sync_engine.pool
+        assert pool.size() == 3
+        assert pool._max_overflow == 0
+
+
+class TestReadReplica:
+    """Tests for routing the read-only sessions to the read replica."""
+
+    @pytest.fixture
+    def replica(self, monkeypatch):
+        # the test database acts as its own replica
+        monkeypatch.setattr(config, "DB_REPLICA_DSN", config.DB_DSN)
+        monkeypatch.setattr(config, "DB_REPLICA_MAX_LAG", 10.0)
+        monkeypatch.setattr(config, "DB_REPLICA_LAG_CHECK_INTERVAL", 60.0)
+        initiate_db()
+        yield
+        monkeypatch.undo()
+        initiate_db()
+
+    async def read_only_engine(self):
+        async for dal in get_read_only_data_access_layer():
+            return dal.db_session.bind
+
+    @pytest.mark.asyncio
+    async def test_no_replica(self):
+        initiate_db()
+        assert db.replica_monitor is None
+        assert await self.read_only_engine() is db.engine
+
+    @pytest.mark.asyncio
+    async def test_reads_from_replica(self, replica):
+        assert db.replica_engine is not db.engine
+        assert await self.read_only_engine() is db.replica_engine
+        assert db.replica_monitor.stats() == {"usable": True, "lag_seconds": 0.0}
+
+    @pytest.mark.asyncio
+    async def test_replica_lag_checked_once_per_interval(self, replica, monkeypatch):
+        checks = []
+        check = db.replica_monitor.check
+
+        async def counted_check():
+            checks.append(1)
+            await check()
+
+        monkeypatch.setattr(db.replica_monitor, "check", counted_check)
+        for _ in range(3):
+            await self.read_only_engine()
+        assert len(checks) == 1
+
+        db.replica_monitor.checked_at -= 60
+        await self.read_only_engine()
+        assert len(checks) == 2
+
+    @pytest.mark.asyncio
+    async def test_replica_lagging_falls_back_to_primary(self, replica):
+        # any lag is too much
+        db.replica_monitor.max_lag = -1
+        assert await self.read_only_engine() is db.engine
+        assert db.replica_monitor.stats() == {"usable": False, "lag_seconds": 0.0}
+
+    @pytest.mark.asyncio
+    async def test_replica_check_times_out(self, replica, monkeypatch):
+        class HangingEngine:
+            @asynccontextmanager
+            async def connect(self):
+                await asyncio.sleep(60)
+                yield
+
+        monkeypatch.setattr(db.replica_monitor, "engine", HangingEngine())
+        monkeypatch.setattr(db.replica_monitor, "check_timeout", 0.05)
+        start = time.monotonic()
+        assert await self.read_only_engine() is db.engine
+        assert time.monotonic() - start < 5
+        assert db.replica_monitor.stats() == {"usable": False, "lag_seconds": None}
+
+    @pytest.mark.asyncio
+    async def test_replica_unreachable_falls_back_to_primary(self, monkeypatch):
+        monkeypatch.setattr(
+            config, "DB_REPLICA_DSN", config.DB_DSN.set(host="127.0.0.1", port=1)
+        )
+        initiate_db()
+        try:
+            assert await self.read_only_engine() is db.engine
+            assert db.replica_monitor.stats() == {"usable": False, "lag_seconds": None}
+        finally:
+            monkeypatch.undo()
+            initiate_db()
@@ -0,0 +1,114 @@
+from unittest.mock import patch
+
+import pytest
+from prometheus_client import REGISTRY
+from sqlalchemy import text
+
+from mds import config, db_monitoring
+from mds.db import get_db_engine_and_sessionmaker, initiate_db
+from mds.db_monitoring import fingerprint, normalize_statement, parameter_shapes
+
+
+def test_normalize_statement():
+    assert (
+        normalize_statement(
+            "SELECT metadata.guid FROM metadata\n  WHERE metadata.guid = $1 "
+            "AND (metadata.data #>> '{a, b}') IN ($2, $3, $4) LIMIT 10"
+        )
+        == "SELECT metadata.guid FROM metadata WHERE metadata.guid = ? "
+        "AND (metadata.data #>> ?) IN (?, ...) LIMIT ?"
+    )
+    assert normalize_statement("SELECT param_1 FROM t") == "SELECT param_1 FROM t"
+    assert fingerprint("SELECT * FROM t WHERE a = $1") == fingerprint(
+        "SELECT *  FROM t WHERE a = 42"
+    )
+    assert fingerprint("SELECT * FROM t WHERE a = $1") != fingerprint(
+        "SELECT * FROM t WHERE b = $1"
+    )
+
+
+def test_parameter_shapes():
+    assert parameter_shapes(("guid", ["a", "b"], 3, None)) == [
+        "str(4)",
+        "list(2)",
+        "int",
+        "NoneType",
+    ]
+    assert parameter_shapes({"guid": "abc", "data": {"a": 1}}) == {
+        "guid": "str(3)",
+        "data": "dict(1)",
+    }
+    assert parameter_shapes([("a",), ("b",)], executemany=True) == {
+        "rows": 2,
+        "first": ["str(1)"],
+    }
+
+
+async def execute(statement, **parameters):
+    _, session_maker = get_db_engine_and_sessionmaker()
+    async with session_maker() as session:
+        async with session.begin():
+            result = await session.execute(text(statement), parameters)
+            rows = result.all()
+            # the transaction is still usable afterwards
+            await session.execute(text("SELECT 1"))
+            return rows
+
+
+@pytest.mark.asyncio
+async def test_statements_timed(monkeypatch):
+    monkeypatch.setattr(config, "DB_SLOW_QUERY_THRESHOLD", 0)
+    initiate_db()
+    statement = "SELECT count(*) FROM metadata WHERE guid = :guid"
+    labels = {
+        "fingerprint": fingerprint("SELECT count(*) FROM metadata WHERE guid = $1"),
+        "operation": "SELECT",
+    }
+    count = (
+        REGISTRY.get_sample_value("mds_db_statement_duration_seconds_count", labels)
+        or 0
+    )
+
+    with patch.object(db_monitoring.logger, "warning") as warning:
+        await execute(statement, guid="tdm")
+    warning.assert_not_called()
+    assert (
+        REGISTRY.get_sample_value("mds_db_statement_duration_seconds_count", labels)
+        == count + 1
+    )
+
+
+@pytest.mark.asyncio
+async def test_slow_query_logged_and_explained(monkeypatch):
+    monkeypatch.setattr(config, "DB_SLOW_QUERY_THRESHOLD", 1e-9)
+    monkeypatch.setattr(config, "DB_EXPLAIN_SAMPLE_RATE", 1.0)
+    initiate_db()
+
+    with patch.object(db_monitoring.logger, "warning") as warning:
+        assert (
+            await execute("SELECT guid FROM metadata WHERE guid = :guid", guid="tdm")
+            == []
+        )
+    messages = [call.args[0] for call in warning.call_args_list]
+    assert any(
+        "Slow query" in message
+        and "SELECT guid FROM metadata WHERE guid = ?" in message
+        and "['str(3)']" in message
+        for message in messages
+    )
+    assert any(
+        "Plan of slow query" in message and "Buffers" in message for message in messages
+    )
+
+
+@pytest.mark.asyncio
+async def test_failed_explain_does_not_abort_transaction(monkeypatch):
+    monkeypatch.setattr(config, "DB_SLOW_QUERY_THRESHOLD", 1e-9)
+    monkeypatch.setattr(config, "DB_EXPLAIN_SAMPLE_RATE", 1.0)
+    monkeypatch.setattr(db_monitoring, "EXPLAIN_PREFIX", "EXPLAIN (NOT_AN_OPTION)")
+    initiate_db()
+
+    with patch.object(db_monitoring.logger, "warning") as warning:
+        assert await execute("SELECT 1 AS x WHERE :a = 'a'", a="a") == [(1,)]
+    messages = [call.args[0] for call in warning.call_args_list]
+    assert any("Unable to explain" in message for message in messages)
@@ -0,0 +1,197 @@
+import asyncio
+
+import httpx
+import pytest
+import respx
+
+from mds import config
+from mds.http_client import (
+    CircuitBreaker,
+    InstrumentedTransport,
+    UpstreamUnavailable,
+    client_stats,
+    create_async_client,
+    upstream_name,
+)
+
+
+def test_upstream_name():
+    assert upstream_name(httpx.URL(config.INDEXING_SERVICE_ENDPOINT + "/x")) == "indexd"
+    assert (
+        upstream_name(httpx.URL(config.DATA_ACCESS_SERVICE_ENDPOINT + "/x")) == "fence"
+    )
+    assert upstream_name(httpx.URL("http://other:8080/x")) == "other"
+
+
+def test_create_async_client_from_config(monkeypatch):
+    monkeypatch.setattr(config, "HTTP_CLIENT_READ_TIMEOUT", 30.0)
+    monkeypatch.setattr(config, "HTTP_CLIENT_POOL_TIMEOUT", 1.0)
+    monkeypatch.setattr(config, "HTTP_CLIENT_HTTP2", True)
+    client = create_async_client()
+    assert client.timeout.read == 30.0
+    assert client.timeout.pool == 1.0
+    assert isinstance(client._transport, InstrumentedTransport)
+    # h2 is installed with the httpx[http2] extra
+    assert client._transport._pool._http2
+    assert client_stats(client) == {
+        "connections": 0,
+        "idle_connections": 0,
+        "upstreams": {},
+    }
+    assert client_stats(httpx.AsyncClient()) == {}
+
+
+@pytest.mark.asyncio
+@respx.mock
+async def test_upstream_stats():
+    respx.get(config.INDEXING_SERVICE_ENDPOINT + "/ok").mock(
+        return_value=httpx.Response(200, json={})
+    )
+    respx.get(config.INDEXING_SERVICE_ENDPOINT + "/down").mock(
+        side_effect=httpx.ConnectError
+    )
+    respx.get(config.DATA_ACCESS_SERVICE_ENDPOINT + "/slow").mock(
+        side_effect=httpx.PoolTimeout
+    )
+    client = create_async_client()
+
+    async with client.stream("GET", config.INDEXING_SERVICE_ENDPOINT + "/ok"):
+        assert client_stats(client)["upstreams"]["indexd"]["in_flight"] == 1
+    with pytest.raises(httpx.ConnectError):
+        await client.get(config.INDEXING_SERVICE_ENDPOINT + "/down")
+    with pytest.raises(httpx.PoolTimeout):
+        await client.get(config.DATA_ACCESS_SERVICE_ENDPOINT + "/slow")
+
+    upstreams = client_stats(client)["upstreams"]
+    assert upstreams["indexd"]["in_flight"] == 0
+    assert upstreams["indexd"]["requests"] == 2
+    assert upstreams["indexd"]["errors"] == 1
+    assert upstreams["indexd"]["pool_timeouts"] == 0
+    assert upstreams["fence"]["requests"] == 1
+    assert upstreams["fence"]["pool_timeouts"] == 1
+    await client.aclose()
+
+
+def test_circuit_breaker(monkeypatch):
+    now = 100.0
+    monkeypatch.setattr("mds.http_client.time.monotonic", lambda: now)
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10)
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+
+    # a single trial request is let through after the reset timeout
+    now = 110.0
+    assert breaker.allow_request()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+
+    now = 120.0
+    assert breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow_request()
+
+
+def test_circuit_breaker_disabled():
+    breaker = CircuitBreaker(failure_threshold=0, reset_timeout=10)
+    for _ in range(10):
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow_request()
+
+
+@pytest.mark.asyncio
+@respx.mock
+async def test_circuit_breaker_per_upstream(monkeypatch):
+    monkeypatch.setattr(config, "HTTP_CLIENT_BREAKER_FAILURE_THRESHOLD", 2)
+    indexd = respx.get(config.INDEXING_SERVICE_ENDPOINT + "/x").mock(
+        return_value=httpx.Response(500)
+    )
+    fence = respx.get(config.DATA_ACCESS_SERVICE_ENDPOINT + "/x").mock(
+        return_value=httpx.Response(200)
+    )
+    client = create_async_client()
+
+    for _ in range(2):
+        await client.get(config.INDEXING_SERVICE_ENDPOINT + "/x")
+    with pytest.raises(UpstreamUnavailable):
+        await client.get(config.INDEXING_SERVICE_ENDPOINT + "/x")
+    assert indexd.call_count == 2
+
+    # other upstreams are not affected
+    assert (await client.get(config.DATA_ACCESS_SERVICE_ENDPOINT + "/x")).is_success
+    assert fence.call_count == 1
+
+    upstreams = client_stats(client)["upstreams"]
+    assert upstreams["indexd"]["circuit_breaker"] == "open"
+    assert upstreams["indexd"]["rejected"] == 1
+    assert upstreams["fence"]["circuit_breaker"] == "closed"
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+@respx.mock
+async def test_bulkhead(monkeypatch):
+    monkeypatch.setattr(config, "HTTP_CLIENT_BULKHEAD_MAX_CONCURRENT", 1)
+    monkeypatch.setattr(config, "HTTP_CLIENT_BULKHEAD_TIMEOUT", 0.01)
+    respx.get(config.INDEXING_SERVICE_ENDPOINT + "/x").mock(
+        return_value=httpx.Response(200)
+    )
+    client = create_async_client()
+
+    async with client.stream("GET", config.INDEXING_SERVICE_ENDPOINT + "/x"):
+        with pytest.raises(UpstreamUnavailable):
+            await client.get(config.INDEXING_SERVICE_ENDPOINT + "/x")
+    # the slot is released once the response is closed
+    assert (await client.get(config.INDEXING_SERVICE_ENDPOINT + "/x")).is_success
+
+    upstreams = client_stats(client)["upstreams"]
+    assert upstreams["indexd"]["rejected"] == 1
+    # a full bulkhead is not an upstream failure
+    assert upstreams["indexd"]["consecutive_failures"] == 0
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+@respx.mock
+async def test_bulkhead_keeps_trial_slot(monkeypatch):
+    """
+    A request rejected by the bulkhead only frees the breaker's trial slot if
+    it was the trial request itself.
+    """
+    monkeypatch.setattr(config, "HTTP_CLIENT_BULKHEAD_MAX_CONCURRENT", 1)
+    monkeypatch.setattr(config, "HTTP_CLIENT_BULKHEAD_TIMEOUT", 0.01)
+    respx.get(config.INDEXING_SERVICE_ENDPOINT + "/x").mock(
+        return_value=httpx.Response(200)
+    )
+    client = create_async_client()
+    stats = client._transport.upstreams["indexd"]
+
+    async with client.stream("GET", config.INDEXING_SERVICE_ENDPOINT + "/x"):
+        # sent while the breaker is closed, and rejected after another request
+        # became the trial
+        waiting = asyncio.create_task(
+            client.get(config.INDEXING_SERVICE_ENDPOINT + "/x")
+        )
+        await asyncio.sleep(0)
+        stats.breaker.state = CircuitBreaker.HALF_OPEN
+        stats.breaker._trial_in_flight = True
+        with pytest.raises(UpstreamUnavailable):
+            await waiting
+        assert stats.breaker._trial_in_flight
+
+        # this request is the trial: the bulkhead frees the trial slot
+        stats.breaker._trial_in_flight = False
+        with pytest.raises(UpstreamUnavailable):
+            await client.get(config.INDEXING_SERVICE_ENDPOINT + "/x")
+        assert not stats.breaker._trial_in_flight
+    await client.aclose()
@@ -0,0 +1,98 @@
+import asyncio
+
+import httpx
+import pytest
+
+from mds.indexd_cache import IndexdRecordCache
+
+
+def fetcher(record, calls):
+    async def fetch():
+        calls.append(record)
+        await asyncio.sleep(0)
+        return record
+
+    return fetch
+
+
+@pytest.mark.asyncio
+async def test_cache_hit_and_expiry(monkeypatch):
+    now = 100.0
+    monkeypatch.setattr("mds.indexd_cache.time.monotonic", lambda: now)
+    cache = IndexdRecordCache(ttl=10, max_entries=10)
+    calls = []
+    record = {"did": "did1", "rev": "1"}
+
+    assert await cache.get("did1", fetcher(record, calls)) == record
+    assert await cache.get("did1", fetcher(record, calls)) == record
+    assert len(calls) == 1
+
+    now = 110.0
+    await cache.get("did1", fetcher(record, calls))
+    assert len(calls) == 2
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 2
+
+
+@pytest.mark.asyncio
+async def test_cache_single_flight():
+    cache = IndexdRecordCache(ttl=10, max_entries=10)
+    calls = []
+    record = {"did": "did1"}
+    results = await asyncio.gather(
+        *(cache.get("did1", fetcher(record, calls)) for _ in range(5))
+    )
+    assert results == [record] * 5
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_cache_errors_not_cached():
+    cache = IndexdRecordCache(ttl=10, max_entries=10)
+    calls = []
+
+    async def fail():
+        calls.append(1)
+        await asyncio.sleep(0)
+        raise httpx.ConnectError("indexd is down")
+
+    for _ in range(2):
+        results = await asyncio.gather(
+            cache.get("did1", fail), cache.get("did1", fail), return_exceptions=True
+        )
+        assert all(isinstance(r, httpx.ConnectError) for r in results)
+    assert len(calls) == 2
+    assert cache.stats()["entries"] == 0
+
+
+@pytest.mark.asyncio
+async def test_cache_invalidate():
+    cache = IndexdRecordCache(ttl=10, max_entries=10)
+    calls = []
+    record = {"did": "did1"}
+    await cache.get("did1", fetcher(record, calls))
+    await cache.get("alias1", fetcher(record, calls))
+    await cache.get("did2", fetcher({"did": "did2"}, calls))
+
+    cache.invalidate("did1")
+    assert list(cache._entries) == ["did2"]
+
+    # a lookup in progress when the key is invalidated is not cached
+    lookup = asyncio.ensure_future(cache.get("did1", fetcher(record, calls)))
+    await asyncio.sleep(0)
+    cache.invalidate("did1")
+    assert await lookup == record
+    assert "did1" not in cache._entries
+
+
+@pytest.mark.asyncio
+async def test_cache_max_entries_and_disabled():
+    cache = IndexdRecordCache(ttl=10, max_entries=2)
+    calls = []
+    for key in ["a", "b", "c"]:
+        await cache.get(key, fetcher({"did": key}, calls))
+    assert list(cache._entries) == ["b", "c"]
+
+    cache = IndexdRecordCache(ttl=0, max_entries=2)
+    await cache.get("a", fetcher({"did": "a"}, calls))
+    assert cache.stats()["entries"] == 0
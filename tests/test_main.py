@@ -1,5 +1,13 @@
 from unittest.mock import AsyncMock, patch
+import json
+import os
 import re
+import subprocess
+import sys
+
+# modules newly imported by importing the app and creating it, in a new interpreter
+# (about 760 now; importing the aggregate MDS dependencies adds about 280)
+IMPORT_MODULE_BUDGET = 900
 
 
 def test_status_success(client):
@@ -14,6 +22,7 @@ def test_status_success(client):
         body = resp.json()
         assert body["status"] == "OK"
         assert body["aggregate_metadata_enabled"] is True
+        assert "upstreams" in body["http_client"]
 
         # ISO timestamp regex
         iso_timestamp_regex = (
@@ -37,3 +46,41 @@ def test_status_aggregate_error(client):
             assert resp.json() == {
                 "detail": {"message": "aggregate datastore offline", "code": 500}
             }
+
+
+def test_deferred_imports():
+    """
+    Creating the app without the aggregate MDS does not import its datastore and
+    adapter dependencies, and stays within the budget of imported modules.
+    """
+    deferred = [
+        "opensearchpy",
+        "mds.agg_mds.query",
+        "mds.agg_mds.adapters",
+        "bleach",
+        "xmltodict",
+        "jsonpath_ng",
+    ]
+    script = f"""
+import json, sys
+before = set(sys.modules)
+import mds.main
+mds.main.get_app()
+# lazily imported modules are in sys.modules but not executed
+executed = {{
+    name for name, module in sys.modules.items()
+    if name not in before and type(module).__name__ == "module"
+}}
+imported = [name for name in {deferred!r} if name in executed]
+print(json.dumps({{"imported": imported, "modules": len(executed)}}))
+"""
+    result = subprocess.run(
+        [sys.executable, "-W", "ignore", "-c", script],
+        env={**os.environ, "USE_AGG_MDS": "false"},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    assert report["imported"] == []
+    assert report["modules"] < IMPORT_MODULE_BUDGET
@@ -0,0 +1,106 @@
+import httpx
+import pytest
+import respx
+from prometheus_client import REGISTRY
+from starlette.testclient import TestClient
+
+from mds import authorizations, config, db, metrics
+from mds.main import get_app
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+@pytest.fixture()
+def metrics_client(client, monkeypatch):
+    monkeypatch.setattr(config, "ENABLE_PROMETHEUS_METRICS", True)
+    with TestClient(get_app()) as metrics_client:
+        yield metrics_client
+
+
+def test_metrics_disabled(client):
+    assert client.get("/metrics").status_code == 404
+
+
+def test_request_metrics(metrics_client):
+    labels = dict(method="GET", route="/metadata/{guid:path}")
+    count = sample("mds_http_request_duration_seconds_count", **labels)
+    not_found = sample("mds_http_requests_total", status="404", **labels)
+
+    assert metrics_client.get("/metadata/tm_not_exist_1").status_code == 404
+    assert metrics_client.get("/metadata/tm_not_exist_2").status_code == 404
+    assert sample("mds_http_request_duration_seconds_count", **labels) == count + 2
+    assert sample("mds_http_requests_total", status="404", **labels) == not_found + 2
+    assert sample("mds_http_requests_in_progress", method="GET") == 0
+
+    resp = metrics_client.get("/metrics")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain")
+    assert 'route="/metadata/{guid:path}"' in resp.text
+    assert 'mds_db_pool_size{engine="primary"}' in resp.text
+
+
+def test_db_pool_metrics_replica(client, monkeypatch):
+    # the test database acts as its own replica
+    monkeypatch.setattr(config, "ENABLE_PROMETHEUS_METRICS", True)
+    monkeypatch.setattr(config, "DB_REPLICA_DSN", config.DB_DSN)
+    monkeypatch.setattr(metrics, "_db_pools", {})
+    with TestClient(get_app()) as metrics_client:
+        metrics_client.get("/metadata/tm_not_exist")
+        for engine in ("primary", "replica"):
+            assert sample("mds_db_pool_size", engine=engine) == config.DB_POOL_MIN_SIZE
+        resp = metrics_client.get("/metrics")
+    assert 'mds_db_pool_checked_out_connections{engine="replica"}' in resp.text
+    monkeypatch.undo()
+    db.initiate_db()
+
+
+def test_request_metrics_unmatched_route(metrics_client):
+    labels = dict(method="GET", route=metrics.UNMATCHED_ROUTE, status="404")
+    count = sample("mds_http_requests_total", **labels)
+    metrics_client.get("/not/a/route")
+    assert sample("mds_http_requests_total", **labels) == count + 1
+
+
+@respx.mock
+def test_upstream_metrics(client):
+    respx.get(f"{config.INDEXING_SERVICE_ENDPOINT}/tm_guid").mock(
+        return_value=httpx.Response(status_code=404)
+    )
+    labels = dict(upstream="indexd", method="GET", status="404")
+    count = sample("mds_upstream_request_duration_seconds_count", **labels)
+    client.get("/objects/tm_guid")
+    assert sample("mds_upstream_request_duration_seconds_count", **labels) == count + 1
+
+
+@pytest.mark.asyncio
+@respx.mock
+async def test_arborist_metrics():
+    respx.post(f"{authorizations.arborist._auth_url}mapping").mock(
+        side_effect=httpx.ConnectError
+    )
+    labels = dict(upstream="arborist", method="POST", status="error")
+    count = sample("mds_upstream_request_duration_seconds_count", **labels)
+    async with authorizations.ArboristHTTPClient() as client:
+        with pytest.raises(httpx.ConnectError):
+            await client.post(f"{authorizations.arborist._auth_url}mapping")
+    assert sample("mds_upstream_request_duration_seconds_count", **labels) == count + 1
+
+
+@pytest.mark.parametrize(
+    "url, operation",
+    [
+        ("/agg_mds/_search", "_search"),
+        ("/agg_mds_info/_doc/generation", "_doc"),
+        ("/_mget?refresh=true", "_mget"),
+        ("/agg_mds", "index"),
+    ],
+)
+def test_opensearch_operation(url, operation):
+    labels = dict(method="GET", operation=operation)
+    count = sample("mds_opensearch_request_duration_seconds_count", **labels)
+    metrics.observe_opensearch_request("GET", url, 0.1)
+    assert (
+        sample("mds_opensearch_request_duration_seconds_count", **labels) == count + 1
+    )
@@ -1,8 +1,12 @@
+import asyncio
+import json
+import time
 import pytest
 
 from fastapi import HTTPException
 import httpx
 import respx
+from unittest.mock import patch
 from starlette.status import (
     HTTP_201_CREATED,
     HTTP_409_CONFLICT,
@@ -12,7 +16,9 @@ from starlette.status import (
     HTTP_500_INTERNAL_SERVER_ERROR,
 )
 
+from conftest import AsyncMock
 from mds import config
+from mds.db import DataAccessLayer
 from mds.objects import FORBIDDEN_IDS
 
 
@@ -292,12 +298,21 @@ def test_create_duplicate_aliases(client, create_aliases_duplicate_patcher, data
     """
     Test create /objects/upload response for a user with valid authorization and
     valid input, but some aliases already exist. We get a 409 from
-    indexd's alias creation endpoint. The MDS endpoint should return 409.
+    indexd's alias creation endpoint. The MDS endpoint should return 409 and
+    delete the blank record again.
     """
     fake_jwt = "1.2.3"
     fake_guid = create_aliases_duplicate_patcher["data_upload_mocked_reponse"].get(
         "guid"
     )
+    respx.get(f"{config.INDEXING_SERVICE_ENDPOINT}/{fake_guid}").mock(
+        return_value=httpx.Response(
+            status_code=200, json={"did": fake_guid, "rev": "1"}
+        )
+    )
+    delete_blank_record_mock = respx.delete(
+        f"{config.INDEXING_SERVICE_ENDPOINT}/index/{fake_guid}", params={"rev": "1"}
+    ).mock(return_value=httpx.Response(status_code=200))
 
     resp = client.post(
         "/objects/upload", json=data, headers={"Authorization": f"bearer {fake_jwt}"}
@@ -312,6 +327,7 @@ def test_create_duplicate_aliases(client, create_aliases_duplicate_patcher, data
     assert not resp.json().get("authz")
 
     assert create_aliases_duplicate_patcher["data_upload_mock"].called
+    assert delete_blank_record_mock.called
 
 
 # api call fails with 500
@@ -964,6 +980,61 @@ def test_create_for_guid_no_access_to_upload(
     assert indexd_blank_version_mocked_request.called
 
 
+@respx.mock
+def test_create_for_guid_no_access_to_upload_url(client, valid_upload_file_patcher):
+    """
+    Test create /objects/<GUID or alias> when the aliases are created but the
+    user can't get an upload url for the new version. Should return 403, remove
+    the aliases and the new version again and not keep the metadata.
+    """
+    fake_jwt = "1.2.3"
+    guid_or_alias = "test_guid_alias"
+    indexd_did = "dg.hello/test_guid"
+    indexd_data = {
+        "did": indexd_did,
+        "rev": "123",
+        "file_name": "im_a_blank_record.pfb",
+        "acl": ["resource"],
+        "authz": ["/path/to/resource"],
+    }
+    new_version_guid = valid_upload_file_patcher["data_upload_mocked_reponse"].get(
+        "guid"
+    )
+    respx.post(f"{config.INDEXING_SERVICE_ENDPOINT}/index/blank/{indexd_did}").mock(
+        return_value=httpx.Response(status_code=200, json={"did": new_version_guid})
+    )
+    respx.get(f"{config.INDEXING_SERVICE_ENDPOINT}/{guid_or_alias}").mock(
+        return_value=httpx.Response(status_code=200, json=indexd_data)
+    )
+    delete_aliases_mock = respx.delete(
+        f"{config.INDEXING_SERVICE_ENDPOINT}/index/{new_version_guid}/aliases"
+    ).mock(return_value=httpx.Response(status_code=200))
+    respx.get(f"{config.INDEXING_SERVICE_ENDPOINT}/{new_version_guid}").mock(
+        return_value=httpx.Response(
+            status_code=200, json={"did": new_version_guid, "rev": "456"}
+        )
+    )
+    delete_blank_record_mock = respx.delete(
+        f"{config.INDEXING_SERVICE_ENDPOINT}/index/{new_version_guid}",
+        params={"rev": "456"},
+    ).mock(return_value=httpx.Response(status_code=200))
+    valid_upload_file_patcher["data_upload_guid_mock"].return_value = httpx.Response(
+        status_code=403
+    )
+
+    resp = client.post(
+        f"/objects/{guid_or_alias}",
+        json={"file_name": "test.txt", "aliases": ["abcdefg"]},
+        headers={"Authorization": f"bearer {fake_jwt}"},
+    )
+
+    assert resp.status_code == 403
+    assert valid_upload_file_patcher["create_aliases_mock"].called
+    assert delete_aliases_mock.called
+    assert delete_blank_record_mock.called
+    assert client.get(f"/metadata/{new_version_guid}").status_code == 404
+
+
 @respx.mock
 def test_get_object_in_indexd(client):
     """
@@ -1003,6 +1074,171 @@ def test_get_object_in_indexd(client):
         client.delete("/metadata/" + indexd_did)
 
 
+@respx.mock
+def test_get_object_indexd_circuit_open(client):
+    """
+    Test the object lookups still return the MDS metadata, without waiting on
+    indexd, while the indexd circuit breaker is open.
+    """
+    indexd_get_mocked_request = respx.get(
+        f"{config.INDEXING_SERVICE_ENDPOINT}/tgo_circuit_open"
+    ).mock(return_value=httpx.Response(status_code=200, json={}))
+    breaker = client.app.async_client._transport.upstreams["indexd"].breaker
+    breaker.failure_threshold = 1
+    breaker.record_failure()
+
+    mds_data = dict(a=1, b=2)
+    client.post("/metadata/tgo_circuit_open", json=mds_data).raise_for_status()
+    try:
+        resp = client.get("/objects/tgo_circuit_open")
+        assert resp.status_code == 200, resp.text
+        assert resp.json() == {"record": {}, "metadata": mds_data}
+
+        resp = client.get("/objects/tgo_circuit_open/latest")
+        assert resp.status_code == 200, resp.text
+        assert resp.json() == {"record": {}, "metadata": mds_data}
+
+        resp = client.post("/bulk/objects", json={"guids": ["tgo_circuit_open"]})
+        assert resp.status_code == 200, resp.text
+        assert resp.json() == {
+            "results": {"tgo_circuit_open": {"record": {}, "metadata": mds_data}},
+            "not_found": [],
+        }
+        assert not indexd_get_mocked_request.called
+
+        with patch("mds.main.aggregate_datastore.get_status", AsyncMock()):
+            status = client.get("/_status").json()
+        assert status["http_client"]["upstreams"]["indexd"]["circuit_breaker"] == "open"
+    finally:
+        client.delete("/metadata/tgo_circuit_open")
+
+
+@respx.mock
+def test_get_object_indexd_lookup_cached(client):
+    """
+    Test the GET object endpoint reuses the indexd record it just resolved,
+    that deleting the object uses the current revision rather than the cached
+    one, and that it drops the record from the cache.
+    """
+    indexd_get_mocked_request = respx.get(
+        f"{config.INDEXING_SERVICE_ENDPOINT}/tgo_cached"
+    ).mock(
+        return_value=httpx.Response(
+            status_code=200, json={"did": "tgo_cached", "rev": "123"}
+        )
+    )
+    indexd_delete_mocked_request = respx.delete(
+        f"{config.INDEXING_SERVICE_ENDPOINT}/index/tgo_cached",
+        params={"rev": "456"},
+    ).mock(return_value=httpx.Response(status_code=204))
+
+    for _ in range(3):
+        resp = client.get("/objects/tgo_cached")
+        assert resp.status_code == 200, resp.text
+    assert indexd_get_mocked_request.call_count == 1
+
+    # the record is updated in indexd: the cached revision is stale
+    indexd_get_mocked_request.mock(
+        return_value=httpx.Response(
+            status_code=200, json={"did": "tgo_cached", "rev": "456"}
+        )
+    )
+    assert client.delete("/objects/tgo_cached").status_code == 204
+    assert indexd_get_mocked_request.call_count == 2
+    assert indexd_delete_mocked_request.called
+
+    client.get("/objects/tgo_cached")
+    assert indexd_get_mocked_request.call_count == 3
+
+
+@respx.mock
+def test_get_object_metadata_queried_once_for_same_did(client):
+    """
+    Test the GET object endpoint only queries the metadata database once when
+    indexd returns the provided key as the did, and again for the did otherwise.
+    """
+    respx.get(f"{config.INDEXING_SERVICE_ENDPOINT}/same_did").mock(
+        return_value=httpx.Response(status_code=200, json={"did": "same_did"})
+    )
+    respx.get(f"{config.INDEXING_SERVICE_ENDPOINT}/some_alias").mock(
+        return_value=httpx.Response(status_code=200, json={"did": "same_did"})
+    )
+    mds_data = dict(a=1, b=2)
+    client.post("/metadata/same_did", json=mds_data).raise_for_status()
+    try:
+        with patch.object(
+            DataAccessLayer,
+            "resolve_metadata",
+            autospec=True,
+            side_effect=DataAccessLayer.resolve_metadata,
+        ) as resolve_metadata:
+            resp = client.get("/objects/same_did")
+            assert resp.json()["metadata"] == mds_data
+            assert resolve_metadata.call_count == 1
+
+            resp = client.get("/objects/some_alias")
+            assert resp.json()["metadata"] == mds_data
+            assert [call.args[1] for call in resolve_metadata.call_args_list[1:]] == [
+                "some_alias",
+                "same_did",
+            ]
+    finally:
+        client.delete("/metadata/same_did")
+
+
+@respx.mock
+def test_get_objects_bulk(client):
+    """
+    Test the bulk objects endpoint combines indexd records and metadata, with
+    keys found in neither listed as not found.
+    """
+    indexd_data = [{"did": "dg.hello/guid1", "size": 42}, {"did": "guid2", "size": 1}]
+    indexd_bulk_mocked_request = respx.post(
+        f"{config.INDEXING_SERVICE_ENDPOINT}/bulk/documents"
+    ).mock(return_value=httpx.Response(status_code=200, json=indexd_data))
+
+    client.post("/metadata/dg.hello/guid1", json=dict(a=1)).raise_for_status()
+    client.post("/metadata/mds_only", json=dict(b=2)).raise_for_status()
+    try:
+        resp = client.post(
+            "/bulk/objects",
+            json={"guids": ["dg.hello/guid1", "guid2", "mds_only", "nowhere"]},
+        )
+        assert resp.status_code == 200, resp.text
+        assert resp.json() == {
+            "results": {
+                "dg.hello/guid1": {"record": indexd_data[0], "metadata": dict(a=1)},
+                "guid2": {"record": indexd_data[1], "metadata": {}},
+                "mds_only": {"record": {}, "metadata": dict(b=2)},
+            },
+            "not_found": ["nowhere"],
+        }
+        assert indexd_bulk_mocked_request.call_count == 1
+        assert json.loads(indexd_bulk_mocked_request.calls[0].request.content) == [
+            "dg.hello/guid1",
+            "guid2",
+            "mds_only",
+            "nowhere",
+        ]
+
+        # metadata is still returned when indexd is unavailable
+        indexd_bulk_mocked_request.return_value = httpx.Response(status_code=500)
+        resp = client.post("/bulk/objects", json={"guids": ["mds_only", "guid2"]})
+        assert resp.json() == {
+            "results": {"mds_only": {"record": {}, "metadata": dict(b=2)}},
+            "not_found": ["guid2"],
+        }
+    finally:
+        client.delete("/metadata/dg.hello/guid1")
+        client.delete("/metadata/mds_only")
+
+
+def test_get_objects_bulk_limit(client, monkeypatch):
+    monkeypatch.setattr(config, "METADATA_QUERY_RESULTS_LIMIT", 1)
+    resp = client.post("/bulk/objects", json={"guids": ["guid1", "guid2"]})
+    assert resp.status_code == 400
+
+
 @respx.mock
 def test_get_object_not_in_indexd(client):
     """
@@ -1511,3 +1747,177 @@ def test_delete_object_when_indexd_returns_500(client, valid_upload_file_patcher
         delete_response.json()["detail"]
         == "Query param `delete_file_locations` should not contain any value"
     )
+
+
+@respx.mock
+def test_delete_objects_bulk(client):
+    """
+    Test the bulk DELETE endpoint only deletes the metadata of the objects that
+    indexd deleted, and reports the others with indexd's status code.
+    """
+    guids = ["tdb_1", "tdb_2", "tdb_3", "tdb_4"]
+    for guid in guids[:3]:
+        client.post(f"/metadata/{guid}", json=dict(a=1)).raise_for_status()
+    bulk_documents_mock = respx.post(
+        f"{config.INDEXING_SERVICE_ENDPOINT}/bulk/documents"
+    ).mock(
+        return_value=httpx.Response(
+            status_code=200,
+            json=[{"did": guid, "rev": f"rev_{guid}"} for guid in guids[:3]],
+        )
+    )
+    delete_mocks = {
+        guid: respx.delete(
+            f"{config.INDEXING_SERVICE_ENDPOINT}/index/{guid}?rev=rev_{guid}"
+        ).mock(return_value=httpx.Response(status_code=status_code))
+        for guid, status_code in [("tdb_1", 204), ("tdb_2", 204), ("tdb_3", 403)]
+    }
+
+    try:
+        resp = client.post("/bulk/objects/delete", json={"guids": guids})
+        assert resp.status_code == 200, resp.text
+        assert resp.json() == {
+            "deleted": ["tdb_1", "tdb_2"],
+            "failed": {"tdb_4": 404, "tdb_3": 403},
+        }
+        assert bulk_documents_mock.call_count == 1
+        assert all(mock.called for mock in delete_mocks.values())
+
+        assert client.get("/metadata/tdb_1").status_code == 404
+        assert client.get("/metadata/tdb_2").status_code == 404
+        assert client.get("/metadata/tdb_3").json() == dict(a=1)
+    finally:
+        for guid in guids:
+            client.delete(f"/metadata/{guid}")
+
+
+@respx.mock
+def test_delete_objects_bulk_file_locations(client):
+    """
+    Test the bulk DELETE endpoint deletes through fence when asked to delete
+    the file locations, and keeps all the metadata when fence is unreachable.
+    """
+    client.post("/metadata/tdb_fence", json=dict(a=1)).raise_for_status()
+    fence_delete_mock = respx.delete(
+        f"{config.DATA_ACCESS_SERVICE_ENDPOINT}/data/tdb_fence"
+    ).mock(side_effect=httpx.ConnectError)
+
+    try:
+        resp = client.post(
+            "/bulk/objects/delete",
+            json={"guids": ["tdb_fence"], "delete_file_locations": True},
+        )
+        assert resp.json() == {"deleted": [], "failed": {"tdb_fence": 500}}
+        assert fence_delete_mock.called
+        assert client.get("/metadata/tdb_fence").json() == dict(a=1)
+
+        fence_delete_mock.mock(side_effect=None, return_value=httpx.Response(204))
+        resp = client.post(
+            "/bulk/objects/delete",
+            json={"guids": ["tdb_fence"], "delete_file_locations": True},
+        )
+        assert resp.json() == {"deleted": ["tdb_fence"], "failed": {}}
+        assert client.get("/metadata/tdb_fence").status_code == 404
+    finally:
+        client.delete("/metadata/tdb_fence")
+
+
+@respx.mock
+def test_delete_objects_bulk_unexpected_error(client):
+    """
+    Test the bulk DELETE endpoint still deletes the metadata of the objects
+    that were deleted upstream when the delete of another one fails with an
+    unexpected error.
+    """
+    guids = ["tdb_error_1", "tdb_error_2", "tdb_error_3"]
+    for guid in guids:
+        client.post(f"/metadata/{guid}", json=dict(a=1)).raise_for_status()
+    respx.post(f"{config.INDEXING_SERVICE_ENDPOINT}/bulk/documents").mock(
+        return_value=httpx.Response(
+            status_code=200, json=[{"did": guid, "rev": "1"} for guid in guids]
+        )
+    )
+    respx.delete(f"{config.INDEXING_SERVICE_ENDPOINT}/index/tdb_error_2").mock(
+        side_effect=RuntimeError("unexpected")
+    )
+    respx.delete(url__startswith=f"{config.INDEXING_SERVICE_ENDPOINT}/index/").mock(
+        return_value=httpx.Response(status_code=204)
+    )
+
+    try:
+        resp = client.post("/bulk/objects/delete", json={"guids": guids})
+        assert resp.status_code == 200, resp.text
+        assert resp.json() == {
+            "deleted": ["tdb_error_1", "tdb_error_3"],
+            "failed": {"tdb_error_2": 500},
+        }
+        assert client.get("/metadata/tdb_error_1").status_code == 404
+        assert client.get("/metadata/tdb_error_2").json() == dict(a=1)
+        assert client.get("/metadata/tdb_error_3").status_code == 404
+    finally:
+        for guid in guids:
+            client.delete(f"/metadata/{guid}")
+
+
+@respx.mock
+def test_delete_objects_bulk_more_than_bulkhead(client, monkeypatch):
+    """
+    Test the bulk DELETE endpoint doesn't send more upstream deletes at once
+    than the upstream's bulkhead allows, so none of them is rejected.
+    """
+    monkeypatch.setattr(config, "HTTP_CLIENT_BULKHEAD_MAX_CONCURRENT", 4)
+    monkeypatch.setattr(config, "HTTP_CLIENT_BULKHEAD_TIMEOUT", 0.01)
+    guids = [f"tdb_bulkhead_{i}" for i in range(10)]
+    respx.post(f"{config.INDEXING_SERVICE_ENDPOINT}/bulk/documents").mock(
+        return_value=httpx.Response(
+            status_code=200, json=[{"did": guid, "rev": "1"} for guid in guids]
+        )
+    )
+    in_flight = max_in_flight = 0
+
+    async def slow_delete(request):
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.02)
+        in_flight -= 1
+        return httpx.Response(status_code=204)
+
+    respx.delete(url__startswith=f"{config.INDEXING_SERVICE_ENDPOINT}/index/").mock(
+        side_effect=slow_delete
+    )
+
+    resp = client.post("/bulk/objects/delete", json={"guids": guids})
+    assert resp.status_code == 200, resp.text
+    assert resp.json() == {"deleted": guids, "failed": {}}
+    assert max_in_flight == 2
+
+
+def test_delete_objects_bulk_limit(client, monkeypatch):
+    monkeypatch.setattr(config, "METADATA_QUERY_RESULTS_LIMIT", 2)
+    resp = client.post("/bulk/objects/delete", json={"guids": ["a", "b", "c"]})
+    assert resp.status_code == 400
+
+
+@respx.mock
+@pytest.mark.parametrize(
+    "method, upstream, path",
+    [
+        ("GET", "fence", "/objects/dg.hello/test_guid/download"),
+        ("DELETE", "indexd", "/objects/dg.hello/test_guid"),
+    ],
+)
+def test_upstream_unavailable(client, method, upstream, path):
+    """
+    When the upstream's circuit breaker is open, the request is not sent and
+    the endpoints that can't do without the upstream return 503 instead of
+    handling it like an upstream error.
+    """
+    breaker = client.app.async_client._transport.upstreams[upstream].breaker
+    breaker.state = breaker.OPEN
+    breaker.opened_at = time.monotonic()
+
+    resp = client.request(method, path)
+
+    assert resp.status_code == 503
+    assert "Circuit breaker" in resp.json()["detail"]
@@ -12,7 +12,9 @@ from mds.populate import (
     populate_info,
     populate_drs_info,
     populate_config,
+    populate_summaries,
     is_valid_path,
+    AggregateSummary,
 )
 from mds.agg_mds.commons import (
     AdapterMDSInstance,
@@ -39,7 +41,15 @@ async def test_parse_args():
         assert exception.code == 2
 
     known_args = parse_args(["--config", "some/file.json"])
-    assert known_args == Namespace(config="some/file.json")
+    assert known_args == Namespace(
+        config="some/file.json", report=None, push_report=False
+    )
+
+    known_args = parse_args(
+        ["--config", "some/file.json", "--report", "report.json", "--push-report"]
+    )
+    assert known_args.report == "report.json"
+    assert known_args.push_report is True
 
 
 @pytest.mark.asyncio
@@ -87,6 +97,63 @@ async def test_populate_metadata():
         )
 
 
+@pytest.mark.asyncio
+async def test_populate_metadata_summary():
+    summary = AggregateSummary()
+    with patch.object(datastore, "update_metadata", AsyncMock()):
+        await populate_metadata(
+            "commons1",
+            MDSInstance(mds_url="http://mds", commons_url="http://commons"),
+            {
+                "id1": {
+                    "gen3_discovery": {
+                        "tags": [
+                            {"category": "Data Type", "name": "WGS"},
+                            {"category": "Data Type", "name": "Genotype"},
+                            {"category": "Access"},
+                        ]
+                    }
+                },
+                "id2": {
+                    "gen3_discovery": {
+                        "tags": [{"category": "Data Type", "name": "WGS"}],
+                    }
+                },
+            },
+            summary=summary,
+        )
+        await populate_metadata(
+            "commons2",
+            MDSInstance(mds_url="http://mds", commons_url="http://commons"),
+            {
+                "id3": {"gen3_discovery": {"tags": None}},
+                "id4": {"gen3_discovery": {}},
+                "id5": {"gen3_discovery": {}},
+            },
+            summary=summary,
+        )
+
+    assert summary.tags() == [
+        {
+            "category": "Data Type",
+            "total": 3,
+            "names": [
+                {"name": "WGS", "count": 2},
+                {"name": "Genotype", "count": 1},
+            ],
+        },
+        {"category": "Access", "total": 1, "names": []},
+    ]
+    assert summary.commons_names() == ["commons2", "commons1"]
+
+    with patch("mds.agg_mds.datastore.client", AsyncMock()) as mock_datastore:
+        await populate_summaries(summary, True)
+    mock_datastore.update_tags_summary.assert_called_with(summary.tags(), True)
+    mock_datastore.update_commons_summary.assert_called_with(
+        ["commons2", "commons1"], True
+    )
+
+
 @pytest.mark.asyncio
 async def test_populate_info():
     with patch("mds.agg_mds.datastore.client", AsyncMock()) as mock_datastore:
@@ -345,6 +412,9 @@ async def test_populate_main():
     patch.object(datastore, "close", AsyncMock()).start()
     patch.object(datastore, "update_global_info", AsyncMock()).start()
     patch.object(datastore, "update_metadata", AsyncMock()).start()
+    patch.object(datastore, "update_generation", AsyncMock()).start()
+    patch.object(datastore, "update_tags_summary", AsyncMock()).start()
+    patch.object(datastore, "update_commons_summary", AsyncMock()).start()
     patch.object(adapters, "get_metadata", MagicMock()).start()
     patch.object(datastore, "clone_temp_indexes_to_real_indexes", AsyncMock()).start()
 
@@ -423,6 +493,9 @@ async def test_populate_main_fail():
     patch.object(datastore, "close", AsyncMock()).start()
     patch.object(datastore, "update_global_info", AsyncMock()).start()
     patch.object(datastore, "update_metadata", AsyncMock()).start()
+    patch.object(datastore, "update_generation", AsyncMock()).start()
+    patch.object(datastore, "update_tags_summary", AsyncMock()).start()
+    patch.object(datastore, "update_commons_summary", AsyncMock()).start()
     patch.object(adapters, "get_metadata", MagicMock()).start()
     patch.object(datastore, "clone_temp_indexes_to_real_indexes", AsyncMock()).start()
 
@@ -552,6 +625,87 @@ async def test_populate_main_fail():
     assert (await es.get_all_metadata()) == existing_metadata
 
 
+@respx.mock
+@pytest.mark.asyncio
+async def test_populate_main_report(tmp_path):
+    study = {
+        "_guid_type": "discovery_metadata",
+        "gen3_discovery": {"tags": [{"name": "Array", "category": "Data Type"}]},
+    }
+    respx.get(
+        "http://test/ok//mds/metadata?data=True&_guid_type=discovery_metadata&limit=1000&offset=0"
+    ).mock(return_value=httpx.Response(200, json={"s1": study, "s2": study}))
+
+    mocked = {
+        name: patch.object(datastore, name, AsyncMock())
+        for name in (
+            "init",
+            "drop_all_non_temp_indexes",
+            "drop_all_temp_indexes",
+            "create_indexes",
+            "create_temp_indexes",
+            "clone_temp_indexes_to_real_indexes",
+            "update_metadata",
+            "update_global_info",
+            "update_config_info",
+            "update_generation",
+            "update_tags_summary",
+            "update_commons_summary",
+            "update_populate_report",
+            "close",
+        )
+    }
+
+    def failing_adapter(*args, report=None, **kwargs):
+        report["error"] = "multiple retries failed"
+        return {}
+
+    report_path = tmp_path / "report.json"
+    with patch("mds.config.USE_AGG_MDS", True), patch.object(
+        datastore, "get_status", AsyncMock(return_value="OK")
+    ), patch.object(adapters, "get_metadata", failing_adapter):
+        mocks = {name: mock.start() for name, mock in mocked.items()}
+        try:
+            await main(
+                Commons(
+                    configuration=Config(settings=Settings()),
+                    gen3_commons={
+                        "my_commons": MDSInstance(
+                            mds_url="http://test/ok/", commons_url="test"
+                        ),
+                    },
+                    adapter_commons={
+                        "bad_commons": AdapterMDSInstance(
+                            mds_url="", commons_url="", adapter="icpsr"
+                        ),
+                    },
+                ),
+                report_path=str(report_path),
+                push_report=True,
+            )
+        finally:
+            for mock in mocked.values():
+                mock.stop()
+
+    report = json.loads(report_path.read_text())
+    assert report["status"] == "ok"
+    assert report["documents"] == 2
+    assert report["failed_commons"] == ["bad_commons"]
+    assert report["slowest_commons"][0] == "my_commons"
+    commons = report["commons"]["my_commons"]
+    assert commons["source"] == "gen3"
+    assert commons["documents_received"] == commons["documents_indexed"] == 2
+    assert commons["bytes"] > 0
+    assert commons["fetch_seconds"] > 0
+    assert commons["index_seconds"] > 0
+    bad_commons = report["commons"]["bad_commons"]
+    assert bad_commons["source"] == "icpsr"
+    assert bad_commons["status"] == "failed"
+    assert bad_commons["error"] == "multiple retries failed"
+    mocks["update_populate_report"].assert_called_once()
+    assert mocks["update_populate_report"].call_args.args[0]["documents"] == 2
+
+
 @pytest.mark.asyncio
 async def test_filter_entries():
     resp = await filter_entries(
@@ -1,8 +1,10 @@
 import pytest
 import importlib
 from fastapi.testclient import TestClient
+from unittest.mock import patch
 
-from mds import config, main
+from conftest import AsyncMock
+from mds import authorizations, config, main
 
 
 @pytest.mark.parametrize("key", ["test_get", "dg.1234/test_get"])
@@ -177,6 +179,39 @@ def test_query_filter_all_values(client):
             client.delete(f"/metadata/tq_{i}")
 
 
+def test_get_bulk(client):
+    try:
+        client.post("/metadata/tgb_1", json=dict(a=1)).raise_for_status()
+        client.post("/metadata/tgb_2", json=dict(a=2)).raise_for_status()
+        client.post(
+            "/metadata/tgb_2/aliases", json={"aliases": ["tgb_alias"]}
+        ).raise_for_status()
+
+        resp = client.post(
+            "/bulk/metadata",
+            json={"guids": ["tgb_1", "tgb_alias", "tgb_not_exist", "tgb_1"]},
+        )
+        assert resp.status_code == 200
+        assert resp.json() == {
+            "results": {"tgb_1": dict(a=1), "tgb_alias": dict(a=2)},
+            "not_found": ["tgb_not_exist"],
+        }
+
+        assert client.post("/bulk/metadata", json={"guids": []}).json() == {
+            "results": {},
+            "not_found": [],
+        }
+    finally:
+        client.delete("/metadata/tgb_1")
+        client.delete("/metadata/tgb_2")
+
+
+def test_get_bulk_limit(client, monkeypatch):
+    monkeypatch.setattr(config, "METADATA_QUERY_RESULTS_LIMIT", 2)
+    resp = client.post("/bulk/metadata", json={"guids": ["a", "b", "c"]})
+    assert resp.status_code == 400
+
+
 def test_get_with_force_authz_check(monkeypatch, client):
     """Test that /metadata/some_key denies access appropriately when configured to do so
 
@@ -193,3 +228,38 @@ def test_get_with_force_authz_check(monkeypatch, client):
         key = "any_key"
         resp = client.get("/metadata/" + key)
         assert resp.status_code == 403
+
+
+def test_query_filtered_by_authz(monkeypatch, client):
+    """Only records the caller can read are returned when AUTHZ_FILTER_METADATA_RECORDS is on"""
+    try:
+        client.post("/metadata/tqa_open", json=dict(a=1)).raise_for_status()
+        client.post(
+            "/metadata",
+            json=[dict(guid="tqa_2", data=dict(a=1))],
+        ).raise_for_status()
+
+        monkeypatch.setattr(config, "TESTING_WITH_DISABLED_AUTHZ", False)
+        monkeypatch.setattr(config, "AUTHZ_FILTER_METADATA_RECORDS", True)
+        authorizations.authz_cache.clear()
+        mapping = {"/programs/DEV": [{"service": "*", "method": "read"}]}
+        with patch.object(
+            authorizations.arborist, "auth_mapping", AsyncMock(return_value=mapping)
+        ):
+            assert client.get("/metadata?a=1").json() == []
+            assert client.get("/metadata/tqa_open").status_code == 404
+            assert client.post(
+                "/bulk/metadata", json={"guids": ["tqa_open"]}
+            ).json() == {"results": {}, "not_found": ["tqa_open"]}
+
+            authorizations.authz_cache.clear()
+            mapping["/open"] = [{"service": "*", "method": "read"}]
+            assert sorted(client.get("/metadata?a=1").json()) == [
+                "tqa_2",
+                "tqa_open",
+            ]
+            assert client.get("/metadata/tqa_open").json() == dict(a=1)
+    finally:
+        monkeypatch.setattr(config, "TESTING_WITH_DISABLED_AUTHZ", True)
+        client.delete("/metadata/tqa_open")
+        client.delete("/metadata/tqa_2")
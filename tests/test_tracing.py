@@ -0,0 +1,110 @@
+import json
+import sys
+from contextlib import nullcontext
+
+import httpx
+import pytest
+import respx
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import (
+    InMemorySpanExporter,
+)
+from starlette.testclient import TestClient
+
+from mds import config, tracing
+from mds.main import get_app
+
+
+@pytest.fixture()
+def spans(monkeypatch):
+    exporter = InMemorySpanExporter()
+    monkeypatch.setattr(config, "ENABLE_OTEL_TRACING", True)
+    monkeypatch.setattr(tracing, "_create_exporter", lambda: exporter)
+    monkeypatch.setattr(tracing, "_tracer_provider", None)
+    monkeypatch.setattr(tracing, "_tracer", None)
+
+    def finished():
+        tracing.flush()
+        return exporter.get_finished_spans()
+
+    yield finished
+
+
+def test_tracing_disabled(client):
+    assert client.app.tracing_enabled is False
+    assert isinstance(tracing.start_span("x"), nullcontext)
+
+
+def test_tracing_not_installed(monkeypatch):
+    monkeypatch.setattr(config, "ENABLE_OTEL_TRACING", True)
+    monkeypatch.setitem(sys.modules, "opentelemetry.instrumentation.fastapi", None)
+    app = get_app()
+    assert app.tracing_enabled is False
+
+
+def test_route_and_statement_spans(client, spans):
+    with TestClient(get_app()) as traced_client:
+        assert traced_client.app.tracing_enabled is True
+        traced_client.post("/metadata/tt_1", json=dict(a=1)).raise_for_status()
+        assert traced_client.get("/metadata/tt_1").json() == dict(a=1)
+        traced_client.delete("/metadata/tt_1")
+
+    finished = spans()
+    names = {span.name for span in finished}
+    assert "GET /metadata/{guid:path}" in names
+    assert "POST /metadata/{guid:path}" in names
+    route_span = next(s for s in finished if s.name == "GET /metadata/{guid:path}")
+    statement_spans = [
+        span
+        for span in finished
+        if span.attributes.get("db.system") == "postgresql"
+        and span.context.trace_id == route_span.context.trace_id
+    ]
+    assert statement_spans
+
+
+@respx.mock
+def test_async_client_spans(client, spans):
+    respx.get(config.INDEXING_SERVICE_ENDPOINT + "/index/tt_2").mock(
+        return_value=httpx.Response(200, json={})
+    )
+    with TestClient(get_app()) as traced_client:
+        traced_client.portal.call(
+            traced_client.app.async_client.get,
+            config.INDEXING_SERVICE_ENDPOINT + "/index/tt_2",
+        )
+
+    [span] = [span for span in spans() if span.name == "GET"]
+    assert config.INDEXING_SERVICE_ENDPOINT + "/index/tt_2" in span.attributes.values()
+
+
+def test_start_span(spans):
+    tracing.setup_tracing(get_app())
+    with tracing.start_span("OpenSearch GET", {"url.path": "/idx/_search"}):
+        pass
+    [span] = spans()
+    assert span.name == "OpenSearch GET"
+    assert span.attributes["url.path"] == "/idx/_search"
+
+
+def test_file_exporter(monkeypatch, tmp_path):
+    path = tmp_path / "traces.jsonl"
+    monkeypatch.setattr(config, "OTEL_TRACING_EXPORTER", "file")
+    monkeypatch.setattr(config, "OTEL_TRACING_FILE", str(path))
+    monkeypatch.setattr(tracing, "_tracer_provider", None)
+    monkeypatch.setattr(tracing, "_tracer", None)
+
+    tracer = tracing._get_tracer_provider().get_tracer("test")
+    with tracer.start_as_current_span("one"):
+        pass
+    with tracer.start_as_current_span("two"):
+        pass
+    tracing.flush()
+
+    lines = path.read_text().splitlines()
+    assert [json.loads(line)["name"] for line in lines] == ["one", "two"]
+
+
+def test_unknown_exporter(monkeypatch):
+    monkeypatch.setattr(config, "OTEL_TRACING_EXPORTER", "zipkin")
+    with pytest.raises(ValueError):
+        tracing._create_exporter()
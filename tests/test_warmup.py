@@ -0,0 +1,168 @@
+import asyncio
+import time
+from unittest.mock import AsyncMock, patch
+
+import httpx
+import pytest
+import respx
+from sqlalchemy import text
+from starlette.testclient import TestClient
+
+from mds import config
+from mds.db import get_db_engine_and_sessionmaker, initiate_db
+from mds import db
+from mds.warmup import HOT_STATEMENTS, warm_up_db, warm_up_replica
+
+
+@pytest.fixture
+def warmup_client(monkeypatch):
+    from mds.main import get_app
+
+    monkeypatch.setattr(config, "WARMUP_ON_STARTUP", True)
+    monkeypatch.setattr(config, "USE_AGG_MDS", True)
+
+    def create(warm_up_db=None):
+        patches = [
+            patch(
+                "mds.warmup.aggregate_datastore.get_status",
+                AsyncMock(return_value="OK"),
+            )
+        ]
+        if warm_up_db is not None:
+            patches.append(patch("mds.warmup.warm_up_db", warm_up_db))
+        for p in patches:
+            p.start()
+        return TestClient(get_app())
+
+    yield create
+    patch.stopall()
+
+
+def wait_until_ready(client, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        resp = client.get("/_ready")
+        if resp.status_code == 200:
+            return resp.json()
+        time.sleep(0.05)
+    raise AssertionError("not ready")
+
+
+@pytest.mark.asyncio
+async def test_warm_up_db(monkeypatch):
+    monkeypatch.setattr(config, "DB_POOL_MIN_SIZE", 3)
+    initiate_db()
+
+    report = await warm_up_db()
+    assert report == {"ok": True, "connections": 3, "statements": len(HOT_STATEMENTS)}
+
+    engine, _ = get_db_engine_and_sessionmaker()
+    assert engine.sync_engine.pool.checkedin() == 3
+    # the statements are prepared on the pooled connections
+    async with engine.connect() as connection:
+        prepared = await connection.execute(
+            text("SELECT count(*) FROM pg_prepared_statements")
+        )
+        assert prepared.scalar() >= len(HOT_STATEMENTS)
+
+
+@pytest.mark.asyncio
+async def test_warm_up_replica(monkeypatch):
+    initiate_db()
+    assert await warm_up_replica() == {"ok": True, "skipped": True}
+
+    monkeypatch.setattr(config, "DB_POOL_MIN_SIZE", 2)
+    monkeypatch.setattr(config, "DB_REPLICA_DSN", config.DB_DSN)
+    initiate_db()
+    report = await warm_up_replica()
+    assert report["connections"] == 2
+    assert report["usable"] is True
+    assert db.replica_engine.sync_engine.pool.checkedin() == 2
+
+    monkeypatch.undo()
+    initiate_db()
+
+
+@respx.mock
+def test_ready_after_warmup(warmup_client):
+    indexd = respx.get(config.INDEXING_SERVICE_ENDPOINT.rstrip("/") + "/_status").mock(
+        return_value=httpx.Response(200, text="Healthy")
+    )
+    finished = False
+
+    async def slow_warm_up_db():
+        while not finished:
+            await asyncio.sleep(0.01)
+        return {"ok": True}
+
+    with warmup_client(slow_warm_up_db) as client:
+        resp = client.get("/_ready")
+        assert resp.status_code == 503
+        assert resp.json()["ready"] is False
+
+        finished = True
+        body = wait_until_ready(client)
+        assert body["ready"] is True
+        assert body["warmup"]["database"]["ok"] is True
+        assert body["warmup"]["opensearch"]["ok"] is True
+        assert body["warmup"]["indexd"] == {
+            "ok": True,
+            "status_code": 200,
+            "seconds": body["warmup"]["indexd"]["seconds"],
+        }
+    assert indexd.called
+
+
+@respx.mock
+def test_ready_when_upstream_down(warmup_client):
+    respx.get(config.INDEXING_SERVICE_ENDPOINT.rstrip("/") + "/_status").mock(
+        side_effect=httpx.ConnectError("connection refused")
+    )
+
+    with warmup_client() as client:
+        body = wait_until_ready(client)
+    # the warmup is done even though indexd could not be reached
+    assert body["warmup"]["indexd"]["ok"] is False
+    assert "ConnectError" in body["warmup"]["indexd"]["error"]
+    assert body["warmup"]["database"]["ok"] is True
+
+
+@respx.mock
+def test_not_ready_when_database_down(warmup_client):
+    respx.get(config.INDEXING_SERVICE_ENDPOINT.rstrip("/") + "/_status").mock(
+        return_value=httpx.Response(200, text="Healthy")
+    )
+    attempts = []
+
+    async def failing_warm_up_db():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise ConnectionRefusedError("database is down")
+        return {"ok": True}
+
+    with warmup_client(failing_warm_up_db) as client:
+        deadline = time.monotonic() + 10
+        while not client.app.warmup.done.is_set():
+            assert time.monotonic() < deadline
+            time.sleep(0.05)
+
+        # the failed database warmup is retried, and /_ready is 503 until it succeeds
+        resp = client.get("/_ready")
+        assert resp.status_code == 503
+        assert resp.json()["ready"] is False
+        assert "ConnectionRefusedError" in resp.json()["warmup"]["database"]["error"]
+        assert len(attempts) == 2
+
+        resp = client.get("/_ready")
+        assert resp.status_code == 200
+        assert resp.json()["warmup"]["database"]["ok"] is True
+        assert len(attempts) == 3
+
+        client.get("/_ready")
+        assert len(attempts) == 3
+
+
+def test_ready_without_warmup(client):
+    resp = client.get("/_ready")
+    assert resp.status_code == 200
+    assert resp.json() == {"ready": True, "warmup": {"skipped": True}}